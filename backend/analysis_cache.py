@@ -0,0 +1,97 @@
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(image_bytes: bytes, prompt: str, model: str) -> str:
+    """Content address of an analysis: SHA-256 over image bytes, prompt and model"""
+    digest = hashlib.sha256()
+    digest.update(image_bytes)
+    digest.update(b"\0")
+    digest.update(prompt.encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(model.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Two-level cache of parsed AI analysis results.
+
+    The first level is an in-process LRU with TTL eviction; the second is the
+    ``analysis_cache`` Mongo collection, shared by every replica and expired
+    by a TTL index on ``expires_at``.
+    """
+
+    def __init__(self, collection, max_entries: int = 1024, ttl_seconds: float = 7 * 24 * 3600):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self._local = TTLCache(maxsize=max(1, max_entries), ttl=ttl_seconds)
+        self.hits = 0
+        self.local_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("key", unique=True)
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        result = self._local.get(key)
+        if result is not None:
+            self.hits += 1
+            self.local_hits += 1
+            return result
+
+        try:
+            doc = await self.collection.find_one(
+                {"key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"_id": 0, "result": 1}
+            )
+        except Exception as e:
+            logger.warning(f"Analysis cache lookup failed: {str(e)}")
+            doc = None
+
+        if doc is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._local[key] = doc["result"]
+        return doc["result"]
+
+    async def set(self, key: str, result: List[Dict[str, Any]], model: str):
+        self._local[key] = result
+        self.stores += 1
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.update_one(
+                {"key": key},
+                {"$set": {
+                    "key": key,
+                    "model": model,
+                    "result": result,
+                    "created_at": now,
+                    "expires_at": now + timedelta(seconds=self.ttl_seconds),
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Analysis cache store failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "local_hits": self.local_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "local_entries": len(self._local),
+            "local_max_entries": self._local.maxsize,
+            "ttl_seconds": self.ttl_seconds,
+        }
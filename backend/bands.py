@@ -0,0 +1,257 @@
+import logging
+import os
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_DTYPES = ("uint8", "uint16", "int16", "uint32", "int32", "float32", "float64")
+INTERLEAVES = ("bsq", "bil", "bip")  # band-sequential (B, H, W), band-interleaved by line (H, B, W) or by pixel (H, W, B)
+
+# Names recognised when picking a natural-color composite
+RGB_BAND_NAMES = (("red", "r"), ("green", "g"), ("blue", "b"))
+
+
+class BandStackError(ValueError):
+    pass
+
+
+@dataclass
+class BandStackHeader:
+    """Layout of a band stack file, stored on the file record as ``band_stack``"""
+    bands: int
+    height: int
+    width: int
+    dtype: str = "uint16"
+    interleave: str = "bsq"
+    offset: int = 0  # bytes before the pixel data
+    byte_order: str = "<"
+    band_names: List[str] = field(default_factory=list)
+    composite: List[int] = field(default_factory=list)  # default bands for the rendered composite
+    statistics: Optional[List[Dict[str, float]]] = None  # per band, filled in lazily
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BandStackHeader":
+        try:
+            header = cls(
+                bands=int(data["bands"]),
+                height=int(data["height"]),
+                width=int(data["width"]),
+                dtype=str(data.get("dtype", "uint16")),
+                interleave=str(data.get("interleave", "bsq")).lower(),
+                offset=int(data.get("offset", 0)),
+                byte_order=str(data.get("byte_order", "<")),
+                band_names=[str(name) for name in data.get("band_names") or []],
+                composite=[int(band) for band in data.get("composite") or []],
+                statistics=data.get("statistics"),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise BandStackError(f"Invalid band stack header: {str(e)}")
+        header.validate()
+        return header
+
+    def validate(self):
+        if min(self.bands, self.height, self.width) <= 0:
+            raise BandStackError("Band stack dimensions must be positive")
+        if self.dtype not in SUPPORTED_DTYPES:
+            raise BandStackError(f"Unsupported band dtype {self.dtype!r}")
+        if self.interleave not in INTERLEAVES:
+            raise BandStackError(f"Unsupported interleave {self.interleave!r}")
+        if self.byte_order not in ("<", ">", "="):
+            raise BandStackError(f"Unsupported byte order {self.byte_order!r}")
+        if any(not 0 <= band < self.bands for band in self.composite):
+            raise BandStackError("Composite band index out of range")
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        """On-disk array shape for the interleave"""
+        if self.interleave == "bsq":
+            return self.bands, self.height, self.width
+        if self.interleave == "bil":
+            return self.height, self.bands, self.width
+        return self.height, self.width, self.bands
+
+    @property
+    def data_bytes(self) -> int:
+        return self.bands * self.height * self.width * np.dtype(self.dtype).itemsize
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def default_composite(self) -> List[int]:
+        """Configured composite, else the bands named red/green/blue, else the first three bands"""
+        if self.composite:
+            return list(self.composite)
+        names = [name.lower() for name in self.band_names]
+        picked = []
+        for aliases in RGB_BAND_NAMES:
+            matches = [i for i, name in enumerate(names) if name in aliases]
+            if not matches:
+                break
+            picked.append(matches[0])
+        if len(picked) == 3:
+            return picked
+        return list(range(min(3, self.bands)))
+
+
+def is_band_stack_upload(filename: str, metadata: Optional[Dict[str, Any]]) -> bool:
+    """.npy files, and raw files whose metadata carries a band stack header"""
+    if filename.lower().endswith(".npy"):
+        return True
+    return isinstance(metadata, dict) and isinstance(metadata.get("band_stack"), dict)
+
+
+def inspect_band_stack(path: str, filename: str, metadata: Optional[Dict[str, Any]]) -> BandStackHeader:
+    """Validate an uploaded band stack and return its header (reads only the .npy header)"""
+    overrides = (metadata or {}).get("band_stack") or {}
+    if filename.lower().endswith(".npy"):
+        try:
+            array = np.load(path, mmap_mode="r", allow_pickle=False)
+        except (OSError, ValueError) as e:
+            raise BandStackError(f"Not a readable .npy array: {str(e)}")
+        if array.ndim == 2:
+            shape = (1,) + array.shape
+            interleave = "bsq"
+        elif array.ndim == 3:
+            # (H, W, B) when the last axis is the smallest, unless the metadata says otherwise
+            interleave = str(overrides.get("interleave", "bip" if array.shape[2] < array.shape[0] else "bsq")).lower()
+            shape = array.shape
+        else:
+            raise BandStackError(f"Expected a 2-D or 3-D array, got {array.ndim}-D")
+        if not array.flags.c_contiguous:
+            raise BandStackError("Fortran-ordered .npy arrays are not supported")
+        big_endian = array.dtype.byteorder == ">" or (array.dtype.byteorder == "=" and not np.little_endian)
+        header = {
+            **overrides,
+            "dtype": array.dtype.name,
+            "byte_order": ">" if big_endian else "<",
+            "interleave": interleave,
+            "offset": array.offset,
+        }
+        if interleave == "bsq":
+            header.update(bands=shape[0], height=shape[1], width=shape[2])
+        elif interleave == "bil":
+            header.update(height=shape[0], bands=shape[1], width=shape[2])
+        else:
+            header.update(height=shape[0], width=shape[1], bands=shape[2])
+        return BandStackHeader.from_dict(header)
+
+    header = BandStackHeader.from_dict(overrides)
+    size = os.path.getsize(path)
+    if size < header.offset + header.data_bytes:
+        raise BandStackError(f"File has {size} bytes, header describes {header.offset + header.data_bytes}")
+    return header
+
+
+class BandStack:
+    """Read-only, memory-mapped view of a band stack as (bands, height, width).
+
+    Nothing is read until pixels are touched: band selection and
+    interleave changes are views of the map, statistics are accumulated in
+    row blocks, and composites read strided (downsampled) views only.
+    """
+
+    def __init__(self, path: str, header: BandStackHeader):
+        self.path = path
+        self.header = header
+        dtype = np.dtype(header.dtype).newbyteorder(header.byte_order)
+        raw = np.memmap(path, dtype=dtype, mode="r", offset=header.offset, shape=header.shape)
+        if header.interleave == "bsq":
+            self.cube = raw
+        elif header.interleave == "bil":
+            self.cube = raw.transpose(1, 0, 2)
+        else:
+            self.cube = raw.transpose(2, 0, 1)
+
+    def band(self, index: int) -> np.ndarray:
+        return self.cube[index]
+
+    def select(self, indices: Sequence[int]) -> List[np.ndarray]:
+        return [self.cube[index] for index in indices]
+
+    def band_statistics(self, index: int, block_bytes: int = 64 * 1024 * 1024, sample: int = 1_000_000) -> Dict[str, float]:
+        """min/max/mean/std over the whole band in row blocks, percentiles from a strided sample"""
+        band = self.cube[index]
+        # Blocks are converted to float64, so size them by that rather than the stored dtype
+        rows = max(1, block_bytes // max(1, band.shape[1] * np.dtype(np.float64).itemsize))
+        integer = np.issubdtype(band.dtype, np.integer)
+        count, total, total_sq = 0, 0.0, 0.0
+        low, high = np.inf, -np.inf
+        for start in range(0, band.shape[0], rows):
+            block = np.asarray(band[start:start + rows], dtype=np.float64).ravel()
+            finite = block if integer else block[np.isfinite(block)]
+            if finite.size:
+                count += finite.size
+                total += float(finite.sum())
+                total_sq += float(np.dot(finite, finite))
+                low, high = min(low, float(finite.min())), max(high, float(finite.max()))
+        mean = total / count if count else 0.0
+        p2, p98 = self.percentiles(index, (2, 98), sample)
+        return {
+            "min": low if count else 0.0,
+            "max": high if count else 0.0,
+            "mean": mean,
+            "std": float(np.sqrt(max(0.0, total_sq / count - mean * mean))) if count else 0.0,
+            "p2": p2,
+            "p98": p98,
+        }
+
+    def sample_view(self, index: int, sample: int) -> np.ndarray:
+        band = self.cube[index]
+        step = max(1, int(np.ceil(np.sqrt(band.size / max(1, sample)))))
+        return band[::step, ::step]
+
+    def percentiles(self, index: int, q: Tuple[float, float], sample: int = 1_000_000) -> Tuple[float, float]:
+        values = np.asarray(self.sample_view(index, sample), dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if not values.size:
+            return 0.0, 0.0
+        low, high = np.percentile(values, q)
+        return float(low), float(high)
+
+    def composite(self, indices: Sequence[int], max_edge: int = 2048, stretch: Tuple[float, float] = (2, 98)) -> Image.Image:
+        """8-bit RGB (or grayscale for one band) composite, downsampled before any pixel is read"""
+        height, width = self.header.height, self.header.width
+        step = max(1, int(np.ceil(max(height, width) / max_edge)))
+        channels = []
+        for index in indices:
+            view = np.asarray(self.cube[index, ::step, ::step], dtype=np.float32)
+            finite = view[np.isfinite(view)]
+            low, high = np.percentile(finite, stretch) if finite.size else (0.0, 0.0)
+            scale = 255.0 / (high - low) if high > low else 0.0
+            channels.append(np.clip((np.nan_to_num(view, nan=low) - low) * scale, 0, 255).astype(np.uint8))
+        if len(channels) == 1:
+            return Image.fromarray(channels[0], mode="L").convert("RGB")
+        while len(channels) < 3:
+            channels.append(np.zeros_like(channels[0]))
+        return Image.fromarray(np.dstack(channels[:3]), mode="RGB")
+
+
+def parse_band_list(value: Optional[str], bands: int) -> Optional[List[int]]:
+    """Parse '3,2,1' into band indices; raises BandStackError when out of range"""
+    if not value:
+        return None
+    try:
+        indices = [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise BandStackError(f"Invalid band list {value!r}")
+    if not 1 <= len(indices) <= 3 or any(not 0 <= index < bands for index in indices):
+        raise BandStackError(f"Expected 1 to 3 band indices between 0 and {bands - 1}")
+    return indices
+
+
+def render_composite(path: str, header: BandStackHeader, indices: Sequence[int], out_path: Path, max_edge: int = 2048) -> Path:
+    """Render a composite to a PNG next to the upload unless it already exists"""
+    if out_path.exists():
+        return out_path
+    image = BandStack(path, header).composite(indices, max_edge=max_edge)
+    # Unique per call: threads of one process may render the same composite at once
+    temp_path = Path(f"{out_path}.{uuid.uuid4().hex}.tmp")
+    image.save(temp_path, format="PNG")
+    os.replace(temp_path, out_path)
+    return out_path
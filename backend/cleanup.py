@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Uploads, composites and previews are named after the file id (a UUID)
+FILE_ID_LENGTH = 36
+
+
+def file_id_of(name: str) -> str:
+    return name[:FILE_ID_LENGTH]
+
+
+def remove_paths(paths: Iterable[str]) -> int:
+    """Unlink files, ignoring ones already gone; run in a worker thread"""
+    removed = 0
+    for path in paths:
+        try:
+            os.unlink(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove {path}: {str(e)}")
+    return removed
+
+
+def remove_derived(directories: Iterable[Path], file_ids: Set[str]) -> List[Path]:
+    """Remove composites/previews of the given files with one directory scan each; returns the removed paths"""
+    removed = []
+    for directory in directories:
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_file() and file_id_of(entry.name) in file_ids:
+                try:
+                    os.unlink(entry.path)
+                    removed.append(Path(entry.path))
+                except FileNotFoundError:
+                    pass
+    return removed
+
+
+def list_stale_files(directory: Path, min_age_seconds: float) -> List[os.DirEntry]:
+    """Files directly in ``directory`` not modified for ``min_age_seconds`` (uploads still being written are skipped)"""
+    cutoff = time.time() - min_age_seconds
+    try:
+        return [
+            entry for entry in os.scandir(directory)
+            if entry.is_file() and not entry.name.endswith(".tmp") and entry.stat().st_mtime < cutoff
+        ]
+    except FileNotFoundError:
+        return []
+
+
+class Sweeper:
+    """Periodic reconciliation of the upload directory and the database.
+
+    Each pass removes, in order: upload files without a file record,
+    composites and previews of missing files, detections of missing
+    files, and references to missing files from finished jobs. Work is done
+    in batches of ``batch_size`` with a ``pause_seconds`` sleep after each
+    one, and filesystem calls run in worker threads, so a pass does not
+    compete with foreground requests. Every step is idempotent, so
+    replicas sweeping at the same time only repeat each other's work.
+    """
+
+    def __init__(
+        self,
+        db,
+        upload_dir: Path,
+        derived_dirs: List[Path],
+        interval_seconds: float = 3600,
+        batch_size: int = 500,
+        pause_seconds: float = 0.5,
+        min_age_seconds: float = 3600,
+        on_files_removed: Optional[Callable[[Set[str], List[Path]], Awaitable[None]]] = None,
+        on_detections_removed: Optional[Callable[[List[str]], Awaitable[None]]] = None,
+    ):
+        self.db = db
+        self.upload_dir = Path(upload_dir)
+        self.derived_dirs = [Path(directory) for directory in derived_dirs]
+        self.interval_seconds = interval_seconds
+        self.batch_size = max(1, batch_size)
+        self.pause_seconds = pause_seconds
+        self.min_age_seconds = min_age_seconds
+        self.on_files_removed = on_files_removed
+        self.on_detections_removed = on_detections_removed
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, db, upload_dir: Path, derived_dirs: List[Path], **kwargs):
+        """Build a sweeper configured from GC_* environment variables"""
+        return cls(
+            db,
+            upload_dir,
+            derived_dirs,
+            interval_seconds=float(os.environ.get('GC_INTERVAL_SECONDS', 3600)),
+            batch_size=int(os.environ.get('GC_BATCH_SIZE', 500)),
+            pause_seconds=float(os.environ.get('GC_BATCH_PAUSE_SECONDS', 0.5)),
+            min_age_seconds=float(os.environ.get('GC_MIN_AGE_SECONDS', 3600)),
+            **kwargs,
+        )
+
+    def start(self):
+        if self._task is None and self.interval_seconds > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Garbage collection pass failed: {str(e)}")
+
+    async def _pause(self):
+        if self.pause_seconds > 0:
+            await asyncio.sleep(self.pause_seconds)
+
+    async def _existing(self, file_ids: List[str]) -> Set[str]:
+        docs = await self.db.files.find({"id": {"$in": file_ids}}, {"_id": 0, "id": 1}).to_list(len(file_ids))
+        return {doc["id"] for doc in docs}
+
+    async def sweep(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        result = {"upload_files": 0, "derived_files": 0, "detections": 0, "jobs": 0}
+
+        # Upload files and composites/previews whose file record is gone
+        for directory in [self.upload_dir, *self.derived_dirs]:
+            entries = await asyncio.to_thread(list_stale_files, directory, self.min_age_seconds)
+            for start in range(0, len(entries), self.batch_size):
+                batch = entries[start:start + self.batch_size]
+                existing = await self._existing(list({file_id_of(entry.name) for entry in batch}))
+                orphans = [entry for entry in batch if file_id_of(entry.name) not in existing]
+                if orphans:
+                    removed = await asyncio.to_thread(remove_paths, [entry.path for entry in orphans])
+                    result["upload_files" if directory == self.upload_dir else "derived_files"] += removed
+                    if self.on_files_removed is not None:
+                        await self.on_files_removed(
+                            {file_id_of(entry.name) for entry in orphans}, [Path(entry.path) for entry in orphans]
+                        )
+                await self._pause()
+
+        # Detections and job references of missing files; $group streams the ids instead of one large distinct
+        referenced = set()
+        for collection, field, match in (
+            (self.db.detections, "$file_id", {}),
+            (self.db.analysis_jobs, "$file_ids", {"status": {"$in": ["completed", "failed"]}}),
+        ):
+            pipeline = [{"$match": match}] if match else []
+            if field == "$file_ids":
+                pipeline.append({"$unwind": field})
+            pipeline.append({"$group": {"_id": field}})
+            referenced.update([doc["_id"] async for doc in collection.aggregate(pipeline, allowDiskUse=True) if doc["_id"]])
+        referenced = sorted(referenced)
+        for start in range(0, len(referenced), self.batch_size):
+            batch = referenced[start:start + self.batch_size]
+            missing = sorted(set(batch) - await self._existing(batch))
+            if missing:
+                query = {"file_id": {"$in": missing}}
+                if self.on_detections_removed is not None:
+                    await self.on_detections_removed(missing)
+                result["detections"] += (await self.db.detections.delete_many(query)).deleted_count
+                # Pending jobs are left alone: a running job only analyzes the files that still exist
+                result["jobs"] += (await self.db.analysis_jobs.update_many(
+                    {"file_ids": {"$in": missing}, "status": {"$in": ["completed", "failed"]}},
+                    {"$pull": {"file_ids": {"$in": missing}}}
+                )).modified_count
+            await self._pause()
+
+        result["seconds"] = round(time.monotonic() - started, 3)
+        self.last_run = {**result, "finished_at": time.time()}
+        if any(result[key] for key in ("upload_files", "derived_files", "detections", "jobs")):
+            logger.info(f"Garbage collection removed {result}")
+        return result
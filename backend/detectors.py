@@ -0,0 +1,232 @@
+import abc
+import asyncio
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from preprocessing import to_rgb
+
+logger = logging.getLogger(__name__)
+
+# What to do with a frame
+REMOTE = "remote"  # send it to the remote model
+SKIP = "skip"  # nothing to detect, store no detections
+REUSE = "reuse"  # same content as an earlier frame, copy its detections
+
+
+@dataclass
+class Frame:
+    path: str
+    file_type: str = ""
+
+
+@dataclass
+class FrameDecision:
+    action: str = REMOTE
+    reason: str = ""
+    source: Optional[int] = None  # index of the frame whose detections are reused
+    candidates: List[Dict[str, float]] = field(default_factory=list)  # local hotspot boxes
+
+
+@dataclass
+class FrameSignature:
+    band_mean: np.ndarray
+    band_std: np.ndarray
+    dhash: int
+    hotspots: List[Dict[str, float]]
+
+
+def difference_hash(gray: Image.Image, size: int = 8) -> int:
+    """64-bit perceptual difference hash of a grayscale image"""
+    pixels = np.asarray(gray.resize((size + 1, size), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def hotspot_blobs(gray: np.ndarray, sigma: float = 3.0, grid: int = 16, min_pixels: int = 4) -> List[Dict[str, float]]:
+    """Candidate boxes (normalized x/y/width/height) around pixels hotter than mean + sigma * std.
+
+    Hot pixels are counted per cell of a ``grid`` x ``grid`` raster and
+    4-connected hot cells are merged into one blob.
+    """
+    std = float(gray.std())
+    if std == 0:
+        return []
+    hot = gray > float(gray.mean()) + sigma * std
+    height, width = hot.shape
+    ys = np.minimum((np.arange(height) * grid) // height, grid - 1)
+    xs = np.minimum((np.arange(width) * grid) // width, grid - 1)
+    counts = np.zeros((grid, grid), dtype=np.int64)
+    hot_y, hot_x = np.nonzero(hot)
+    np.add.at(counts, (ys[hot_y], xs[hot_x]), 1)
+    cells = counts >= min_pixels
+
+    blobs = []
+    seen = np.zeros_like(cells)
+    for start in zip(*np.nonzero(cells)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        queue = deque([start])
+        min_r = max_r = start[0]
+        min_c = max_c = start[1]
+        while queue:
+            r, c = queue.popleft()
+            min_r, max_r, min_c, max_c = min(min_r, r), max(max_r, r), min(min_c, c), max(max_c, c)
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if 0 <= nr < grid and 0 <= nc < grid and cells[nr, nc] and not seen[nr, nc]:
+                    seen[nr, nc] = True
+                    queue.append((nr, nc))
+        blobs.append({
+            "x": float(min_c) / grid,
+            "y": float(min_r) / grid,
+            "width": float(max_c - min_c + 1) / grid,
+            "height": float(max_r - min_r + 1) / grid,
+        })
+    return blobs
+
+
+def compute_signature(path: str, size: int = 256, hotspot_sigma: float = 3.0) -> Optional[FrameSignature]:
+    """Band statistics, perceptual hash and hotspot candidates of a downscaled frame"""
+    try:
+        image = Image.open(path)
+        image.draft("RGB", (size, size))
+        image.load()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    image = to_rgb(image)
+    image.thumbnail((size, size))
+    array = np.asarray(image, dtype=np.float32)
+    gray = image.convert("L")
+    return FrameSignature(
+        band_mean=array.mean(axis=(0, 1)),
+        band_std=array.std(axis=(0, 1)),
+        dhash=difference_hash(gray),
+        hotspots=hotspot_blobs(np.asarray(gray, dtype=np.float32), sigma=hotspot_sigma),
+    )
+
+
+class DetectorEngine(abc.ABC):
+    """Decides, for an ordered sequence of frames, which ones need the remote model"""
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def plan(self, frames: List[Frame]) -> List[FrameDecision]:
+        """One decision per frame, in the same order"""
+
+    def stats(self) -> Dict[str, int]:
+        return {}
+
+
+class RemoteEngine(DetectorEngine):
+    """Sends every frame to the remote model"""
+
+    name = "remote"
+
+    async def plan(self, frames: List[Frame]) -> List[FrameDecision]:
+        return [FrameDecision() for _ in frames]
+
+
+class LocalPrefilterEngine(DetectorEngine):
+    """Cheap NumPy/Pillow prefilter in front of the remote model.
+
+    Blank frames (every band nearly constant) are skipped, thermal frames
+    without hotspot candidates are skipped, and frames whose perceptual hash
+    and band means match the previous frame reuse that frame's detections.
+    """
+
+    name = "local"
+
+    def __init__(self, blank_std: float = 2.0, duplicate_distance: int = 3, duplicate_mean_delta: float = 4.0,
+                 hotspot_sigma: float = 3.0, skip_cold_thermal: bool = True):
+        self.blank_std = blank_std
+        self.duplicate_distance = duplicate_distance
+        self.duplicate_mean_delta = duplicate_mean_delta
+        self.hotspot_sigma = hotspot_sigma
+        self.skip_cold_thermal = skip_cold_thermal
+        self.counters = {"frames": 0, "remote": 0, "skipped_blank": 0, "skipped_no_hotspots": 0, "reused": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            blank_std=float(os.environ.get('PREFILTER_BLANK_STD', 2.0)),
+            duplicate_distance=int(os.environ.get('PREFILTER_DUPLICATE_DISTANCE', 3)),
+            duplicate_mean_delta=float(os.environ.get('PREFILTER_DUPLICATE_MEAN_DELTA', 4.0)),
+            hotspot_sigma=float(os.environ.get('PREFILTER_HOTSPOT_SIGMA', 3.0)),
+            skip_cold_thermal=os.environ.get('PREFILTER_SKIP_COLD_THERMAL', '1') == '1',
+        )
+
+    def decide(self, signature: Optional[FrameSignature], previous: Optional[FrameSignature], file_type: str) -> Tuple[str, str]:
+        if signature is None:
+            return REMOTE, "undecodable"
+        if float(signature.band_std.max()) < self.blank_std and not signature.hotspots:
+            return SKIP, "blank"
+        if (
+            previous is not None
+            and hamming_distance(signature.dhash, previous.dhash) <= self.duplicate_distance
+            and float(np.abs(signature.band_mean - previous.band_mean).max()) < self.duplicate_mean_delta
+            and len(signature.hotspots) == len(previous.hotspots)
+        ):
+            return REUSE, "duplicate"
+        if self.skip_cold_thermal and "thermal" in (file_type or "").lower() and not signature.hotspots:
+            return SKIP, "no_hotspots"
+        return REMOTE, "changed"
+
+    def plan_signatures(self, frames: List[Frame], signatures: List[Optional[FrameSignature]]) -> List[FrameDecision]:
+        decisions = []
+        previous: Dict[str, Tuple[int, FrameSignature]] = {}  # per file type: (index, signature)
+        for index, (frame, signature) in enumerate(zip(frames, signatures)):
+            last = previous.get(frame.file_type)
+            action, reason = self.decide(signature, last[1] if last else None, frame.file_type)
+            decision = FrameDecision(action=action, reason=reason, candidates=signature.hotspots if signature else [])
+            if action == REUSE:
+                # Only frames that were not themselves reused are remembered as "previous"
+                decision.source = last[0]
+                if decisions[last[0]].action == SKIP:
+                    decision.action, decision.reason, decision.source = SKIP, decisions[last[0]].reason, None
+            if signature is not None and action != REUSE:
+                previous[frame.file_type] = (index, signature)
+            decisions.append(decision)
+
+            self.counters["frames"] += 1
+            if decision.action == REMOTE:
+                self.counters["remote"] += 1
+            elif decision.action == REUSE:
+                self.counters["reused"] += 1
+            else:
+                self.counters["skipped_blank" if decision.reason == "blank" else "skipped_no_hotspots"] += 1
+        return decisions
+
+    async def plan(self, frames: List[Frame]) -> List[FrameDecision]:
+        signatures = await asyncio.gather(
+            *(asyncio.to_thread(compute_signature, frame.path, hotspot_sigma=self.hotspot_sigma) for frame in frames)
+        )
+        return self.plan_signatures(frames, list(signatures))
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "llm_calls_saved": self.counters["frames"] - self.counters["remote"]}
+
+
+DETECTOR_ENGINES = {
+    RemoteEngine.name: RemoteEngine,
+    LocalPrefilterEngine.name: LocalPrefilterEngine.from_env,
+}
+
+
+def engine_from_env() -> DetectorEngine:
+    """Engine named by DETECTOR_ENGINE; every frame goes to the remote model unless "local" opts in to the prefilter"""
+    name = os.environ.get('DETECTOR_ENGINE', RemoteEngine.name)
+    if name not in DETECTOR_ENGINES:
+        logger.warning(f"Unknown DETECTOR_ENGINE {name!r}, using {RemoteEngine.name!r}")
+        name = RemoteEngine.name
+    return DETECTOR_ENGINES[name]()
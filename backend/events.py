@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+# Job fields pushed to the dashboard when a job changes
+JOB_EVENT_FIELDS = (
+    "id", "status", "files_done", "files_total", "detection_count",
+    "attempts", "error", "completed_at",
+)
+
+
+class EventBus:
+    """In-process pub/sub of dashboard events.
+
+    Each subscriber gets a bounded queue; a subscriber that falls behind is
+    sent a ``resync`` event and its backlog dropped, instead of letting the
+    queue grow without bound.
+
+    With ``EVENTS_SOURCE=change_streams`` local publishing is disabled and
+    events are fed from Mongo change streams instead (see
+    ``ChangeStreamBridge``), so every replica sees every change.
+    """
+
+    def __init__(self, queue_size: int = 1000, local_publish: bool = True):
+        self.queue_size = queue_size
+        self.local_publish = local_publish
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            queue_size=int(os.environ.get('EVENTS_QUEUE_SIZE', 1000)),
+            local_publish=os.environ.get('EVENTS_SOURCE', 'local') != 'change_streams',
+        )
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event_type: str, data: Any):
+        """Publish an event raised by this process"""
+        if self.local_publish:
+            self.dispatch(event_type, data)
+
+    def dispatch(self, event_type: str, data: Any):
+        if not self._subscribers:
+            return
+        event = (event_type, jsonable_encoder(data))
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumer: drop its backlog and ask it to reload
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("resync", {}))
+
+    def publish_job(self, job_id: str, fields: Dict[str, Any]):
+        data = {key: value for key, value in fields.items() if key in JOB_EVENT_FIELDS}
+        data["id"] = job_id
+        self.publish("job.updated", data)
+
+    async def stream(self, is_disconnected, heartbeat_seconds: float = 15) -> AsyncIterator[str]:
+        """Server-sent events for one client until it disconnects"""
+        queue = self.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event_type, data = await asyncio.wait_for(queue.get(), timeout=heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+
+class ChangeStreamBridge:
+    """Feeds an EventBus from Mongo change streams (requires a replica set)"""
+
+    def __init__(self, db, bus: EventBus):
+        self.db = db
+        self.bus = bus
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def handle(self, change: Dict[str, Any]):
+        collection = change["ns"]["coll"]
+        operation = change["operationType"]
+        document = change.get("fullDocument") or {}
+        document.pop("_id", None)
+
+        if collection == "analysis_jobs" and operation == "insert":
+            document.pop("results", None)
+            self.bus.dispatch("job.created", document)
+        elif collection == "analysis_jobs" and operation in ("update", "replace") and document:
+            self.bus.dispatch("job.updated", {key: document.get(key) for key in JOB_EVENT_FIELDS})
+        elif collection == "detections" and operation == "insert":
+            self.bus.dispatch("detections.created", {
+                "job_id": document.get("job_id"),
+                "file_id": document.get("file_id"),
+                "detections": [document],
+            })
+        elif collection == "files" and operation == "insert":
+            self.bus.dispatch("file.created", document)
+        elif operation in ("delete", "drop", "invalidate"):
+            # Deleted documents only carry their ObjectId, so clients reload instead
+            self.bus.dispatch("resync", {})
+
+    async def _run(self):
+        pipeline = [{"$match": {"ns.coll": {"$in": ["files", "analysis_jobs", "detections"]}}}]
+        while True:
+            try:
+                async with self.db.watch(pipeline, full_document="updateLookup") as stream:
+                    async for change in stream:
+                        self.handle(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Change stream error, reconnecting: {str(e)}")
+                self.bus.dispatch("resync", {})
+                await asyncio.sleep(5)
@@ -0,0 +1,131 @@
+import io
+from typing import Any, Dict, List
+
+import numpy as np
+import orjson
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+from spatial import to_micros
+
+PARQUET = "parquet"
+ARROW = "arrow"
+NDJSON = "ndjson"
+
+# Media type and file extension per export format
+FORMATS = {
+    PARQUET: ("application/vnd.apache.parquet", "parquet"),
+    ARROW: ("application/vnd.apache.arrow.stream", "arrows"),
+    NDJSON: ("application/x-ndjson", "ndjson"),
+}
+
+# Stored fields read for an export
+EXPORT_PROJECTION = {
+    "_id": 0, "id": 1, "file_id": 1, "job_id": 1, "track_id": 1, "target_type": 1,
+    "confidence": 1, "bounding_box": 1, "timestamp": 1,
+}
+
+# One row per detection, with the bounding box flattened into float columns
+DETECTION_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("file_id", pa.string()),
+    ("job_id", pa.string()),
+    ("track_id", pa.string()),
+    ("target_type", pa.string()),
+    ("confidence", pa.float64()),
+    ("bbox_x", pa.float64()),
+    ("bbox_y", pa.float64()),
+    ("bbox_width", pa.float64()),
+    ("bbox_height", pa.float64()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+])
+
+BOX_COLUMNS = (("bbox_x", "x"), ("bbox_y", "y"), ("bbox_width", "width"), ("bbox_height", "height"))
+
+
+def flatten(doc: Dict[str, Any]) -> Dict[str, Any]:
+    box = doc.get("bounding_box") or {}
+    row = {name: doc.get(name) for name in ("id", "file_id", "job_id", "track_id", "target_type", "confidence")}
+    row.update({column: box.get(key) for column, key in BOX_COLUMNS})
+    row["timestamp"] = doc.get("timestamp")
+    return row
+
+
+def to_record_batch(docs: List[Dict[str, Any]]) -> pa.RecordBatch:
+    """Columnar batch of stored detections; missing values become nulls"""
+    boxes = [doc.get("bounding_box") or {} for doc in docs]
+    timestamps = [doc.get("timestamp") for doc in docs]
+    missing = np.array([not value for value in timestamps], dtype=bool)
+    micros = to_micros([value or "1970-01-01T00:00:00" for value in timestamps])
+    arrays = [pa.array([doc.get(name) for doc in docs], type=pa.string()) for name in ("id", "file_id", "job_id", "track_id", "target_type")]
+    arrays.append(pa.array([doc.get("confidence") for doc in docs], type=pa.float64()))
+    arrays.extend(pa.array([box.get(key) for box in boxes], type=pa.float64()) for _, key in BOX_COLUMNS)
+    arrays.append(pa.array(micros, type=pa.timestamp("us", tz="UTC"), mask=missing))
+    return pa.RecordBatch.from_arrays(arrays, schema=DETECTION_SCHEMA)
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file collecting what a writer produced since the last ``drain``"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class DetectionExporter:
+    """Encodes detections batch by batch; ``write`` returns the bytes ready to send.
+
+    Parquet gets one row group per batch and Arrow one record batch per
+    batch, so only the current batch is ever held. The Parquet footer is
+    written by ``close``. Read the result with ``pandas.read_parquet``,
+    ``pyarrow.ipc.open_stream`` or ``pandas.read_json(lines=True)``.
+    """
+
+    def __init__(self, export_format: str, compression: str = "snappy"):
+        if export_format not in FORMATS:
+            raise ValueError(f"Unsupported export format {export_format!r}")
+        self.format = export_format
+        self.sink = ChunkSink()
+        self.writer = None
+        if export_format == PARQUET:
+            self.writer = pq.ParquetWriter(self.sink, DETECTION_SCHEMA, compression=compression)
+        elif export_format == ARROW:
+            self.writer = pa.ipc.new_stream(self.sink, DETECTION_SCHEMA)
+
+    def write(self, docs: List[Dict[str, Any]]) -> bytes:
+        if not docs:
+            return b""
+        if self.format == NDJSON:
+            return b"".join(orjson.dumps(flatten(doc), default=str) + b"\n" for doc in docs)
+        batch = to_record_batch(docs)
+        if self.format == PARQUET:
+            self.writer.write_batch(batch, row_group_size=len(docs))
+        else:
+            self.writer.write_batch(batch)
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        """Trailing bytes (Parquet footer, Arrow end-of-stream marker)"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        return self.sink.drain()
@@ -0,0 +1,106 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+# Indexes required by the API queries and the analysis job queue, per collection
+INDEXES: Dict[str, List[IndexModel]] = {
+    "files": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("uploaded_at", DESCENDING), ("id", DESCENDING)], name="uploaded_at_id"),
+        IndexModel([("file_type", ASCENDING), ("uploaded_at", DESCENDING), ("id", DESCENDING)], name="file_type_uploaded_at_id"),
+        # Keyframes extracted from one sequence (see sequences.py)
+        IndexModel([("sequence_id", ASCENDING), ("uploaded_at", DESCENDING), ("id", DESCENDING)], name="sequence_id_uploaded_at_id"),
+    ],
+    "sequences": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        # Keyframe extraction runs through a JobQueue of its own
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_lease_expires_at"),
+    ],
+    "analysis_jobs": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_lease_expires_at"),
+    ],
+    "detections": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("timestamp", DESCENDING), ("id", DESCENDING)], name="timestamp_id"),
+        IndexModel([("file_id", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="file_id_timestamp_id"),
+        IndexModel([("job_id", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="job_id_timestamp_id"),
+        IndexModel([("target_type", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="target_type_timestamp_id"),
+        IndexModel([("job_id", ASCENDING), ("file_id", ASCENDING)], name="job_id_file_id"),
+        # Region queries across files: grid cells (see spatial.CELL_GRID), optionally by class, newest first
+        IndexModel([("cells", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="cells_timestamp_id"),
+        IndexModel([("target_type", ASCENDING), ("cells", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="target_type_cells_timestamp_id"),
+    ],
+    "tracks": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        IndexModel([("job_id", ASCENDING), ("length", DESCENDING)], name="job_id_length"),
+    ],
+}
+
+
+async def ensure_indexes(db) -> bool:
+    """Create the required indexes and verify they exist; returns False if any are missing"""
+    ok = True
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        try:
+            await collection.create_indexes(models)
+        except Exception as e:
+            logger.error(f"Could not create indexes on {collection_name}: {str(e)}")
+
+        existing = await collection.index_information()
+        missing = [model.document["name"] for model in models if model.document["name"] not in existing]
+        if missing:
+            ok = False
+            logger.error(f"Missing indexes on {collection_name}: {', '.join(missing)}")
+        else:
+            logger.info(f"Verified {len(models)} indexes on {collection_name}")
+    return ok
+
+
+def summarize_plan(stage: Dict[str, Any]) -> str:
+    """Render a winning plan as e.g. 'FETCH <- IXSCAN file_id_timestamp'"""
+    parts = []
+    while stage:
+        label = stage.get("stage", "?")
+        if stage.get("indexName"):
+            label += f" {stage['indexName']}"
+        parts.append(label)
+        stage = stage.get("inputStage") or (stage.get("inputStages") or [None])[0]
+    return " <- ".join(parts)
+
+
+class QueryPlanLogger:
+    """Logs the winning plan of each distinct API query shape once (QUERY_EXPLAIN=1)"""
+
+    def __init__(self, enabled: Optional[bool] = None):
+        if enabled is None:
+            enabled = os.environ.get('QUERY_EXPLAIN', '').lower() in ('1', 'true', 'yes')
+        self.enabled = enabled
+        self._seen = set()
+
+    async def log(self, collection, query: Dict[str, Any], sort: Optional[List[Tuple[str, int]]] = None):
+        if not self.enabled:
+            return
+        shape = (collection.name, tuple(sorted(query)), tuple(sort or ()))
+        if shape in self._seen:
+            return
+        self._seen.add(shape)
+        try:
+            cursor = collection.find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            explanation = await cursor.explain()
+            plan = summarize_plan(explanation.get("queryPlanner", {}).get("winningPlan", {}))
+        except Exception as e:
+            logger.warning(f"explain() failed for {collection.name} {query}: {str(e)}")
+            return
+        level = logging.WARNING if "COLLSCAN" in plan else logging.INFO
+        logger.log(level, f"Query plan {collection.name} filter={sorted(query)} sort={sort}: {plan}")
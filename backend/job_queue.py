@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+class RetryLater(Exception):
+    """Raised by a handler to hand its job back without using up an attempt"""
+
+    def __init__(self, message: str, delay: float):
+        super().__init__(message)
+        self.delay = delay
+
+
+def utc_now_iso(offset_seconds: float = 0) -> str:
+    """Current UTC time as the ISO string format used for stored timestamps"""
+    return (datetime.now(timezone.utc) + timedelta(seconds=offset_seconds)).isoformat()
+
+
+class JobQueue:
+    """Mongo-backed job queue.
+
+    Jobs are documents of ``collection`` (``analysis_jobs``, or ``sequences``
+    for keyframe extraction) with ``id``, ``status``, ``attempts`` and
+    ``created_at`` fields. A worker claims a job with an
+    atomic ``find_one_and_update`` that sets ``lease_owner`` and
+    ``lease_expires_at``, keeps the lease alive with a heartbeat while the
+    handler runs, and releases it on completion. Jobs whose lease expired (the
+    replica crashed or was restarted) become claimable again until
+    ``max_attempts`` is reached.
+
+    While ``paused_for`` returns a positive delay (e.g. the model provider is
+    down) workers stop claiming jobs.
+    """
+
+    def __init__(
+        self,
+        collection,
+        handler: Callable[[str], Awaitable[Optional[Dict[str, Any]]]],
+        workers: int = 2,
+        lease_seconds: float = 120,
+        max_attempts: int = 3,
+        poll_interval: float = 2.0,
+        retry_backoff: float = 5.0,
+        on_change: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        paused_for: Optional[Callable[[], float]] = None,
+        name: str = "analysis",
+    ):
+        self.collection = collection
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.poll_interval = poll_interval
+        self.retry_backoff = retry_backoff
+        self.on_change = on_change
+        self.paused_for = paused_for
+        self.name = name
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self._running_jobs: Dict[str, str] = {}
+
+    @classmethod
+    def from_env(cls, collection, handler, on_change=None, paused_for=None):
+        """Build a queue configured from ANALYSIS_* environment variables"""
+        return cls(
+            collection,
+            handler,
+            on_change=on_change,
+            paused_for=paused_for,
+            workers=int(os.environ.get('ANALYSIS_WORKERS', 2)),
+            lease_seconds=float(os.environ.get('ANALYSIS_JOB_LEASE_SECONDS', 120)),
+            max_attempts=int(os.environ.get('ANALYSIS_JOB_MAX_ATTEMPTS', 3)),
+            poll_interval=float(os.environ.get('ANALYSIS_QUEUE_POLL_SECONDS', 2)),
+        )
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running_jobs)
+
+    def start(self):
+        if self._tasks:
+            return
+        for index in range(self.workers):
+            worker_id = f"{self.instance_id}:{index}"
+            self._tasks.append(asyncio.create_task(self._worker_loop(worker_id)))
+        logger.info(f"Started {self.workers} {self.name} workers ({self.instance_id})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _changed(self, job_id: str, fields: Dict[str, Any]):
+        if self.on_change is not None:
+            try:
+                self.on_change(job_id, fields)
+            except Exception as e:
+                logger.warning(f"Job change callback failed: {str(e)}")
+
+    def notify(self):
+        """Wake idle workers in this process after a job has been enqueued"""
+        self._wakeup.set()
+
+    async def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Atomically claim the oldest runnable job, or an expired lease"""
+        now = utc_now_iso()
+        job = await self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "pending", "$or": [{"available_at": None}, {"available_at": {"$lte": now}}]},
+                    {"status": "processing", "lease_expires_at": {"$lt": now}},
+                ],
+                "attempts": {"$not": {"$gte": self.max_attempts}},
+            },
+            {
+                "$set": {
+                    "status": "processing",
+                    "lease_owner": worker_id,
+                    "lease_expires_at": utc_now_iso(self.lease_seconds),
+                    "started_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is not None:
+            self._changed(job["id"], job)
+        return job
+
+    async def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease; returns False if another worker took the job over"""
+        result = await self.collection.update_one(
+            {"id": job_id, "lease_owner": worker_id},
+            {"$set": {"lease_expires_at": utc_now_iso(self.lease_seconds)}},
+        )
+        return result.matched_count == 1
+
+    async def complete(self, job_id: str, worker_id: str, fields: Optional[Dict[str, Any]] = None) -> bool:
+        update = dict(fields or {})
+        update.update({
+            "status": "completed",
+            "completed_at": utc_now_iso(),
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "error": None,
+        })
+        result = await self.collection.update_one(
+            {"id": job_id, "lease_owner": worker_id},
+            {"$set": update},
+        )
+        if result.matched_count == 1:
+            self._changed(job_id, update)
+        return result.matched_count == 1
+
+    async def fail(self, job_id: str, worker_id: str, attempts: int, error: str):
+        """Schedule a retry with backoff, or mark the job failed when out of attempts"""
+        if attempts < self.max_attempts:
+            delay = self.retry_backoff * (2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+            update = {"status": "pending", "available_at": utc_now_iso(delay)}
+        else:
+            update = {"status": "failed", "completed_at": utc_now_iso()}
+        update.update({"lease_owner": None, "lease_expires_at": None, "error": error})
+        await self.collection.update_one({"id": job_id, "lease_owner": worker_id}, {"$set": update})
+        self._changed(job_id, update)
+
+    async def release(self, job_id: str, worker_id: str, delay: float = 0, error: Optional[str] = None):
+        """Hand a job back to the queue without counting the attempt (shutdown, RetryLater)"""
+        update = {"status": "pending", "lease_owner": None, "lease_expires_at": None}
+        if delay:
+            update["available_at"] = utc_now_iso(delay)
+        if error:
+            update["error"] = error
+        await self.collection.update_one(
+            {"id": job_id, "lease_owner": worker_id},
+            {"$set": update, "$inc": {"attempts": -1}},
+        )
+        self._changed(job_id, update)
+
+    async def reap_exhausted(self) -> int:
+        """Fail jobs whose lease expired after their last allowed attempt"""
+        now = utc_now_iso()
+        result = await self.collection.update_many(
+            {
+                "status": "processing",
+                "lease_expires_at": {"$lt": now},
+                "attempts": {"$gte": self.max_attempts},
+            },
+            {"$set": {
+                "status": "failed",
+                "completed_at": now,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "error": "Lease expired after final attempt",
+            }},
+        )
+        if result.modified_count:
+            logger.warning(f"Marked {result.modified_count} abandoned {self.name} jobs as failed")
+        return result.modified_count
+
+    async def _keep_alive(self, job_id: str, worker_id: str, task: asyncio.Task):
+        """Renew the lease until the handler finishes.
+
+        A failed heartbeat (e.g. a brief database outage) is retried on the
+        next interval; the handler is only cancelled once another worker
+        took the job over or the lease has run out without a renewal.
+        """
+        interval = max(self.lease_seconds / 3, 0.1)
+        # The lease was set when the job was claimed, just before this started
+        expires = time.monotonic() + self.lease_seconds
+        while True:
+            await asyncio.sleep(interval)
+            renewed_at = time.monotonic()
+            try:
+                owned = await self.heartbeat(job_id, worker_id)
+            except Exception as e:
+                if time.monotonic() < expires:
+                    logger.warning(f"Heartbeat failed for {self.name} job {job_id}, retrying: {str(e)}")
+                    continue
+                logger.warning(f"Lease expired on {self.name} job {job_id} after failed heartbeats; cancelling")
+                task.cancel(f"lease expired on {self.name} job {job_id}")
+                return
+            if not owned:
+                logger.warning(f"Lost lease on {self.name} job {job_id}; cancelling")
+                task.cancel(f"lease lost on {self.name} job {job_id}")
+                return
+            expires = renewed_at + self.lease_seconds
+
+    async def run_job(self, job: Dict[str, Any], worker_id: str):
+        job_id = job["id"]
+        self._running_jobs[job_id] = worker_id
+        handler_task = asyncio.create_task(self.handler(job_id))
+        keep_alive = asyncio.create_task(self._keep_alive(job_id, worker_id, handler_task))
+        try:
+            fields = await handler_task
+        except asyncio.CancelledError:
+            if not handler_task.cancelled() or asyncio.current_task().cancelling():
+                # The worker itself is shutting down; give the job back
+                handler_task.cancel()
+                await asyncio.shield(self.release(job_id, worker_id))
+                raise
+            # Cancelled by the heartbeat: another worker owns the job now
+            return
+        except RetryLater as e:
+            logger.warning(f"{self.name.capitalize()} job {job_id} postponed: {str(e)}")
+            await self.release(job_id, worker_id, e.delay, str(e))
+        except Exception as e:
+            logger.error(f"{self.name.capitalize()} job {job_id} failed (attempt {job.get('attempts', 1)}): {str(e)}")
+            await self.fail(job_id, worker_id, job.get("attempts", 1), str(e))
+        else:
+            if not await self.complete(job_id, worker_id, fields):
+                logger.warning(f"{self.name.capitalize()} job {job_id} finished after its lease was lost")
+        finally:
+            keep_alive.cancel()
+            self._running_jobs.pop(job_id, None)
+
+    async def _worker_loop(self, worker_id: str):
+        while True:
+            try:
+                paused = self.paused_for() if self.paused_for is not None else 0
+                if paused > 0:
+                    await asyncio.sleep(min(paused, self.poll_interval))
+                    continue
+                job = await self.claim(worker_id)
+                if job is None:
+                    await self.reap_exhausted()
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self.run_job(job, worker_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.name.capitalize()} worker {worker_id} error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
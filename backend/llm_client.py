@@ -0,0 +1,335 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from job_queue import RetryLater
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: timeouts, rate limits and server errors
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504, 529}
+
+
+class LlmError(Exception):
+    """A model request failed after retries (or could not be retried)"""
+
+
+class LlmRejectedError(LlmError):
+    """The provider rejected the request itself (bad image, content policy, ...); retrying will not help"""
+
+
+class CircuitOpenError(LlmError, RetryLater):
+    """Calls are suspended because the provider keeps failing"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM circuit breaker is open, retrying in {retry_after:.0f}s", retry_after)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transport failures and retryable HTTP statuses; the error message is never inspected"""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    # httpx and provider SDK errors carry the status as an attribute or on their response
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status, int) and status in RETRYABLE_STATUS
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``rate_per_minute``; a rate of 0 disables it"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        if self.rate <= 0:
+            return
+        # Requests larger than the bucket are let through once it is full
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and lets one probe through after ``reset_seconds``"""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.retry_after() == 0 else "open"
+
+    def retry_after(self) -> float:
+        """Seconds until calls are allowed again (0 when closed or ready to probe)"""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def before_call(self):
+        if self.opened_at is None:
+            return
+        delay = self.retry_after()
+        if delay > 0 or self._probing:
+            raise CircuitOpenError(delay or self.reset_seconds)
+        self._probing = True
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("LLM circuit breaker closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_cancelled(self):
+        self._probing = False
+
+    def record_rejected(self):
+        """The provider refused this request; says nothing about its health, so only the probe is released"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+            logger.warning(f"LLM circuit breaker opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+class EmergentTransport:
+    """Sends requests through the Emergent integration (one chat session per request)"""
+
+    def __init__(self, provider: str, model: str, api_key: Optional[str]):
+        self.provider = provider
+        self.model = model
+        self.api_key = api_key
+
+    async def send(self, system_message: str, prompt: str, images_base64: List[str]) -> str:
+        # Imported here so the module (and HttpTransport) works without the private package installed
+        from emergentintegrations.llm.chat import ImageContent, LlmChat, UserMessage
+
+        chat = LlmChat(
+            api_key=self.api_key,
+            session_id=f"analysis-{uuid.uuid4()}",
+            system_message=system_message
+        ).with_model(self.provider, self.model)
+        return await chat.send_message(UserMessage(
+            text=prompt,
+            file_contents=[ImageContent(image_base64=image) for image in images_base64]
+        ))
+
+    async def stream(self, system_message: str, prompt: str, images_base64: List[str]) -> AsyncIterator[str]:
+        # The integration returns whole responses, so the stream is a single chunk
+        yield await self.send(system_message, prompt, images_base64)
+
+    async def close(self):
+        pass
+
+
+class HttpTransport:
+    """OpenAI-compatible chat completions endpoint over a pooled keep-alive HTTP client.
+
+    Also used to run the analysis against a local stub server in tests.
+    """
+
+    def __init__(self, base_url: str, model: str, api_key: Optional[str], max_connections: int = 32):
+        self.model = model
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else None,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=None,  # per-call timeouts are enforced by LlmClient
+        )
+
+    def request_body(self, system_message: str, prompt: str, images_base64: List[str], stream: bool = False) -> Dict:
+        content = [{"type": "text", "text": prompt}]
+        content.extend(
+            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image}"}}
+            for image in images_base64
+        )
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": content},
+            ],
+            "stream": stream,
+        }
+
+    async def send(self, system_message: str, prompt: str, images_base64: List[str]) -> str:
+        response = await self.client.post("/chat/completions", json=self.request_body(system_message, prompt, images_base64))
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    async def stream(self, system_message: str, prompt: str, images_base64: List[str]) -> AsyncIterator[str]:
+        """Content deltas of a server-sent events completion stream"""
+        body = self.request_body(system_message, prompt, images_base64, stream=True)
+        async with self.client.stream("POST", "/chat/completions", json=body) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    return
+                choices = json.loads(data).get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class LlmClient:
+    """Shared model client: rate limits, per-call timeouts, retries and a circuit breaker.
+
+    Requests and estimated tokens are budgeted per minute with token buckets,
+    and ``timeout`` bounds the wait for each chunk of a streamed response.
+    Retryable failures (timeouts, 429/5xx, connection errors) are retried with
+    jittered exponential backoff and counted by the circuit breaker; while the
+    breaker is open calls fail fast with ``CircuitOpenError``, which the job
+    queue treats as "retry later" rather than a failed attempt.
+    """
+
+    def __init__(self, transport, system_message: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_retries: int = 4, backoff_base: float = 1.0, backoff_max: float = 30.0, timeout: float = 120.0,
+                 image_tokens: int = 800, breaker: Optional[CircuitBreaker] = None):
+        self.transport = transport
+        self.system_message = system_message
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.image_tokens = image_tokens
+        self.breaker = breaker or CircuitBreaker()
+        self.counters = {"requests": 0, "retries": 0, "failures": 0, "timeouts": 0, "rejected": 0}
+        self.in_flight = 0  # requests currently streaming
+
+    @classmethod
+    def from_env(cls, provider: str, model: str, system_message: str):
+        """Build a client configured from LLM_* environment variables"""
+        api_key = os.environ.get('LLM_API_KEY') or os.environ.get('EMERGENT_LLM_KEY')
+        base_url = os.environ.get('LLM_BASE_URL')
+        if base_url:
+            transport = HttpTransport(base_url, model, api_key, int(os.environ.get('LLM_MAX_CONNECTIONS', 32)))
+        else:
+            transport = EmergentTransport(provider, model, api_key)
+        return cls(
+            transport,
+            system_message,
+            requests_per_minute=float(os.environ.get('LLM_REQUESTS_PER_MINUTE', 0)),
+            tokens_per_minute=float(os.environ.get('LLM_TOKENS_PER_MINUTE', 0)),
+            max_retries=int(os.environ.get('LLM_MAX_RETRIES', 4)),
+            backoff_base=float(os.environ.get('LLM_BACKOFF_SECONDS', 1.0)),
+            backoff_max=float(os.environ.get('LLM_BACKOFF_MAX_SECONDS', 30.0)),
+            timeout=float(os.environ.get('LLM_TIMEOUT_SECONDS', 120)),
+            image_tokens=int(os.environ.get('LLM_IMAGE_TOKENS', 800)),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.environ.get('LLM_BREAKER_FAILURES', 5)),
+                reset_seconds=float(os.environ.get('LLM_BREAKER_RESET_SECONDS', 30)),
+            ),
+        )
+
+    def estimate_tokens(self, prompt: str, images_base64: List[str]) -> int:
+        return (len(self.system_message) + len(prompt)) // 4 + self.image_tokens * len(images_base64)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry (0-based)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def paused_for(self) -> float:
+        """Seconds the job queue should wait before claiming new work"""
+        return self.breaker.retry_after()
+
+    async def stream(self, prompt: str, images_base64: List[str]) -> AsyncIterator[str]:
+        """Response text chunks as they arrive.
+
+        Failures before the first chunk are retried; once text has been
+        yielded a failure raises ``LlmError``, since the caller may already
+        have acted on it.
+        """
+        tokens = self.estimate_tokens(prompt, images_base64)
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(tokens)
+            self.counters["requests"] += 1
+            self.in_flight += 1
+            received = False
+            chunks = self.transport.stream(self.system_message, prompt, images_base64)
+            try:
+                while True:
+                    try:
+                        # Timeout while waiting for the first or next chunk
+                        chunk = await asyncio.wait_for(anext(chunks), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    received = True
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                self.breaker.record_cancelled()
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.counters["timeouts"] += 1
+                if not is_retryable(e):
+                    # The provider answered; it just did not like this request
+                    self.breaker.record_rejected()
+                    self.counters["rejected"] += 1
+                    raise LlmRejectedError(str(e) or type(e).__name__) from e
+                self.breaker.record_failure()
+                if received or attempt >= self.max_retries:
+                    self.counters["failures"] += 1
+                    raise LlmError(f"Model request failed after {attempt + 1} attempts: {str(e) or type(e).__name__}") from e
+                delay = self.backoff(attempt)
+                attempt += 1
+                self.counters["retries"] += 1
+                logger.warning(f"Model request failed ({str(e) or type(e).__name__}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            finally:
+                self.in_flight -= 1
+                await chunks.aclose()
+            self.breaker.record_success()
+            return
+
+    async def complete(self, prompt: str, images_base64: List[str]) -> str:
+        return "".join([chunk async for chunk in self.stream(prompt, images_base64)])
+
+    def stats(self):
+        return {**self.counters, "in_flight": self.in_flight, "circuit": self.breaker.state, "retry_after": round(self.breaker.retry_after(), 1)}
+
+    async def close(self):
+        await self.transport.close()
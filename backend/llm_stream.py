@@ -0,0 +1,112 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, FiniteFloat, ValidationError
+
+logger = logging.getLogger(__name__)
+
+
+class BoundingBoxSchema(BaseModel):
+    """Any finite box; boxes slightly outside the image are clamped by post-processing (``sanitize_boxes``)"""
+    model_config = ConfigDict(extra="ignore")
+
+    x: FiniteFloat
+    y: FiniteFloat
+    width: FiniteFloat
+    height: FiniteFloat
+
+
+class DetectionSchema(BaseModel):
+    """One detection as the model is asked to return it"""
+    model_config = ConfigDict(extra="ignore")
+
+    type: str = Field(min_length=1, max_length=100)
+    confidence: float = Field(ge=0, le=1)
+    bbox: BoundingBoxSchema
+    description: Optional[str] = None
+
+
+def validate_detection(item: Any) -> Optional[Dict]:
+    """The detection as a plain dict, or None if it does not match the schema"""
+    try:
+        return DetectionSchema.model_validate(item).model_dump(exclude_none=True)
+    except ValidationError as e:
+        logger.warning(f"Rejected malformed detection {str(item)[:200]}: {e.errors()[0]['msg']}")
+        return None
+
+
+class JsonArrayStream:
+    """Incremental parser for the first top-level JSON array in streamed text.
+
+    ``feed`` returns the items completed by each chunk, so they can be used
+    before the response ends. Text before the array (e.g. a ```json fence or
+    prose) and after it is ignored. An item that is not valid JSON is
+    counted in ``malformed`` and skipped without affecting the others.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.complete = False
+        self.malformed = 0
+        self._buffer = ""
+        self._scan = 0  # position in the buffer scanned so far
+        self._depth = 0  # nesting inside the current item
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        if self.complete:
+            return []
+        self._buffer += chunk
+        if not self.started:
+            fence = self._buffer.find("```json")
+            start = self._buffer.find("[", fence + 7 if fence >= 0 else 0)
+            if start < 0:
+                # Keep a short tail in case a fence is split across chunks
+                self._buffer = self._buffer[-8:] if fence < 0 else self._buffer
+                return []
+            self.started = True
+            self._buffer = self._buffer[start + 1:]
+            self._scan = 0
+
+        items = []
+        item_start = 0
+        buffer = self._buffer
+        position = self._scan
+        while position < len(buffer):
+            char = buffer[position]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}" and self._depth > 0:
+                self._depth -= 1
+            elif char in ",]" and self._depth == 0:
+                self._add_item(buffer[item_start:position], items)
+                item_start = position + 1
+                if char == "]":
+                    self.complete = True
+                    break
+            position += 1
+
+        self._buffer = buffer[item_start:]
+        self._scan = position - item_start
+        return items
+
+    def _add_item(self, text: str, items: List[Any]):
+        text = text.strip()
+        if not text:
+            return
+        try:
+            items.append(json.loads(text))
+        except json.JSONDecodeError:
+            self.malformed += 1
+            logger.warning(f"Skipped malformed item in model response: {text[:200]}")
@@ -0,0 +1,228 @@
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers sub-millisecond parsing up to multi-minute model calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+INF_BUCKET = 'le="+Inf"'
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[Tuple[str, ...], List[float]] = {}  # per-bucket counts, then sum, then count
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0.0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self):
+        for key, series in self.series.items():
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % format_value(bound)
+                yield f"{self.name}_bucket{format_labels(self.labels, key, le)} {format_value(cumulative)}"
+            yield f"{self.name}_bucket{format_labels(self.labels, key, INF_BUCKET)} {format_value(series[-1])}"
+            yield f"{self.name}_sum{format_labels(self.labels, key)} {format_value(series[-2])}"
+            yield f"{self.name}_count{format_labels(self.labels, key)} {format_value(series[-1])}"
+
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format.
+
+    Metrics are updated from the event loop only, so no locking is done.
+    Values owned by other components (queue depth, client counters) are
+    read at scrape time by collectors registered with ``collector``.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def collector(self, collect: Callable[[], Iterable[Metric]]):
+        self.collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            for metric in collect():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """Seconds and calls per stage of one job, stored on the job document.
+
+    Files of a job are processed concurrently, so stage totals can add up
+    to more than the job's wall-clock time.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, List[float]] = {}
+
+    def add(self, stage: str, seconds: float):
+        totals = self.stages.setdefault(stage, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {stage: {"seconds": round(seconds, 4), "count": count} for stage, (seconds, count) in self.stages.items()}
+        result["total"] = {"seconds": round(time.perf_counter() - self.started, 4), "count": 1}
+        return result
+
+
+# Timer of the job being processed; tasks started by the job inherit it
+current_timer: ContextVar[Optional[StageTimer]] = ContextVar("current_timer", default=None)
+
+
+def record_stage(histogram: Histogram, operation: str, stage: str, seconds: float):
+    histogram.observe(seconds, operation=operation, stage=stage)
+    timer = current_timer.get()
+    if timer is not None:
+        timer.add(stage, seconds)
+
+
+@contextmanager
+def time_stage(histogram: Histogram, operation: str, stage: str):
+    """Observe the duration of the block, also adding it to the current job's timer"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(histogram, operation, stage, time.perf_counter() - start)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware recording request counts and latency per route template.
+
+    Latency runs until the response body is complete. Server-sent event
+    streams are counted but not timed, since they stay open indefinitely.
+    """
+
+    def __init__(self, app, requests: Counter, latency: Histogram):
+        self.app = app
+        self.requests = requests
+        self.latency = latency
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        state = {"status": 500, "streaming": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                headers = dict(message.get("headers") or [])
+                state["streaming"] = headers.get(b"content-type", b"").startswith(b"text/event-stream")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            labels = {
+                "method": scope["method"],
+                "route": getattr(route, "path", "unmatched"),
+                "status": str(state["status"]),
+            }
+            self.requests.inc(**labels)
+            if not state["streaming"]:
+                self.latency.observe(time.perf_counter() - start, method=labels["method"], route=labels["route"])
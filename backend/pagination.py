@@ -0,0 +1,200 @@
+import base64
+import json
+import types
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union, get_args, get_origin
+
+import orjson
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort_value: Any, doc_id: str) -> str:
+    raw = json.dumps([sort_value, doc_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """(sort value, id) of a cursor made by ``encode_cursor``.
+
+    Sort fields are stored ISO timestamps, so anything but a timestamp and
+    an id string is rejected; the values are spliced into Mongo filters and
+    must never carry operators.
+    """
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not (isinstance(value, list) and len(value) == 2 and all(isinstance(part, str) for part in value)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    sort_value, doc_id = value
+    try:
+        datetime.fromisoformat(sort_value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return sort_value, doc_id
+
+
+def keyset_filter(sort_field: str, cursor: Optional[str]) -> Dict[str, Any]:
+    """Filter selecting the documents after ``cursor`` in (sort_field, id) descending order"""
+    if not cursor:
+        return {}
+    sort_value, doc_id = decode_cursor(cursor)
+    return {"$or": [
+        {sort_field: {"$lt": sort_value}},
+        {sort_field: sort_value, "id": {"$lt": doc_id}},
+    ]}
+
+
+def keyset_sort(sort_field: str) -> List[Tuple[str, int]]:
+    return [(sort_field, -1), ("id", -1)]
+
+
+def next_cursor(docs: List[Dict[str, Any]], sort_field: str, limit: int) -> Optional[str]:
+    """Cursor for the page after ``docs``, or None when this was the last page"""
+    if len(docs) < limit:
+        return None
+    last = docs[-1]
+    return encode_cursor(last.get(sort_field), last["id"])
+
+
+def to_mongo_time(value: datetime) -> str:
+    """Timestamps are stored as UTC ISO strings; convert a query bound to match"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def time_range(field: str, since: Optional[datetime], until: Optional[datetime]) -> Dict[str, Any]:
+    bounds = {}
+    if since is not None:
+        bounds["$gte"] = to_mongo_time(since)
+    if until is not None:
+        bounds["$lt"] = to_mongo_time(until)
+    return {field: bounds} if bounds else {}
+
+
+def field_projection(fields: Optional[str], allowed: Iterable[str], sort_field: str) -> Optional[Dict[str, int]]:
+    """Mongo projection for a comma-separated ``fields`` parameter.
+
+    ``id`` and the sort field are always included so the page can be continued.
+    """
+    if not fields:
+        return None
+    requested = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = sorted(set(requested) - set(allowed))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    projection = {"_id": 0, "id": 1, sort_field: 1}
+    projection.update({name: 1 for name in requested})
+    return projection
+
+
+def combine(*filters: Dict[str, Any]) -> Dict[str, Any]:
+    """AND together filter documents, skipping empty ones"""
+    parts = [f for f in filters if f]
+    if not parts:
+        return {}
+    if len(parts) == 1:
+        return parts[0]
+    return {"$and": parts}
+
+
+def model_projection(model, exclude: Iterable[str] = ()) -> Dict[str, int]:
+    """Projection of a model's fields, so internal fields (``_id``, ``cells``) never leave Mongo"""
+    projection = {"_id": 0}
+    projection.update({name: 1 for name in model.model_fields if name not in exclude})
+    return projection
+
+
+def json_datetime(value) -> str:
+    """A stored timestamp as pydantic serializes the datetime: ISO 8601, UTC as ``Z``"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    text = value.isoformat()
+    if value.utcoffset() == timedelta(0):
+        text = text[:-6] + "Z"
+    return text
+
+
+def field_encoder(annotation) -> Optional[Callable[[Any], Any]]:
+    """Converts a stored value to what a model field of this type serializes to; None if it passes as is"""
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+    if origin is Union or origin is types.UnionType:
+        inner = [arg for arg in args if arg is not type(None)]
+        encoder = field_encoder(inner[0]) if len(inner) == 1 else None
+        return None if encoder is None else lambda value: None if value is None else encoder(value)
+    if origin is list:
+        encoder = field_encoder(args[0]) if args else None
+        return None if encoder is None else lambda value: [encoder(item) for item in value]
+    if origin is dict:
+        encoder = field_encoder(args[1]) if len(args) == 2 else None
+        return None if encoder is None else lambda value: {key: encoder(item) for key, item in value.items()}
+    if annotation is datetime:
+        return json_datetime
+    if annotation is float:
+        return float
+    if annotation is int:
+        return int
+    return None
+
+
+# Marks fields without a constant default; they are left out when missing, not filled
+NO_DEFAULT = object()
+
+
+def model_layout(model) -> List[Tuple[str, Any, Optional[Callable[[Any], Any]]]]:
+    """(name, default, encoder) of each model field in declaration order, for ``PageEncoder``"""
+    return [
+        (
+            name,
+            NO_DEFAULT if field.is_required() or field.default_factory is not None else field.default,
+            field_encoder(field.annotation),
+        )
+        for name, field in model.model_fields.items()
+    ]
+
+
+class PageEncoder:
+    """Encodes a page of stored documents to a JSON array as they come off the cursor.
+
+    Documents were validated when written, so they are not rebuilt as
+    models. With a ``model`` each document is laid out like the model
+    serializes it: fields in declaration order, missing ones filled from
+    constant defaults, timestamps and numbers in the field's JSON form, so
+    the bytes match the response_model path. Without one (projected,
+    partial documents) documents are encoded as stored, as the model path
+    does for them. Each document is encoded on arrival, so the page is held
+    as bytes rather than dicts.
+    """
+
+    def __init__(self, sort_field: str, limit: int, model=None):
+        self.sort_field = sort_field
+        self.limit = limit
+        self.layout = model_layout(model) if model is not None else None
+        self.parts: List[bytes] = []
+        self.last: Optional[Tuple[Any, str]] = None
+
+    def add(self, doc: Dict[str, Any]):
+        out = doc
+        if self.layout is not None:
+            out = {}
+            for name, default, encoder in self.layout:
+                value = doc.get(name, default)
+                if value is NO_DEFAULT:
+                    continue
+                out[name] = value if encoder is None or value is None else encoder(value)
+        self.parts.append(orjson.dumps(out, default=str))
+        # The cursor keeps the stored form of the sort value, which is what keyset_filter compares
+        self.last = (doc.get(self.sort_field), doc["id"])
+
+    def response(self) -> Response:
+        # Same rule as next_cursor: a full page may have a next one
+        cursor = encode_cursor(*self.last) if len(self.parts) >= self.limit else None
+        return Response(
+            b"[" + b",".join(self.parts) + b"]",
+            media_type="application/json",
+            headers={NEXT_CURSOR_HEADER: cursor} if cursor else None
+        )
@@ -0,0 +1,276 @@
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Groups larger than this are suppressed one by one instead of with a dense IoU block
+DENSE_GROUP_MAX = 256
+# Upper bound on the elements of one (groups, size, size) IoU block
+DENSE_BLOCK_ELEMENTS = 4_000_000
+
+
+def parse_class_thresholds(value: str) -> Dict[str, float]:
+    """Parse 'vehicle:0.4,person:0.6' into {'vehicle': 0.4, 'person': 0.6}"""
+    thresholds = {}
+    for item in (value or "").split(","):
+        name, _, threshold = item.partition(":")
+        if name.strip() and threshold.strip():
+            try:
+                thresholds[name.strip().lower()] = float(threshold)
+            except ValueError:
+                logger.warning(f"Ignoring invalid class threshold {item!r}")
+    return thresholds
+
+
+@dataclass(frozen=True)
+class PostprocessSettings:
+    iou_threshold: float = 0.5  # boxes of the same class overlapping more than this are duplicates
+    min_confidence: float = 0.0  # default confidence gate
+    class_thresholds: Dict[str, float] = field(default_factory=dict)  # per target_type gates
+    top_k: int = 100  # detections kept per image, 0 for no limit
+    pre_nms_factor: int = 10  # candidates per image entering NMS, as a multiple of top_k
+    min_size: float = 1e-3  # boxes narrower or lower than this (normalized) are dropped
+    class_aware: bool = True
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            iou_threshold=float(os.environ.get('POSTPROCESS_IOU_THRESHOLD', 0.5)),
+            min_confidence=float(os.environ.get('POSTPROCESS_MIN_CONFIDENCE', 0.0)),
+            class_thresholds=parse_class_thresholds(os.environ.get('POSTPROCESS_CLASS_THRESHOLDS', '')),
+            top_k=int(os.environ.get('POSTPROCESS_TOP_K', 100)),
+            pre_nms_factor=int(os.environ.get('POSTPROCESS_PRE_NMS_FACTOR', 10)),
+            min_size=float(os.environ.get('POSTPROCESS_MIN_SIZE', 1e-3)),
+            class_aware=os.environ.get('POSTPROCESS_CLASS_AWARE', '1') == '1',
+        )
+
+
+def sanitize_boxes(boxes: np.ndarray) -> np.ndarray:
+    """Clamp (N, 4) x/y/width/height boxes to the unit square; non-finite values become 0"""
+    boxes = np.nan_to_num(np.asarray(boxes, dtype=np.float64), nan=0.0, posinf=0.0, neginf=0.0)
+    x1 = np.clip(np.minimum(boxes[:, 0], boxes[:, 0] + boxes[:, 2]), 0.0, 1.0)
+    y1 = np.clip(np.minimum(boxes[:, 1], boxes[:, 1] + boxes[:, 3]), 0.0, 1.0)
+    x2 = np.clip(np.maximum(boxes[:, 0], boxes[:, 0] + boxes[:, 2]), 0.0, 1.0)
+    y2 = np.clip(np.maximum(boxes[:, 1], boxes[:, 1] + boxes[:, 3]), 0.0, 1.0)
+    return np.stack([x1, y1, x2 - x1, y2 - y1], axis=1)
+
+
+def pairwise_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU of (..., M, 4) and (..., N, 4) x/y/width/height boxes, broadcast to (..., M, N)"""
+    ax1, ay1 = a[..., :, None, 0], a[..., :, None, 1]
+    bx1, by1 = b[..., None, :, 0], b[..., None, :, 1]
+    inter_w = np.minimum(ax1 + a[..., :, None, 2], bx1 + b[..., None, :, 2])
+    inter_w -= np.maximum(ax1, bx1)
+    np.clip(inter_w, 0, None, out=inter_w)
+    inter = np.minimum(ay1 + a[..., :, None, 3], by1 + b[..., None, :, 3])
+    inter -= np.maximum(ay1, by1)
+    np.clip(inter, 0, None, out=inter)
+    inter *= inter_w
+    union = (a[..., :, None, 2] * a[..., :, None, 3]) + (b[..., None, :, 2] * b[..., None, :, 3])
+    union -= inter
+    np.divide(inter, union, out=inter, where=union > 0)
+    inter[union <= 0] = 0.0
+    return inter
+
+
+def _suppress_dense(iou: np.ndarray, valid: np.ndarray, threshold: float) -> np.ndarray:
+    """Greedy NMS over (G, S, S) IoU blocks of score-sorted groups, vectorized across groups"""
+    keep = valid.copy()
+    size = iou.shape[1]
+    later = np.arange(size)
+    for i in range(size - 1):
+        suppress = keep[:, i, None] & (iou[:, i, :] > threshold) & (later > i)
+        keep &= ~suppress
+    return keep
+
+
+def batched_nms(boxes: np.ndarray, scores: np.ndarray, groups: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy non-maximum suppression within each group (e.g. image x class); returns a keep mask.
+
+    Boxes are sorted by (group, -score) and groups of similar size are padded
+    into (G, S, S) IoU blocks, so the greedy pass is a loop over S with each
+    step vectorized across all G groups. Cost is proportional to the sum of
+    squared group sizes rather than to the square of the total box count.
+    """
+    count = len(boxes)
+    keep = np.zeros(count, dtype=bool)
+    if count == 0:
+        return keep
+    order = np.lexsort((-scores, groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    sizes = np.diff(np.r_[starts, count])
+    sorted_boxes = boxes[order]
+
+    # Singletons are always kept
+    keep[order[starts[sizes == 1]]] = True
+
+    # Bucket the other groups by size: powers of two up to 16, then multiples of 16
+    buckets = np.where(sizes <= 16, 2 ** np.ceil(np.log2(np.maximum(sizes, 2))), -(-sizes // 16) * 16).astype(np.int64)
+    for bucket in np.unique(buckets[sizes > 1]):
+        cap = int(bucket)
+        selected = np.flatnonzero((buckets == bucket) & (sizes > 1))
+        if cap > DENSE_GROUP_MAX:
+            for group in selected:
+                members = order[starts[group]:starts[group] + sizes[group]]
+                keep[members] = _suppress_large(boxes[members], iou_threshold)
+            continue
+        per_block = max(1, DENSE_BLOCK_ELEMENTS // (cap * cap))
+        for block_start in range(0, len(selected), per_block):
+            block = selected[block_start:block_start + per_block]
+            offsets = np.arange(cap)
+            index = starts[block][:, None] + offsets[None, :]
+            valid = offsets[None, :] < sizes[block][:, None]
+            index = np.where(valid, index, 0)
+            padded = np.where(valid[..., None], sorted_boxes[index], 0.0).astype(np.float32)
+            block_keep = _suppress_dense(pairwise_iou(padded, padded), valid, iou_threshold)
+            keep[order[index[block_keep]]] = True
+    return keep
+
+
+def best_per_image(indices: np.ndarray, scores: np.ndarray, image_ids: np.ndarray, k: int) -> np.ndarray:
+    """The at most ``k`` highest-scoring of ``indices`` per image, ordered by image then score"""
+    order = indices[np.lexsort((-scores[indices], image_ids[indices]))]
+    if k <= 0 or len(order) == 0:
+        return order
+    image_order = image_ids[order]
+    starts = np.flatnonzero(np.r_[True, image_order[1:] != image_order[:-1]])
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    return order[rank < k]
+
+
+def _suppress_large(boxes: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Classic greedy NMS for one large, score-sorted group"""
+    keep = np.zeros(len(boxes), dtype=bool)
+    remaining = np.arange(len(boxes))
+    while len(remaining):
+        best = remaining[0]
+        keep[best] = True
+        remaining = remaining[1:]
+        if len(remaining):
+            overlaps = pairwise_iou(boxes[best:best + 1], boxes[remaining])[0]
+            remaining = remaining[overlaps <= iou_threshold]
+    return keep
+
+
+class DetectionPostprocessor:
+    """Sanitizes, gates, de-duplicates and limits model detections before they are stored.
+
+    ``process`` works on the detections of one image; ``process_arrays`` is the
+    vectorized core, which also handles many images at once through ``image_ids``.
+    """
+
+    def __init__(self, settings: PostprocessSettings = None):
+        self.settings = settings or PostprocessSettings.from_env()
+        self._class_codes: Dict[str, int] = {}
+
+    def class_codes(self, classes: List[str]) -> np.ndarray:
+        return np.array([self._class_codes.setdefault(c, len(self._class_codes)) for c in classes], dtype=np.int64)
+
+    def thresholds(self, classes: List[str]) -> np.ndarray:
+        default = self.settings.min_confidence
+        return np.array([self.settings.class_thresholds.get(c, default) for c in classes], dtype=np.float64)
+
+    def process_arrays(self, boxes: np.ndarray, scores: np.ndarray, classes: List[str],
+                       image_ids: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the indices of the kept detections (best first per image) and their sanitized boxes"""
+        settings = self.settings
+        count = len(scores)
+        if image_ids is None:
+            image_ids = np.zeros(count, dtype=np.int64)
+        boxes = sanitize_boxes(boxes.reshape(-1, 4))
+        scores = np.nan_to_num(np.asarray(scores, dtype=np.float64), nan=0.0)
+        classes = [str(c).lower() for c in classes]
+
+        # Confidence gates and degenerate boxes
+        passed = (scores >= self.thresholds(classes)) & \
+            (boxes[:, 2] >= settings.min_size) & (boxes[:, 3] >= settings.min_size)
+        candidates = np.flatnonzero(passed)
+        if settings.top_k > 0 and settings.pre_nms_factor > 0:
+            # Bound the NMS work on pathological outputs
+            candidates = best_per_image(candidates, scores, image_ids, settings.top_k * settings.pre_nms_factor)
+
+        # Class-aware NMS per image
+        codes = self.class_codes(classes)[candidates] if settings.class_aware else np.zeros(len(candidates), dtype=np.int64)
+        groups = image_ids[candidates] * (len(self._class_codes) + 1) + codes
+        survivors = candidates[batched_nms(boxes[candidates], scores[candidates], groups, settings.iou_threshold)]
+
+        # Top-K per image by confidence
+        order = best_per_image(survivors, scores, image_ids, settings.top_k)
+        return order, boxes[order]
+
+    def process(self, detections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Post-process the detections of one image (model output format: type, confidence, bbox)"""
+        if not detections:
+            return []
+        boxes, scores, classes = detection_arrays(detections)
+        kept, kept_boxes = self.process_arrays(boxes, scores, classes)
+        return [
+            {**detections[i], "bbox": dict(zip(("x", "y", "width", "height"), box.tolist()))}
+            for i, box in zip(kept.tolist(), kept_boxes)
+        ]
+
+    def stream(self) -> "StreamingFilter":
+        return StreamingFilter(self)
+
+
+class StreamingFilter:
+    """Online ``process`` for the detections of one image arriving in chunks.
+
+    Each chunk is post-processed together with the detections accepted so
+    far. A new detection can supersede an accepted one (a better overlapping
+    box, or top-K overflow); the caller removes superseded detections, which
+    are identified by their position in the sequence of accepted ones.
+    """
+
+    def __init__(self, postprocessor: DetectionPostprocessor):
+        self.postprocessor = postprocessor
+        self.boxes = np.zeros((0, 4))
+        self.scores = np.zeros(0)
+        self.classes: List[str] = []
+        self.serials = np.zeros(0, dtype=np.int64)
+        self.accepted = 0
+
+    def add(self, detections: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+        """Returns the detections to store and the serials of previously accepted ones to remove"""
+        new = self.postprocessor.process(detections)
+        if not new:
+            return [], []
+        boxes, scores, classes = detection_arrays(new)
+        previous = len(self.scores)
+        kept, kept_boxes = self.postprocessor.process_arrays(
+            np.concatenate([self.boxes, boxes]), np.concatenate([self.scores, scores]), self.classes + classes
+        )
+        kept_old = kept[kept < previous]
+        kept_new = kept[kept >= previous] - previous
+        superseded = np.setdiff1d(self.serials, self.serials[kept_old])
+
+        new_serials = np.arange(self.accepted, self.accepted + len(kept_new))
+        self.accepted += len(kept_new)
+        self.boxes = kept_boxes
+        self.scores = np.concatenate([self.scores, scores])[kept]
+        self.classes = [(self.classes + classes)[i] for i in kept.tolist()]
+        serials = np.concatenate([self.serials, np.zeros(len(new), dtype=np.int64)])
+        serials[previous + kept_new] = new_serials
+        self.serials = serials[kept]
+        return [new[i] for i in kept_new.tolist()], superseded.tolist()
+
+
+def detection_arrays(detections: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """Boxes, scores and classes of model detections as arrays"""
+    boxes = np.zeros((len(detections), 4), dtype=np.float64)
+    scores = np.zeros(len(detections), dtype=np.float64)
+    classes = []
+    for i, detection in enumerate(detections):
+        bbox = detection.get("bbox") or {}
+        try:
+            boxes[i] = [float(bbox.get(key, 0)) for key in ("x", "y", "width", "height")]
+            scores[i] = float(detection.get("confidence", 0.0))
+        except (TypeError, ValueError, AttributeError):
+            scores[i] = -1.0  # never passes a gate
+        classes.append(detection.get("type", "unknown"))
+    return boxes, scores, classes
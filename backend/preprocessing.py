@@ -0,0 +1,170 @@
+import asyncio
+import base64
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Normalized (x, y, width, height) of a region within the full image
+Window = Tuple[float, float, float, float]
+FULL_WINDOW: Window = (0.0, 0.0, 1.0, 1.0)
+
+
+@dataclass(frozen=True)
+class PreprocessSettings:
+    max_edge: int = 1536
+    image_format: str = "JPEG"  # JPEG or WEBP
+    quality: int = 85
+    tile_size: int = 0  # tile edge in source pixels, 0 disables tiling
+    tile_overlap: float = 0.15
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_edge=int(os.environ.get('PREPROCESS_MAX_EDGE', 1536)),
+            image_format=os.environ.get('PREPROCESS_FORMAT', 'JPEG').upper(),
+            quality=int(os.environ.get('PREPROCESS_QUALITY', 85)),
+            tile_size=int(os.environ.get('PREPROCESS_TILE_SIZE', 0)),
+            tile_overlap=float(os.environ.get('PREPROCESS_TILE_OVERLAP', 0.15)),
+        )
+
+    @property
+    def signature(self) -> str:
+        """Identifies the settings in cache keys, since they change the model input"""
+        return f"{self.max_edge}:{self.image_format}:{self.quality}:{self.tile_size}:{self.tile_overlap}"
+
+
+@dataclass
+class PreparedImage:
+    width: int
+    height: int
+    # (window, base64 payload) pairs; a single full window when not tiled
+    parts: List[Tuple[Window, str]] = field(default_factory=list)
+
+
+def to_rgb(image: Image.Image) -> Image.Image:
+    """Convert any Pillow mode, including 16-bit and float thermal frames, to 8-bit RGB"""
+    if image.mode in ("I", "I;16", "I;16B", "I;16L", "F"):
+        array = np.asarray(image, dtype=np.float32)
+        low, high = np.percentile(array, (0.5, 99.5))
+        scale = 255.0 / (high - low) if high > low else 0.0
+        array = np.clip((array - low) * scale, 0, 255).astype(np.uint8)
+        image = Image.fromarray(array, mode="L")
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image
+
+
+def encode_region(image: Image.Image, settings: PreprocessSettings) -> str:
+    if max(image.size) > settings.max_edge:
+        image = image.copy()
+        image.thumbnail((settings.max_edge, settings.max_edge), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format=settings.image_format, quality=settings.quality)
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+
+def tile_windows(width: int, height: int, tile_size: int, overlap: float) -> List[Tuple[int, int, int, int]]:
+    """Pixel boxes (left, top, right, bottom) of overlapping tiles covering the image"""
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        stride = max(1, int(tile_size * (1 - overlap)))
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (left, top, min(left + tile_size, width), min(top + tile_size, height))
+        for top in starts(height)
+        for left in starts(width)
+    ]
+
+
+def prepare_image(image_bytes: bytes, settings: PreprocessSettings) -> PreparedImage:
+    """Decode, downscale, re-encode and optionally tile an image (runs in a worker process)"""
+    source = Image.open(io.BytesIO(image_bytes))
+    source.load()
+    image = to_rgb(source)
+    width, height = image.size
+    prepared = PreparedImage(width=width, height=height)
+
+    if settings.tile_size and max(width, height) > settings.tile_size:
+        for left, top, right, bottom in tile_windows(width, height, settings.tile_size, settings.tile_overlap):
+            window = (left / width, top / height, (right - left) / width, (bottom - top) / height)
+            prepared.parts.append((window, encode_region(image.crop((left, top, right, bottom)), settings)))
+    else:
+        prepared.parts.append((FULL_WINDOW, encode_region(image, settings)))
+    return prepared
+
+
+def map_to_full_image(detections: List[Dict[str, Any]], window: Window) -> List[Dict[str, Any]]:
+    """Map detections with tile-relative normalized bboxes to full-image coordinates"""
+    if window == FULL_WINDOW:
+        return detections
+    wx, wy, ww, wh = window
+    mapped = []
+    for detection in detections:
+        bbox = detection.get("bbox")
+        if isinstance(bbox, dict):
+            try:
+                bbox = {
+                    "x": wx + float(bbox.get("x", 0)) * ww,
+                    "y": wy + float(bbox.get("y", 0)) * wh,
+                    "width": float(bbox.get("width", 0)) * ww,
+                    "height": float(bbox.get("height", 0)) * wh,
+                }
+            except (TypeError, ValueError):
+                pass
+        mapped.append({**detection, "bbox": bbox})
+    return mapped
+
+
+class ImagePreprocessor:
+    """Runs ``prepare_image`` in a process pool so decoding never blocks the event loop"""
+
+    def __init__(self, settings: Optional[PreprocessSettings] = None, workers: Optional[int] = None):
+        self.settings = settings or PreprocessSettings.from_env()
+        self.workers = workers or int(os.environ.get('PREPROCESS_WORKERS', 0)) or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        # Concurrent callers may all see the same broken pool; only the first replaces it
+        if self._pool is pool:
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def prepare(self, image_bytes: bytes) -> Optional[PreparedImage]:
+        """Returns None when the data cannot be decoded as an image (e.g. raw radar dumps)"""
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                return await loop.run_in_executor(pool, prepare_image, image_bytes, self.settings)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); the pool is unusable, so start a new one and retry once
+                logger.warning("Image preprocessing pool broke; restarting it")
+                self._discard_pool(pool)
+                if attempt:
+                    raise
+            except (OSError, ValueError, Image.DecompressionBombError) as e:
+                logger.info(f"Image preprocessing skipped: {str(e)}")
+                return None
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
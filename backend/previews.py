@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from preprocessing import to_rgb
+
+logger = logging.getLogger(__name__)
+
+
+class PreviewUnavailable(Exception):
+    """The source is not an image Pillow can decode"""
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def render_preview(source_path: str, out_path: str, size: int, quality: int = 80) -> int:
+    """Render a JPEG preview whose longest edge is ``size``; returns its byte size (runs in a worker process)"""
+    try:
+        image = Image.open(source_path)
+        image.draft("RGB", (size, size))
+        image.load()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise PreviewUnavailable(str(e))
+    image = to_rgb(image)
+    image.thumbnail((size, size))
+    # Unique per call: replicas sharing the volume may all be pid 1, and threads share a pid
+    temp_path = f"{out_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        image.save(temp_path, format="JPEG", quality=quality, optimize=True)
+        os.replace(temp_path, out_path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+    return os.path.getsize(out_path)
+
+
+def snap_size(requested: Optional[int], sizes: Sequence[int]) -> int:
+    """The smallest configured size covering the request, or the largest one"""
+    if requested is None:
+        return sizes[0]
+    for size in sizes:
+        if size >= requested:
+            return size
+    return sizes[-1]
+
+
+class PreviewCache:
+    """Fixed-size JPEG previews rendered in a process pool and kept on disk.
+
+    Files are named ``{file_id}-{variant}-{size}.jpg``. The cache is bounded
+    by ``max_bytes``: hits bump the file's mtime and the least recently
+    used previews are deleted when a new one pushes the total over budget.
+    Concurrent requests for the same missing preview share one render.
+    """
+
+    def __init__(self, directory: Path, sizes: Sequence[int] = (256, 512, 1024), max_bytes: int = 512 * 1024 * 1024,
+                 workers: Optional[int] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.sizes = sorted(sizes)
+        self.max_bytes = max_bytes
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 1) // 2))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._entries: Optional[OrderedDict] = None  # path -> bytes, least recently used first
+        self._total = 0
+        self._renders: Dict[Path, asyncio.Future] = {}
+
+    @classmethod
+    def from_env(cls, directory: Path):
+        sizes = [int(size) for size in os.environ.get('PREVIEW_SIZES', '256,512,1024').split(",") if size.strip()]
+        return cls(
+            directory,
+            sizes=sizes or [512],
+            max_bytes=int(os.environ.get('PREVIEW_CACHE_MAX_BYTES', 512 * 1024 * 1024)),
+            workers=int(os.environ.get('PREVIEW_WORKERS', 0)) or None,
+        )
+
+    def _executor_instance(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _index(self) -> OrderedDict:
+        """Load the on-disk entries once, oldest first"""
+        if self._entries is None:
+            found = []
+            for path in self.directory.glob("*.jpg"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+            found.sort()
+            self._entries = OrderedDict((path, size) for _, path, size in found)
+            self._total = sum(self._entries.values())
+        return self._entries
+
+    def path_for(self, file_id: str, variant: str, size: int) -> Path:
+        return self.directory / f"{file_id}-{variant}-{size}.jpg"
+
+    def _touch(self, path: Path) -> bool:
+        entries = self._index()
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another replica sharing the directory
+            self._total -= entries.pop(path, 0)
+            return False
+        if path not in entries:
+            entries[path] = path.stat().st_size
+            self._total += entries[path]
+        entries.move_to_end(path)
+        return True
+
+    def _add(self, path: Path, size: int):
+        entries = self._index()
+        self._total += size - entries.pop(path, 0)
+        entries[path] = size
+        while self._total > self.max_bytes and len(entries) > 1:
+            oldest, oldest_size = entries.popitem(last=False)
+            self._total -= oldest_size
+            oldest.unlink(missing_ok=True)
+            logger.debug(f"Evicted preview {oldest.name}")
+
+    async def get(self, file_id: str, source_path: str, size: int, variant: str = "default") -> Path:
+        """Path of the preview, rendering it first if needed; raises PreviewUnavailable"""
+        path = self.path_for(file_id, variant, size)
+        if path.exists() and self._touch(path):
+            return path
+        render = self._renders.get(path)
+        if render is None:
+            loop = asyncio.get_running_loop()
+            render = asyncio.ensure_future(
+                loop.run_in_executor(self._executor_instance(), render_preview, source_path, str(path), size)
+            )
+            self._renders[path] = render
+            render.add_done_callback(lambda _: self._renders.pop(path, None))
+        written = await asyncio.shield(render)
+        self._add(path, written)
+        return path
+
+    def discard(self, paths: Iterable[Path]):
+        """Forget previews that were deleted from the directory"""
+        entries = self._index()
+        for path in paths:
+            self._total -= entries.pop(Path(path), 0)
+
+    def stats(self) -> Dict[str, int]:
+        entries = self._index()
+        return {"entries": len(entries), "bytes": self._total, "max_bytes": self.max_bytes}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak comparison, as RFC 9110 requires for it)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single ``bytes=`` range, or None to send the whole file.
+
+    Multiple ranges are answered with the whole file, which RFC 9110 allows.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+    start_text, _, end_text = spec.partition("-")
+    # Range values are plain digits; anything else (signs, "_", spaces) makes the header invalid
+    if not all(text.isascii() and text.isdigit() for text in (start_text, end_text) if text):
+        return None
+    if not start_text:
+        # Suffix range: the last N bytes; none exist in an empty file
+        if not end_text:
+            return None
+        length = int(end_text)
+        if length <= 0 or size <= 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+    start = int(start_text)
+    end = int(end_text) if end_text else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
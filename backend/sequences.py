@@ -0,0 +1,300 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tarfile
+import threading
+import uuid
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from detectors import difference_hash, hamming_distance
+from preprocessing import to_rgb
+
+logger = logging.getLogger(__name__)
+
+# Kinds of sequence uploads, by file name
+VIDEO = "video"
+ARCHIVE = "archive"
+MULTIFRAME = "multiframe"
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v", ".mpg", ".mpeg", ".ts")
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+MULTIFRAME_EXTENSIONS = (".gif", ".tif", ".tiff", ".apng", ".webp")
+FRAME_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif", ".webp")
+
+# Modes PNG stores as they are; anything else is converted to 8-bit RGB
+PNG_MODES = ("1", "L", "LA", "P", "RGB", "RGBA", "I;16", "I")
+
+
+class SequenceError(ValueError):
+    pass
+
+
+def sequence_kind(filename: str) -> Optional[str]:
+    name = filename.lower()
+    if name.endswith(VIDEO_EXTENSIONS):
+        return VIDEO
+    if name.endswith(ARCHIVE_EXTENSIONS):
+        return ARCHIVE
+    if name.endswith(MULTIFRAME_EXTENSIONS):
+        return MULTIFRAME
+    return None
+
+
+def natural_key(name: str) -> List[Any]:
+    """Sort key putting frame_2 before frame_10"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+@dataclass
+class SourceFrame:
+    index: int
+    image: Image.Image
+    name: str = ""
+    time_offset: Optional[float] = None  # seconds from the start, when the source has timing
+
+
+def is_frame_member(name: str) -> bool:
+    base = name.rsplit("/", 1)[-1]
+    return (
+        name.lower().endswith(FRAME_EXTENSIONS)
+        and not base.startswith(".")
+        and not name.startswith("__MACOSX/")
+    )
+
+
+def iter_archive_frames(path: str) -> Iterator[SourceFrame]:
+    """Frames of a zip or tar archive in natural name order, decoded one member at a time"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            names = sorted((info.filename for info in archive.infolist() if not info.is_dir() and is_frame_member(info.filename)), key=natural_key)
+            for index, name in enumerate(names):
+                with archive.open(name) as member:
+                    image = Image.open(member)
+                    image.load()
+                yield SourceFrame(index, image, name)
+        return
+    try:
+        archive = tarfile.open(path, "r:*")
+    except tarfile.TarError as e:
+        raise SequenceError(f"Unreadable archive: {str(e)}")
+    with archive:
+        members = sorted((m for m in archive.getmembers() if m.isfile() and is_frame_member(m.name)), key=lambda m: natural_key(m.name))
+        for index, member in enumerate(members):
+            with archive.extractfile(member) as data:
+                image = Image.open(data)
+                image.load()
+            yield SourceFrame(index, image, member.name)
+
+
+def iter_multiframe_frames(path: str) -> Iterator[SourceFrame]:
+    """Frames of an animated GIF/WebP/PNG or a multi-page TIFF; Pillow decodes one frame at a time"""
+    with Image.open(path) as image:
+        offset = 0.0
+        timed = "duration" in image.info
+        for index, frame in enumerate(ImageSequence.Iterator(image)):
+            yield SourceFrame(index, frame.copy(), time_offset=offset if timed else None)
+            offset += (frame.info.get("duration") or 0) / 1000
+
+
+def probe_video(path: str, ffprobe: str) -> Dict[str, Any]:
+    result = subprocess.run(
+        [ffprobe, "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height,avg_frame_rate",
+         "-of", "json", path],
+        capture_output=True, check=False, timeout=60
+    )
+    try:
+        stream = json.loads(result.stdout)["streams"][0]
+        width, height = int(stream["width"]), int(stream["height"])
+    except (ValueError, KeyError, IndexError, TypeError):
+        raise SequenceError(f"No video stream found: {result.stderr.decode(errors='replace').strip()[:200]}")
+    numerator, _, denominator = str(stream.get("avg_frame_rate", "0/1")).partition("/")
+    try:
+        fps = float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        fps = 0.0
+    return {"width": width, "height": height, "fps": fps}
+
+
+def iter_video_frames(path: str, ffmpeg: Optional[str] = None, ffprobe: Optional[str] = None) -> Iterator[SourceFrame]:
+    """Frames of a video decoded by an ffmpeg subprocess and read from its pipe one raw RGB frame at a time"""
+    ffmpeg = ffmpeg or shutil.which("ffmpeg")
+    ffprobe = ffprobe or shutil.which("ffprobe")
+    if not ffmpeg or not ffprobe:
+        raise SequenceError("Video ingestion needs ffmpeg and ffprobe on the server")
+    info = probe_video(path, ffprobe)
+    frame_bytes = info["width"] * info["height"] * 3
+    process = subprocess.Popen(
+        [ffmpeg, "-v", "error", "-i", path, "-map", "0:v:0", "-f", "rawvideo", "-pix_fmt", "rgb24", "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=frame_bytes
+    )
+    try:
+        index = 0
+        while True:
+            data = process.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            image = Image.frombuffer("RGB", (info["width"], info["height"]), data, "raw", "RGB", 0, 1)
+            yield SourceFrame(index, image, time_offset=index / info["fps"] if info["fps"] else None)
+            index += 1
+    finally:
+        process.kill()
+        process.wait()
+        process.stdout.close()
+
+
+def iter_frames(path: str, kind: str) -> Iterator[SourceFrame]:
+    if kind == VIDEO:
+        return iter_video_frames(path)
+    if kind == ARCHIVE:
+        return iter_archive_frames(path)
+    if kind == MULTIFRAME:
+        return iter_multiframe_frames(path)
+    raise SequenceError(f"Unsupported sequence kind {kind!r}")
+
+
+@dataclass
+class KeyframeSelector:
+    """Cheap scene-change detector picking the frames worth analyzing.
+
+    Each frame is reduced to a small grayscale thumbnail and compared with
+    the last keyframe by perceptual hash (Hamming distance of the 64-bit
+    difference hash) and by grayscale histogram (total variation distance,
+    0 to 1). A frame becomes a keyframe when either distance reaches its
+    threshold, at most every ``min_gap`` frames. A keyframe is also forced
+    every ``max_gap`` frames so tracking jobs see regular samples of long
+    static scenes.
+    """
+    hash_distance: int = 12
+    histogram_distance: float = 0.2
+    min_gap: int = 1
+    max_gap: int = 300
+    thumbnail_size: int = 64
+    bins: int = 32
+    _last_hash: Optional[int] = field(default=None, repr=False)
+    _last_histogram: Optional[np.ndarray] = field(default=None, repr=False)
+    _gap: int = field(default=0, repr=False)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            hash_distance=int(os.environ.get('SEQUENCE_HASH_DISTANCE', 12)),
+            histogram_distance=float(os.environ.get('SEQUENCE_HISTOGRAM_DISTANCE', 0.2)),
+            min_gap=max(1, int(os.environ.get('SEQUENCE_MIN_GAP', 1))),
+            max_gap=int(os.environ.get('SEQUENCE_MAX_GAP', 300)),
+        )
+
+    def signature(self, image: Image.Image):
+        if image.mode.startswith("I;16"):
+            image = image.convert("I")
+        thumbnail = image.resize((self.thumbnail_size, self.thumbnail_size), Image.BILINEAR, reducing_gap=2.0)
+        gray = to_rgb(thumbnail).convert("L")
+        counts = np.bincount(np.asarray(gray, dtype=np.uint16).ravel() * self.bins // 256, minlength=self.bins)
+        return difference_hash(gray), counts / counts.sum()
+
+    def consider(self, image: Image.Image) -> Optional[str]:
+        """Reason the frame is a keyframe ("first", "scene" or "interval"), or None to drop it"""
+        self._gap += 1
+        if self._last_hash is not None and self._gap < self.min_gap:
+            return None
+        frame_hash, histogram = self.signature(image)
+        if self._last_hash is None:
+            reason = "first"
+        elif (
+            hamming_distance(frame_hash, self._last_hash) >= self.hash_distance
+            or 0.5 * float(np.abs(histogram - self._last_histogram).sum()) >= self.histogram_distance
+        ):
+            reason = "scene"
+        elif self.max_gap and self._gap >= self.max_gap:
+            reason = "interval"
+        else:
+            return None
+        self._last_hash, self._last_histogram, self._gap = frame_hash, histogram, 0
+        return reason
+
+
+@dataclass
+class Keyframe:
+    id: str
+    file_path: str
+    size: int
+    content_hash: str
+    frame_index: int
+    time_offset: Optional[float]
+    reason: str
+    width: int
+    height: int
+    name: str = ""
+
+
+def save_keyframe(image: Image.Image, out_dir: Path) -> Dict[str, Any]:
+    if image.mode not in PNG_MODES:
+        image = to_rgb(image)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=3)
+    data = buffer.getvalue()
+    frame_id = str(uuid.uuid4())
+    path = out_dir / f"{frame_id}.png"
+    tmp_path = path.with_suffix(".png.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+    return {"id": frame_id, "file_path": str(path), "size": len(data), "content_hash": hashlib.sha256(data).hexdigest()}
+
+
+def extract_keyframes(
+    path: str,
+    kind: str,
+    out_dir: Path,
+    selector: KeyframeSelector,
+    max_frames: int = 200_000,
+    max_keyframes: int = 1000,
+    stop: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
+    """Decode a sequence frame by frame and save its keyframes as PNGs in ``out_dir``.
+
+    Only the current frame is held in memory. Runs in a worker thread;
+    written keyframes are removed again if decoding fails or ``stop`` is set.
+    """
+    keyframes: List[Keyframe] = []
+    frames = 0
+    truncated = False
+    try:
+        for frame in iter_frames(path, kind):
+            if frames >= max_frames or len(keyframes) >= max_keyframes:
+                truncated = True
+                break
+            if stop is not None and stop.is_set():
+                raise SequenceError("Extraction cancelled")
+            frames += 1
+            reason = selector.consider(frame.image)
+            if reason is None:
+                continue
+            saved = save_keyframe(frame.image, out_dir)
+            keyframes.append(Keyframe(
+                frame_index=frame.index,
+                time_offset=frame.time_offset,
+                reason=reason,
+                width=frame.image.width,
+                height=frame.image.height,
+                name=frame.name,
+                **saved
+            ))
+    except Exception as e:
+        for keyframe in keyframes:
+            Path(keyframe.file_path).unlink(missing_ok=True)
+        if isinstance(e, (OSError, Image.DecompressionBombError, zipfile.BadZipFile, tarfile.TarError)):
+            raise SequenceError(f"Could not decode frame {frames}: {str(e)}")
+        raise
+    if not frames:
+        raise SequenceError("No decodable frames found")
+    return {"frames_total": frames, "keyframes": keyframes, "truncated": truncated}
@@ -1,20 +1,53 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Form, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Callable, Awaitable
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import json
 import base64
-from emergentintegrations.llm.chat import LlmChat, UserMessage, ImageContent
+import hashlib
 import aiofiles
 import asyncio
+import mimetypes
+import shutil
+import threading
+import time
+from urllib.parse import quote
+from job_queue import JobQueue
+from analysis_cache import AnalysisCache, make_cache_key
+from cleanup import Sweeper, remove_derived, remove_paths
+from bands import (
+    BandStack, BandStackError, BandStackHeader, inspect_band_stack, is_band_stack_upload, parse_band_list, render_composite
+)
+from detectors import REMOTE, REUSE, SKIP, Frame, engine_from_env
+from events import ChangeStreamBridge, EventBus
+from export import EXPORT_PROJECTION, FORMATS, DetectionExporter
+from indexes import QueryPlanLogger, ensure_indexes
+from llm_client import LlmClient, LlmRejectedError
+from llm_stream import JsonArrayStream, validate_detection
+from metrics import (
+    CONTENT_TYPE, Counter, Gauge, MetricsRegistry, RequestMetricsMiddleware, StageTimer, current_timer, record_stage, time_stage
+)
+from spatial import CELL_GRID, REGION_MODES, SpatialIndex, backfill_cells, box_bounds, grid_cells, region_query
+from stats import StatsCounters
+from sequences import KeyframeSelector, extract_keyframes, sequence_kind
+from tracking import MultiObjectTracker, boxes_to_array, capture_time, order_frames
+from pagination import (
+    NEXT_CURSOR_HEADER, PageEncoder, combine, decode_cursor, field_projection, keyset_filter, keyset_sort,
+    model_projection, next_cursor, time_range, to_mongo_time
+)
+from postprocess import DetectionPostprocessor
+from previews import PreviewCache, PreviewUnavailable, RangeNotSatisfiable, etag_matches, parse_range, snap_size
+from preprocessing import FULL_WINDOW, ImagePreprocessor, Window, map_to_full_image
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -30,6 +63,44 @@ app = FastAPI(title="Multispectral Target Recognition & Tracking", version="1.0.
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Pushes job, file and detection changes to dashboard clients
+event_bus = EventBus.from_env()
+change_stream_bridge = ChangeStreamBridge(db, event_bus)
+
+# Dashboard statistics counters
+stats_counters = StatsCounters(db.stats, jobs_ttl=float(os.environ.get('STATS_JOBS_TTL_SECONDS', 5)))
+
+# Logs winning plans of API queries when QUERY_EXPLAIN is enabled
+query_plans = QueryPlanLogger()
+
+# Helper function to return a page of documents with its continuation cursor
+def page_response(response: Response, docs: List[Dict], model, sort_field: str, limit: int, projection: Optional[Dict]):
+    cursor = next_cursor(docs, sort_field, limit)
+    if projection is not None:
+        # Projected documents are partial, so they are returned without model validation
+        return JSONResponse(jsonable_encoder(docs), headers={NEXT_CURSOR_HEADER: cursor} if cursor else None)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return [model(**doc) for doc in docs]
+
+# List endpoints encode stored documents straight to JSON instead of rebuilding models when enabled
+FAST_LIST_RESPONSES = os.environ.get('FAST_LIST_RESPONSES', 'false').lower() == 'true'
+
+# Helper function to return a page from a Mongo cursor (or fetched list) through the model or the fast path
+async def list_response(response: Response, docs, model, sort_field: str, limit: int, projection: Optional[Dict]):
+    if FAST_LIST_RESPONSES:
+        encoder = PageEncoder(sort_field, limit, None if projection is not None else model)
+        if isinstance(docs, list):
+            for doc in docs:
+                encoder.add(doc)
+        else:
+            async for doc in docs:
+                encoder.add(doc)
+        return encoder.response()
+    if not isinstance(docs, list):
+        docs = await docs.to_list(limit)
+    return page_response(response, docs, model, sort_field, limit, projection)
+
 # Helper function to convert datetime to ISO string for MongoDB
 def prepare_for_mongo(data):
     if isinstance(data, dict):
@@ -42,11 +113,22 @@ def prepare_for_mongo(data):
 class TargetDetection(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     file_id: str
+    job_id: Optional[str] = None
+    track_id: Optional[str] = None
     target_type: str
     confidence: float
     bounding_box: Dict[str, float]  # x, y, width, height
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class Track(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    job_id: str
+    target_type: str
+    length: int = 0
+    first_file_id: Optional[str] = None
+    last_file_id: Optional[str] = None
+    trajectory: List[Dict[str, Any]] = []  # frame, file_id, detection_id, x, y, width, height
+
 class MultispectralFile(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     filename: str
@@ -54,44 +136,129 @@ class MultispectralFile(BaseModel):
     file_path: str
     uploaded_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     metadata: Optional[Dict[str, Any]] = None
+    size: Optional[int] = None
+    content_hash: Optional[str] = None  # SHA-256 of the file content
+    band_stack: Optional[Dict[str, Any]] = None  # layout of a memory-mapped band stack (see bands.py)
+    sequence_id: Optional[str] = None  # FrameSequence this keyframe was extracted from
+
+class FrameSequence(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    filename: str
+    file_type: str
+    kind: str  # video, archive, multiframe (see sequences.py)
+    source_path: str
+    size: Optional[int] = None
+    content_hash: Optional[str] = None
+    status: str = "pending"  # pending, processing, completed, failed (ingested through sequence_queue)
+    uploaded_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    completed_at: Optional[datetime] = None
+    metadata: Optional[Dict[str, Any]] = None
+    attempts: int = 0
+    frames_total: int = 0  # frames decoded
+    keyframe_count: int = 0  # frames registered as files
+    frame_ids: List[str] = []  # keyframe file ids in frame order
+    truncated: bool = False  # SEQUENCE_MAX_FRAMES or SEQUENCE_MAX_KEYFRAMES was reached
+    error: Optional[str] = None
 
 class AnalysisJob(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     file_ids: List[str]
     analysis_type: str  # single, batch, tracking
     status: str = "pending"  # pending, processing, completed, failed
-    results: Optional[List[TargetDetection]] = None
+    results: Optional[List[TargetDetection]] = None  # legacy, detections are stored in db.detections
+    detection_count: int = 0
+    track_count: Optional[int] = None
+    llm_calls_saved: int = 0  # frames the detector engine skipped or reused
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     completed_at: Optional[datetime] = None
+    files_total: int = 0
+    files_done: int = 0
+    attempts: int = 0
+    error: Optional[str] = None
+    failed_files: List[Dict[str, str]] = []  # file_id, error for files the model could not analyze
+    timings: Optional[Dict[str, Dict[str, Any]]] = None  # stage -> seconds, count (JOB_TIMINGS)
+
+# Stored fields returned by list endpoints
+FILE_PROJECTION = model_projection(MultispectralFile)
+JOB_PROJECTION = model_projection(AnalysisJob, exclude=("results",))
+DETECTION_PROJECTION = model_projection(TargetDetection)
+
+class BulkDeleteRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    file_type: Optional[str] = None
+    uploaded_before: Optional[datetime] = None
 
 # Create upload directory
-UPLOAD_DIR = Path("/app/uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_DIR = Path(os.environ.get('UPLOAD_DIR', '/app/uploads'))
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-# Helper function to encode image to base64
-async def encode_image_to_base64(file_path: str) -> str:
-    async with aiofiles.open(file_path, "rb") as image_file:
-        return base64.b64encode(await image_file.read()).decode('utf-8')
+# Files analysed in parallel within one job, and LLM calls in flight per process
+ANALYSIS_FILE_CONCURRENCY = int(os.environ.get('ANALYSIS_FILE_CONCURRENCY', 4))
+llm_semaphore = asyncio.Semaphore(int(os.environ.get('LLM_MAX_IN_FLIGHT', 16)))
+
+# Uploads are streamed to disk in chunks of this size, up to the max size
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+
+# Band stacks are analyzed and previewed through composites rendered on first use
+COMPOSITE_DIR = UPLOAD_DIR / "composites"
+COMPOSITE_DIR.mkdir(exist_ok=True)
+BAND_COMPOSITE_MAX_EDGE = int(os.environ.get('BAND_COMPOSITE_MAX_EDGE', 2048))
+composite_renders: Dict[Path, asyncio.Future] = {}
 
-# AI Analysis using Emergent Integration
-async def analyze_image_with_ai(image_path: str, analysis_type: str = "target_detection") -> List[Dict]:
+# Fixed-size JPEG previews, rendered in worker processes and kept in a size-bounded disk cache
+preview_cache = PreviewCache.from_env(UPLOAD_DIR / "previews")
+RAW_CHUNK_SIZE = int(os.environ.get('RAW_CHUNK_SIZE', 256 * 1024))
+
+# Videos and frame archives keep their source and extracted keyframes under one directory per sequence
+SEQUENCE_DIR = UPLOAD_DIR / "sequences"
+SEQUENCE_DIR.mkdir(exist_ok=True)
+SEQUENCE_MAX_FRAMES = int(os.environ.get('SEQUENCE_MAX_FRAMES', 200_000))
+SEQUENCE_MAX_KEYFRAMES = int(os.environ.get('SEQUENCE_MAX_KEYFRAMES', 1000))
+# Spacing of frames from sources without timing (image archives)
+SEQUENCE_FRAME_INTERVAL_SECONDS = float(os.environ.get('SEQUENCE_FRAME_INTERVAL_SECONDS', 1.0))
+
+# Detections are written with insert_many in batches of this size
+DETECTION_INSERT_BATCH = int(os.environ.get('DETECTION_INSERT_BATCH', 1000))
+
+# Exports are read and encoded this many detections at a time (one Parquet row group each)
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 65536))
+EXPORT_PARQUET_COMPRESSION = os.environ.get('EXPORT_PARQUET_COMPRESSION', 'snappy')
+
+# Frame-to-frame association for "tracking" jobs
+TRACKING_IOU_THRESHOLD = float(os.environ.get('TRACKING_IOU_THRESHOLD', 0.3))
+TRACKING_MAX_AGE = int(os.environ.get('TRACKING_MAX_AGE', 5))
+
+class UploadTooLarge(Exception):
+    pass
+
+# Helper function to stream an upload to disk, hashing it on the fly
+async def save_upload_stream(upload: UploadFile, file_path: Path) -> Tuple[int, str]:
+    digest = hashlib.sha256()
+    size = 0
     try:
-        # Initialize AI chat
-        chat = LlmChat(
-            api_key=os.environ.get('EMERGENT_LLM_KEY'),
-            session_id=f"analysis-{uuid.uuid4()}",
-            system_message="You are an expert in multispectral image analysis and target recognition. Analyze images for objects like vehicles, people, buildings, and other targets. Provide detailed detection results with confidence scores and bounding box coordinates."
-        ).with_model("openai", "gpt-4o")
-        
-        # Encode image to base64
-        image_base64 = await encode_image_to_base64(image_path)
-        
-        # Create image content
-        image_content = ImageContent(image_base64=image_base64)
-        
-        # Analysis prompt based on type
-        if analysis_type == "target_detection":
-            prompt = """Analyze this multispectral image for target detection. Identify and locate:
+        async with aiofiles.open(file_path, 'wb') as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise UploadTooLarge(f"File exceeds the maximum upload size of {UPLOAD_MAX_BYTES} bytes")
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        # Never leave partial uploads behind
+        file_path.unlink(missing_ok=True)
+        raise
+    return size, digest.hexdigest()
+
+# AI model and prompts
+LLM_PROVIDER = "openai"
+LLM_MODEL = "gpt-4o"
+SYSTEM_MESSAGE = "You are an expert in multispectral image analysis and target recognition. Analyze images for objects like vehicles, people, buildings, and other targets. Provide detailed detection results with confidence scores and bounding box coordinates."
+ANALYSIS_PROMPTS = {
+    "target_detection": """Analyze this multispectral image for target detection. Identify and locate:
             1. Vehicles (cars, trucks, aircraft)
             2. People/Personnel 
             3. Buildings/Structures
@@ -104,51 +271,287 @@ async def analyze_image_with_ai(image_path: str, analysis_type: str = "target_de
             - Brief description
             
             Format response as JSON array:
-            [{"type": "vehicle", "confidence": 0.95, "bbox": {"x": 0.2, "y": 0.3, "width": 0.1, "height": 0.15}, "description": "Red car"}]"""
-        
-        # Send message with image
-        user_message = UserMessage(
-            text=prompt,
-            file_contents=[image_content]
+            [{"type": "vehicle", "confidence": 0.95, "bbox": {"x": 0.2, "y": 0.3, "width": 0.1, "height": 0.15}, "description": "Red car"}]""",
+}
+
+BATCH_PROMPT_SUFFIX = """
+
+You are given {count} images, numbered 0 to {last} in the order they are attached. Analyze each image independently.
+Format the response as a JSON array with exactly one entry per image, including images without targets:
+[{{"image": 0, "detections": [{{"type": "vehicle", "confidence": 0.95, "bbox": {{"x": 0.2, "y": 0.3, "width": 0.1, "height": 0.15}}, "description": "Red car"}}]}}, {{"image": 1, "detections": []}}]"""
+
+# Images per request and base64 payload budget per request for "batch" jobs
+LLM_BATCH_SIZE = int(os.environ.get('LLM_BATCH_SIZE', 4))
+LLM_BATCH_MAX_BYTES = int(os.environ.get('LLM_BATCH_MAX_BYTES', 8 * 1024 * 1024))
+
+# Shared model client with rate limiting, retries and a circuit breaker
+llm_client = LlmClient.from_env(LLM_PROVIDER, LLM_MODEL, SYSTEM_MESSAGE)
+
+# Sanitization, confidence gates, NMS and top-K applied to model detections before they are stored
+postprocessor = DetectionPostprocessor()
+
+# Local engine that decides which frames are worth a remote model call
+detector_engine = engine_from_env()
+
+# Content-addressed cache of AI results, shared across replicas through Mongo
+analysis_cache = AnalysisCache(
+    db.analysis_cache,
+    max_entries=int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', 1024)),
+    ttl_seconds=float(os.environ.get('ANALYSIS_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+)
+
+# Images are downscaled/re-encoded (and optionally tiled) before they reach the model
+image_preprocessor = ImagePreprocessor()
+
+# In-memory grid index of each queried file's detections, for region queries
+spatial_index = SpatialIndex.from_env(db.detections)
+
+# Bulk deletes remove files, their detections and derived images this many files at a time
+BULK_DELETE_BATCH = int(os.environ.get('BULK_DELETE_BATCH', 1000))
+
+# Helper function to forget in-memory state of files removed by the garbage collector
+async def forget_removed_files(file_ids, paths):
+    preview_cache.discard(paths)
+    spatial_index.drop(file_ids)
+
+# Helper function to keep counters and the region index in step with orphaned detections
+async def forget_orphan_detections(file_ids):
+    await stats_counters.detections_removed(db.detections, {"file_id": {"$in": file_ids}})
+    spatial_index.drop(file_ids)
+
+# Periodic removal of orphaned upload files, composites, previews and detections
+sweeper = Sweeper.from_env(
+    db,
+    UPLOAD_DIR,
+    [COMPOSITE_DIR, preview_cache.directory],
+    on_files_removed=forget_removed_files,
+    on_detections_removed=forget_orphan_detections,
+)
+
+# Prometheus metrics served at /api/metrics
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    "mtr_stage_duration_seconds", "Duration of one stage of an upload, image analysis or job", ("operation", "stage")
+)
+job_seconds = metrics.histogram("mtr_job_duration_seconds", "Wall-clock duration of analysis jobs", ("analysis_type",))
+http_requests = metrics.counter("mtr_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+http_latency = metrics.histogram("mtr_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"))
+uploaded_bytes = metrics.counter("mtr_uploaded_bytes_total", "Bytes received by uploads")
+stored_detections = metrics.counter("mtr_detections_stored_total", "Detections written to the database")
+queue_depth = metrics.gauge("mtr_job_queue_depth", "Analysis jobs by queue status", ("status",))
+
+# Per-job stage timings are stored on the job document unless disabled
+JOB_TIMINGS = os.environ.get('JOB_TIMINGS', 'true').lower() in ('1', 'true', 'yes')
+
+# Helper function to read an image from disk
+async def read_image_bytes(file_path: str) -> bytes:
+    async with aiofiles.open(file_path, "rb") as image_file:
+        return await image_file.read()
+
+# Helper function to encode image to base64
+def encode_image_to_base64(image_bytes: bytes) -> str:
+    return base64.b64encode(image_bytes).decode('utf-8')
+
+# Receives full-image detections as soon as they are available
+DetectionCallback = Callable[[List[Dict]], Awaitable[None]]
+
+# Send one encoded image to the model, passing each valid detection to on_detections as soon as it is complete.
+# Returns the detections and whether the response was a complete JSON array.
+async def request_detections(image_base64: str, prompt: str, on_detections: Optional[DetectionCallback] = None) -> Tuple[List[Dict], bool]:
+    parser = JsonArrayStream()
+    detections = []
+    waited, parsed = 0.0, 0.0
+    mark = time.perf_counter()
+    async for chunk in llm_client.stream(prompt, [image_base64]):
+        received = time.perf_counter()
+        waited += received - mark
+        # Malformed or out-of-schema items are dropped one by one
+        items = [item for item in map(validate_detection, parser.feed(chunk)) if item is not None]
+        parsed += time.perf_counter() - received
+        if items:
+            detections.extend(items)
+            if on_detections is not None:
+                await on_detections(items)
+        mark = time.perf_counter()
+    waited += time.perf_counter() - mark
+    record_stage(stage_seconds, "analyze", "llm", waited)
+    record_stage(stage_seconds, "analyze", "parse", parsed)
+    if not parser.complete:
+        logger.warning("Model response did not contain a complete JSON array")
+    return detections, parser.complete
+
+# Helper function to read, look up and preprocess an image.
+# Returns the cache key, the cached detections (if any) and the parts to send to the model.
+async def prepare_analysis_input(image_path: str, prompt: str) -> Tuple[str, Optional[List[Dict]], List[Tuple[Window, str]]]:
+    model = f"{LLM_PROVIDER}/{LLM_MODEL}"
+    
+    # Look the image up by content before paying for a model call
+    with time_stage(stage_seconds, "analyze", "read"):
+        image_bytes = await read_image_bytes(image_path)
+    with time_stage(stage_seconds, "analyze", "cache_lookup"):
+        cache_key = await asyncio.to_thread(
+            make_cache_key,
+            image_bytes,
+            SYSTEM_MESSAGE + prompt + image_preprocessor.settings.signature,
+            model
         )
+        cached = await analysis_cache.get(cache_key)
+    if cached is not None:
+        return cache_key, cached, []
+    
+    # Downscale, re-encode and tile off the event loop; non-image data is sent as-is
+    with time_stage(stage_seconds, "analyze", "preprocess"):
+        prepared = await image_preprocessor.prepare(image_bytes)
+    if prepared is None:
+        with time_stage(stage_seconds, "analyze", "encode"):
+            return cache_key, None, [(FULL_WINDOW, encode_image_to_base64(image_bytes))]
+    return cache_key, None, prepared.parts
+
+# Helper function to merge per-part results into full-image detections and cache them
+async def collect_part_results(cache_key: str, parts: List[Tuple[Window, str]], responses: List[Tuple[List[Dict], bool]]) -> List[Dict]:
+    # Map tile detections back to full-image normalized coordinates
+    detections = []
+    for (window, _), (part_detections, _) in zip(parts, responses):
+        detections.extend(map_to_full_image(part_detections, window))
+    
+    # Only well-formed results are cached
+    if all(parsed for _, parsed in responses):
+        await analysis_cache.set(cache_key, detections, f"{LLM_PROVIDER}/{LLM_MODEL}")
+    return detections
+
+# AI Analysis of one image; on_detections receives every detection of the image exactly once.
+# Raises OSError/LlmRejectedError when this image cannot be analyzed, and LlmError when the model is unavailable.
+async def analyze_image_with_ai(image_path: str, analysis_type: str = "target_detection", on_detections: Optional[DetectionCallback] = None) -> List[Dict]:
+    # Analysis prompt based on type
+    prompt = ANALYSIS_PROMPTS.get(analysis_type, ANALYSIS_PROMPTS["target_detection"])
+    
+    cache_key, cached, parts = await prepare_analysis_input(image_path, prompt)
+    if cached is not None:
+        if on_detections is not None and cached:
+            await on_detections(cached)
+        return cached
+    
+    async def request_part(window: Window, part: str) -> Tuple[List[Dict], bool]:
+        async def emit(detections: List[Dict]):
+            if on_detections is not None:
+                await on_detections(map_to_full_image(detections, window))
+        return await request_detections(part, prompt, emit)
+    
+    responses = await asyncio.gather(*(request_part(window, part) for window, part in parts))
+    return await collect_part_results(cache_key, parts, responses)
+
+# Send several encoded images in one request, passing each image's valid detections to on_image(position, detections)
+# as soon as its entry is complete. Returns the detections of every image the response covered.
+async def request_batch_detections(images_base64: List[str], prompt: str, on_image: Optional[Callable[[int, List[Dict]], Awaitable[None]]] = None) -> Dict[int, List[Dict]]:
+    parser = JsonArrayStream()
+    received: Dict[int, List[Dict]] = {}
+    prompt = prompt + BATCH_PROMPT_SUFFIX.format(count=len(images_base64), last=len(images_base64) - 1)
+    waited = 0.0
+    mark = time.perf_counter()
+    async for chunk in llm_client.stream(prompt, images_base64):
+        waited += time.perf_counter() - mark
+        for entry in parser.feed(chunk):
+            index = entry.get("image") if isinstance(entry, dict) else None
+            if (
+                type(index) is not int or not 0 <= index < len(images_base64)
+                or index in received or not isinstance(entry.get("detections"), list)
+            ):
+                logger.warning(f"Rejected malformed batch entry {str(entry)[:200]}")
+                continue
+            received[index] = [item for item in map(validate_detection, entry["detections"]) if item is not None]
+            if on_image is not None:
+                await on_image(index, received[index])
+        mark = time.perf_counter()
+    waited += time.perf_counter() - mark
+    record_stage(stage_seconds, "analyze", "llm", waited)
+    return received
+
+# Helper function to pack items into batches bounded by count and payload size
+def pack_batches(sizes: List[int], max_count: int, max_bytes: int) -> List[List[int]]:
+    batches, current, current_bytes = [], [], 0
+    for index, size in enumerate(sizes):
+        if current and (len(current) >= max_count or current_bytes + size > max_bytes):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(index)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+# AI Analysis of several images, packing up to LLM_BATCH_SIZE images into each request.
+# on_detections(image index, detections) receives every detection exactly once; images that cannot be
+# analyzed get their OSError/LlmRejectedError instead of detections.
+async def analyze_images_with_ai(image_paths: List[str], analysis_type: str = "target_detection", on_detections: Optional[Callable[[int, List[Dict]], Awaitable[None]]] = None) -> List[Any]:
+    prompt = ANALYSIS_PROMPTS.get(analysis_type, ANALYSIS_PROMPTS["target_detection"])
+    inputs = await asyncio.gather(
+        *(prepare_analysis_input(path, prompt) for path in image_paths),
+        return_exceptions=True
+    )
+    
+    async def emit(index: int, window: Window, detections: List[Dict]):
+        if on_detections is not None and detections:
+            await on_detections(index, map_to_full_image(detections, window))
+    
+    # Every uncached part of every image is one image in a batch request
+    pending = []  # (image index, part)
+    for index, prepared in enumerate(inputs):
+        if isinstance(prepared, BaseException):
+            if not isinstance(prepared, OSError):
+                raise prepared
+        elif prepared[1] is not None:
+            await emit(index, FULL_WINDOW, prepared[1])
+        else:
+            pending.extend((index, part) for part in prepared[2])
+    
+    async def run_batch(batch: List[int]) -> List[Any]:
+        responses: Dict[int, Any] = {}  # position in the batch -> (detections, parsed) or rejection
+        if len(batch) > 1:
+            async def on_image(position: int, detections: List[Dict]):
+                image_index, (window, _) = pending[batch[position]]
+                await emit(image_index, window, detections)
+            try:
+                received = await request_batch_detections([pending[i][1][1] for i in batch], prompt, on_image)
+                responses = {position: (detections, True) for position, detections in received.items()}
+            except LlmRejectedError as e:
+                logger.warning(f"Batch analysis of {len(batch)} images was rejected: {str(e)}")
+            if len(responses) < len(batch):
+                logger.warning(f"Batch response covered {len(responses)} of {len(batch)} images, requesting the rest singly")
         
-        response = await chat.send_message(user_message)
+        async def single(position: int) -> Any:
+            image_index, (window, image) = pending[batch[position]]
+            try:
+                return await request_detections(image, prompt, lambda detections: emit(image_index, window, detections))
+            except LlmRejectedError as e:
+                return e
         
-        # Parse AI response
-        try:
-            # Extract JSON from response
-            response_text = response.strip()
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                json_text = response_text[json_start:json_end].strip()
-            elif "[" in response_text and "]" in response_text:
-                json_start = response_text.find("[")
-                json_end = response_text.rfind("]") + 1
-                json_text = response_text[json_start:json_end]
-            else:
-                json_text = response_text
-                
-            detections = json.loads(json_text)
-            return detections
-            
-        except json.JSONDecodeError:
-            # Fallback - create mock detection
-            return [{
-                "type": "generic_object",
-                "confidence": 0.8,
-                "bbox": {"x": 0.4, "y": 0.4, "width": 0.2, "height": 0.2},
-                "description": f"AI Analysis Result: {response[:100]}..."
-            }]
-            
-    except Exception as e:
-        logger.error(f"AI analysis error: {str(e)}")
-        return [{
-            "type": "error",
-            "confidence": 0.0,
-            "bbox": {"x": 0, "y": 0, "width": 0, "height": 0},
-            "description": f"Analysis failed: {str(e)}"
-        }]
+        missing = [position for position in range(len(batch)) if position not in responses]
+        for position, response in zip(missing, await asyncio.gather(*(single(position) for position in missing))):
+            responses[position] = response
+        return [responses[position] for position in range(len(batch))]
+    
+    batches = pack_batches([len(part[1]) for _, part in pending], LLM_BATCH_SIZE, LLM_BATCH_MAX_BYTES)
+    batch_results = await asyncio.gather(*(run_batch(batch) for batch in batches))
+    
+    part_results: Dict[int, List[Any]] = {}
+    for batch, responses in zip(batches, batch_results):
+        for i, response in zip(batch, responses):
+            part_results.setdefault(pending[i][0], []).append(response)
+    
+    results = []
+    for index, prepared in enumerate(inputs):
+        responses = part_results.get(index, [])
+        rejected = [response for response in responses if isinstance(response, Exception)]
+        if isinstance(prepared, Exception):
+            results.append(prepared)
+        elif prepared[1] is not None:
+            results.append(prepared[1])
+        elif rejected:
+            results.append(rejected[0])
+        else:
+            cache_key, _, parts = prepared
+            results.append(await collect_part_results(cache_key, parts, responses))
+    return results
 
 # Routes
 @api_router.get("/")
@@ -169,37 +572,404 @@ async def upload_file(
         filename = f"{file_id}.{file_extension}"
         file_path = UPLOAD_DIR / filename
         
-        # Save file
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        
         # Parse metadata if provided
         parsed_metadata = json.loads(metadata) if metadata else None
         
+        # Save file in bounded-size chunks
+        with time_stage(stage_seconds, "upload", "save"):
+            size, content_hash = await save_upload_stream(file, file_path)
+        uploaded_bytes.inc(size)
+        
+        # Band stacks are validated once; their pixels are only read through a memory map later
+        band_stack = None
+        if is_band_stack_upload(file.filename, parsed_metadata):
+            try:
+                with time_stage(stage_seconds, "upload", "inspect"):
+                    header = await asyncio.to_thread(inspect_band_stack, str(file_path), file.filename, parsed_metadata)
+            except BandStackError:
+                file_path.unlink(missing_ok=True)
+                raise
+            band_stack = header.to_dict()
+        
         # Create file record
         file_record = MultispectralFile(
             id=file_id,
             filename=file.filename,
             file_type=file_type,
             file_path=str(file_path),
-            metadata=parsed_metadata
+            metadata=parsed_metadata,
+            size=size,
+            content_hash=content_hash,
+            band_stack=band_stack
         )
         
         # Save to database
         file_dict = prepare_for_mongo(file_record.dict())
-        await db.files.insert_one(file_dict)
+        with time_stage(stage_seconds, "upload", "db_insert"):
+            await db.files.insert_one(file_dict)
+            await stats_counters.file_added(file_type)
+        event_bus.publish("file.created", file_record)
         
         return file_record
         
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except BandStackError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+# Helper function to remove the keyframes a failed or interrupted ingestion left behind,
+# either all of a sequence's or only one attempt's (file_ids stored from frames_dir)
+async def discard_sequence_frames(sequence_id: str, file_type: str, frames_dir: Optional[Path] = None,
+                                  file_ids: Optional[List[str]] = None):
+    query = {"sequence_id": sequence_id}
+    if file_ids is not None:
+        query["id"] = {"$in": file_ids}
+    try:
+        if file_ids is None or file_ids:
+            result = await db.files.delete_many(query)
+            if result.deleted_count:
+                await stats_counters.file_removed(file_type, result.deleted_count)
+    except Exception as e:
+        logger.warning(f"Could not remove frame records of sequence {sequence_id}: {str(e)}")
+    await asyncio.to_thread(shutil.rmtree, frames_dir or SEQUENCE_DIR / sequence_id, True)
+
+# Helper function to extract the keyframes of an uploaded sequence and register them as files
+async def ingest_sequence(sequence_id: str) -> Dict[str, Any]:
+    doc = await db.sequences.find_one({"id": sequence_id}, {"_id": 0})
+    if not doc:
+        raise ValueError(f"Sequence {sequence_id} not found")
+    sequence = FrameSequence(**doc)
+    # Each attempt writes to its own directory, so cleaning up after one never touches
+    # the frames of a worker that has taken the sequence over
+    frames_dir = SEQUENCE_DIR / sequence.id / f"attempt-{sequence.attempts}"
+    stop = threading.Event()
+    records = []
+    try:
+        # A retried or resumed ingestion starts over from the source
+        await discard_sequence_frames(sequence.id, sequence.file_type)
+        frames_dir.mkdir(parents=True, exist_ok=True)
+        with time_stage(stage_seconds, "sequence", "extract"):
+            result = await asyncio.to_thread(
+                extract_keyframes,
+                sequence.source_path,
+                sequence.kind,
+                frames_dir,
+                KeyframeSelector.from_env(),
+                SEQUENCE_MAX_FRAMES,
+                SEQUENCE_MAX_KEYFRAMES,
+                stop
+            )
+        
+        # Frames are ordered for tracking by capture time: the sequence's own, plus each frame's offset
+        start = capture_time({"metadata": sequence.metadata, "uploaded_at": sequence.uploaded_at})
+        stem = sequence.filename.rsplit('.', 1)[0]
+        for keyframe in result["keyframes"]:
+            offset = keyframe.time_offset
+            if offset is None:
+                offset = keyframe.frame_index * SEQUENCE_FRAME_INTERVAL_SECONDS
+            records.append(MultispectralFile(
+                id=keyframe.id,
+                filename=f"{stem}-frame{keyframe.frame_index:06d}.png",
+                file_type=sequence.file_type,
+                file_path=keyframe.file_path,
+                metadata={
+                    **(sequence.metadata or {}),
+                    "captured_at": (start + timedelta(seconds=offset)).isoformat(),
+                    "frame_index": keyframe.frame_index,
+                    "time_offset": keyframe.time_offset,
+                    "keyframe_reason": keyframe.reason,
+                    "width": keyframe.width,
+                    "height": keyframe.height,
+                    **({"source_name": keyframe.name} if keyframe.name else {}),
+                },
+                size=keyframe.size,
+                content_hash=keyframe.content_hash,
+                sequence_id=sequence.id
+            ))
+        with time_stage(stage_seconds, "sequence", "db_insert"):
+            for start_index in range(0, len(records), DETECTION_INSERT_BATCH):
+                batch = records[start_index:start_index + DETECTION_INSERT_BATCH]
+                await db.files.insert_many([prepare_for_mongo(record.dict()) for record in batch])
+                await stats_counters.file_added(sequence.file_type, len(batch))
+    except BaseException:
+        # Cancelled (shutdown, lost lease) or failed: the queue resumes or retries it from scratch
+        stop.set()
+        file_ids = [record.id for record in records]
+        await asyncio.shield(discard_sequence_frames(sequence.id, sequence.file_type, frames_dir, file_ids))
+        raise
+    
+    logger.info(f"Sequence {sequence.id}: {len(records)} keyframes from {result['frames_total']} frames")
+    return {
+        "frames_total": result["frames_total"],
+        "keyframe_count": len(records),
+        "frame_ids": [record.id for record in records],
+        "truncated": result["truncated"],
+    }
+
+SEQUENCE_EVENT_FIELDS = ("status", "attempts", "error", "completed_at", "frames_total", "keyframe_count", "truncated")
+
+# Helper function to push sequence state changes to the dashboard
+def publish_sequence(sequence_id: str, fields: Dict[str, Any]):
+    data = {key: value for key, value in fields.items() if key in SEQUENCE_EVENT_FIELDS}
+    event_bus.publish("sequence.updated", {**data, "id": sequence_id})
+
+# Sequences are their own jobs: claimed, leased and retried like analysis jobs, so an
+# ingestion interrupted by a restart is picked up again instead of being lost
+sequence_queue = JobQueue(
+    db.sequences,
+    ingest_sequence,
+    workers=int(os.environ.get('SEQUENCE_INGEST_CONCURRENCY', 2)),
+    lease_seconds=float(os.environ.get('SEQUENCE_LEASE_SECONDS', 60)),
+    max_attempts=int(os.environ.get('SEQUENCE_INGEST_MAX_ATTEMPTS', 3)),
+    poll_interval=float(os.environ.get('ANALYSIS_QUEUE_POLL_SECONDS', 2)),
+    on_change=publish_sequence,
+    name="sequence"
+)
+
+@api_router.post("/sequences", response_model=FrameSequence)
+async def upload_sequence(
+    file: UploadFile = File(...),
+    file_type: str = Form(...),
+    metadata: Optional[str] = Form(None)
+):
+    """Upload a video, frame archive or multi-frame image; its keyframes become files in the background"""
+    kind = sequence_kind(file.filename)
+    if kind is None:
+        raise HTTPException(status_code=415, detail="Expected a video, a zip/tar archive of frames or a multi-frame image")
+    try:
+        sequence_id = str(uuid.uuid4())
+        source_path = SEQUENCE_DIR / f"{sequence_id}.{file.filename.split('.')[-1]}"
+        parsed_metadata = json.loads(metadata) if metadata else None
+        
+        with time_stage(stage_seconds, "sequence", "save"):
+            size, content_hash = await save_upload_stream(file, source_path)
+        uploaded_bytes.inc(size)
+        
+        sequence = FrameSequence(
+            id=sequence_id,
+            filename=file.filename,
+            file_type=file_type,
+            kind=kind,
+            source_path=str(source_path),
+            size=size,
+            content_hash=content_hash,
+            metadata=parsed_metadata
+        )
+        await db.sequences.insert_one({
+            **prepare_for_mongo(sequence.dict()),
+            "created_at": sequence.uploaded_at.isoformat(),
+        })
+        sequence_queue.notify()
+        
+        return sequence
+        
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+@api_router.get("/sequences/{sequence_id}", response_model=FrameSequence)
+async def get_sequence(sequence_id: str):
+    """Get a sequence and the ids of its keyframe files"""
+    sequence = await db.sequences.find_one({"id": sequence_id}, {"_id": 0})
+    if not sequence:
+        raise HTTPException(status_code=404, detail="Sequence not found")
+    return FrameSequence(**sequence)
+
+@api_router.delete("/sequences/{sequence_id}")
+async def delete_sequence(sequence_id: str):
+    """Delete a sequence with its source, keyframe files and their detections"""
+    await sequence_queue.reap_exhausted()
+    sequence = await db.sequences.find_one({"id": sequence_id}, {"_id": 0, "status": 1, "source_path": 1})
+    if not sequence:
+        raise HTTPException(status_code=404, detail="Sequence not found")
+    if sequence["status"] in ("pending", "processing"):
+        raise HTTPException(status_code=409, detail="Sequence is still being processed")
+    try:
+        projection = {"_id": 0, "id": 1, "file_path": 1, "file_type": 1}
+        deleted = 0
+        while True:
+            file_docs = await db.files.find({"sequence_id": sequence_id}, projection).limit(BULK_DELETE_BATCH).to_list(BULK_DELETE_BATCH)
+            if not file_docs:
+                break
+            result = await delete_file_records(file_docs)
+            deleted += result["deleted"]
+            event_bus.publish("files.deleted", {"ids": [doc["id"] for doc in file_docs]})
+            if not result["deleted"]:
+                break
+        await asyncio.to_thread(shutil.rmtree, SEQUENCE_DIR / sequence_id, True)
+        Path(sequence["source_path"]).unlink(missing_ok=True)
+        await db.sequences.delete_one({"id": sequence_id})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
+    return {"message": "Sequence deleted successfully", "files_deleted": deleted}
+
 @api_router.get("/files", response_model=List[MultispectralFile])
-async def get_files():
-    """Get all uploaded files"""
-    files = await db.files.find().to_list(1000)
-    return [MultispectralFile(**file) for file in files]
+async def get_files(
+    response: Response,
+    file_type: Optional[str] = None,
+    sequence_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get uploaded files, newest first, a page at a time"""
+    query = combine(
+        {"file_type": file_type} if file_type else {},
+        {"sequence_id": sequence_id} if sequence_id else {},
+        time_range("uploaded_at", since, until),
+        keyset_filter("uploaded_at", cursor)
+    )
+    sort = keyset_sort("uploaded_at")
+    projection = field_projection(fields, MultispectralFile.model_fields, "uploaded_at")
+    await query_plans.log(db.files, query, sort)
+    files = db.files.find(query, projection or FILE_PROJECTION).sort(sort).limit(limit)
+    return await list_response(response, files, MultispectralFile, "uploaded_at", limit, projection)
+
+# Helper function to render (or reuse) a band stack composite
+async def band_composite(file_doc: Dict, bands: Optional[List[int]] = None) -> Path:
+    header = BandStackHeader.from_dict(file_doc["band_stack"])
+    indices = bands or header.default_composite()
+    out_path = COMPOSITE_DIR / f"{file_doc['id']}-{'-'.join(str(i) for i in indices)}.png"
+    if out_path.exists():
+        return out_path
+    # Concurrent requests for the same composite share one render
+    render = composite_renders.get(out_path)
+    if render is None:
+        render = asyncio.ensure_future(asyncio.to_thread(
+            render_composite, file_doc["file_path"], header, indices, out_path, BAND_COMPOSITE_MAX_EDGE
+        ))
+        composite_renders[out_path] = render
+        render.add_done_callback(lambda _: composite_renders.pop(out_path, None))
+    return await asyncio.shield(render)
+
+# Helper function to get the image the detector sees for a file
+async def analysis_image_path(file_doc: Dict) -> str:
+    if file_doc.get("band_stack"):
+        return str(await band_composite(file_doc))
+    return file_doc["file_path"]
+
+# Helper function to compute per-band statistics once and keep them on the file record
+def compute_band_statistics(file_doc: Dict) -> List[Dict[str, float]]:
+    stack = BandStack(file_doc["file_path"], BandStackHeader.from_dict(file_doc["band_stack"]))
+    return [stack.band_statistics(index) for index in range(stack.header.bands)]
+
+@api_router.get("/files/{file_id}/bands")
+async def get_file_bands(file_id: str):
+    """Get the band layout and per-band statistics of a band stack"""
+    file_doc = await db.files.find_one({"id": file_id}, {"_id": 0})
+    if not file_doc or not file_doc.get("band_stack"):
+        raise HTTPException(status_code=404, detail="Band stack not found")
+    band_stack = file_doc["band_stack"]
+    if band_stack.get("statistics") is None:
+        band_stack["statistics"] = await asyncio.to_thread(compute_band_statistics, file_doc)
+        await db.files.update_one({"id": file_id}, {"$set": {"band_stack.statistics": band_stack["statistics"]}})
+    return {**band_stack, "default_composite": BandStackHeader.from_dict(band_stack).default_composite()}
+
+@api_router.get("/files/{file_id}/composite")
+async def get_file_composite(file_id: str, bands: Optional[str] = None):
+    """Get a false-color PNG composite of up to three bands, e.g. ?bands=4,3,2"""
+    file_doc = await db.files.find_one({"id": file_id}, {"_id": 0})
+    if not file_doc or not file_doc.get("band_stack"):
+        raise HTTPException(status_code=404, detail="Band stack not found")
+    try:
+        indices = parse_band_list(bands, file_doc["band_stack"]["bands"])
+    except BandStackError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FileResponse(await band_composite(file_doc, indices), media_type="image/png")
+
+# Helper function to build the validator of a file; strong when the content hash is known
+def file_etag(file_doc: Dict, suffix: str = "") -> str:
+    if file_doc.get("content_hash"):
+        return f'"{file_doc["content_hash"]}{suffix}"'
+    stat = os.stat(file_doc["file_path"])
+    return f'W/"{file_doc["id"]}-{int(stat.st_mtime)}-{stat.st_size}{suffix}"'
+
+@api_router.get("/files/{file_id}/preview")
+async def get_file_preview(
+    file_id: str,
+    request: Request,
+    size: Optional[int] = Query(None, ge=1),
+    bands: Optional[str] = None,
+):
+    """Get a JPEG preview; the size is snapped to the nearest configured preview size"""
+    file_doc = await db.files.find_one({"id": file_id}, {"_id": 0})
+    if not file_doc or not Path(file_doc["file_path"]).exists():
+        raise HTTPException(status_code=404, detail="File not found")
+    size = snap_size(size, preview_cache.sizes)
+    variant = "default"
+    source_path = file_doc["file_path"]
+    if file_doc.get("band_stack"):
+        try:
+            indices = parse_band_list(bands, file_doc["band_stack"]["bands"])
+        except BandStackError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        source_path = str(await band_composite(file_doc, indices))
+        variant = "b" + "-".join(str(i) for i in indices or BandStackHeader.from_dict(file_doc["band_stack"]).default_composite())
+    etag = file_etag(file_doc, f"-{variant}-{size}")
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    try:
+        path = await preview_cache.get(file_id, source_path, size, variant)
+    except PreviewUnavailable:
+        raise HTTPException(status_code=415, detail="No preview available for this file type")
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+# Helper function to stream a byte range of a file in chunks
+async def iter_file_range(path: str, start: int, length: int):
+    async with aiofiles.open(path, 'rb') as f:
+        await f.seek(start)
+        while length > 0:
+            chunk = await f.read(min(RAW_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+@api_router.get("/files/{file_id}/raw")
+async def get_file_raw(file_id: str, request: Request):
+    """Download the original upload; supports single byte ranges and conditional requests"""
+    file_doc = await db.files.find_one({"id": file_id}, {"_id": 0})
+    if not file_doc or not Path(file_doc["file_path"]).exists():
+        raise HTTPException(status_code=404, detail="File not found")
+    file_path = file_doc["file_path"]
+    size = os.path.getsize(file_path)
+    etag = file_etag(file_doc)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=3600",
+        "Content-Disposition": f"attachment; filename*=utf-8''{quote(Path(file_doc['filename']).name)}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # A range is only honoured if the client's copy is still current (strong comparison)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and (if_range.startswith("W/") or if_range != etag):
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+
+    media_type = mimetypes.guess_type(file_doc["filename"])[0] or "application/octet-stream"
+    start, end = byte_range or (0, size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        iter_file_range(file_path, start, end - start + 1),
+        status_code=206 if byte_range else 200,
+        media_type=media_type,
+        headers=headers,
+    )
 
 @api_router.post("/analyze", response_model=AnalysisJob)
 async def create_analysis(
@@ -211,16 +981,16 @@ async def create_analysis(
         # Create analysis job
         job = AnalysisJob(
             file_ids=file_ids,
-            analysis_type=analysis_type,
-            status="processing"
+            analysis_type=analysis_type
         )
         
-        # Save job to database
+        # Save job to database; it stays pending until a worker claims it
         job_dict = prepare_for_mongo(job.dict())
         await db.analysis_jobs.insert_one(job_dict)
         
-        # Start background analysis
-        asyncio.create_task(process_analysis_job(job.id))
+        # Wake up local workers
+        job_queue.notify()
+        event_bus.publish("job.created", job)
         
         return job
         
@@ -228,102 +998,630 @@ async def create_analysis(
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 async def process_analysis_job(job_id: str):
-    """Background task to process analysis job"""
-    try:
-        # Get job from database
-        job_data = await db.analysis_jobs.find_one({"id": job_id})
-        if not job_data:
-            return
-            
-        job = AnalysisJob(**job_data)
+    """Process an analysis job claimed by a queue worker.
+
+    Returns the fields to store on the job when it completes; exceptions are
+    handled by the queue, which retries or fails the job.
+    """
+    # Get job from database
+    job_data = await db.analysis_jobs.find_one({"id": job_id})
+    if not job_data:
+        return None
         
-        # Get files for analysis
+    job = AnalysisJob(**job_data)
+    timer = StageTimer()
+    current_timer.set(timer)
+    
+    # Get files for analysis
+    with time_stage(stage_seconds, "job", "load"):
         files = await db.files.find({"id": {"$in": job.file_ids}}).to_list(1000)
+    
+    # A retried or postponed job starts over, so drop detections from any previous run.
+    # Always done: detections are stored while responses stream, before files_done moves,
+    # and a postponed run gives its attempt back. On a first run the indexed queries find nothing.
+    await stats_counters.detections_removed(db.detections, {"job_id": job_id})
+    removed = await db.detections.delete_many({"job_id": job_id})
+    await db.tracks.delete_many({"job_id": job_id})
+    if removed.deleted_count:
+        spatial_index.drop(job.file_ids)
+    
+    await db.analysis_jobs.update_one(
+        {"id": job_id},
+        {"$set": {"files_total": len(files), "files_done": 0, "detection_count": 0, "failed_files": []}}
+    )
+    event_bus.publish_job(job_id, {"files_total": len(files), "files_done": 0, "detection_count": 0})
+    progress = {"files_done": 0, "detection_count": 0}
+    
+    job_semaphore = asyncio.Semaphore(ANALYSIS_FILE_CONCURRENCY)
+    
+    async def insert_detections(file_obj: MultispectralFile, ai_results: List[Dict]) -> List[str]:
+        # Convert AI results to TargetDetection documents
+        detection_docs = []
+        for detection_data in ai_results:
+            detection = TargetDetection(
+                file_id=file_obj.id,
+                job_id=job_id,
+                target_type=detection_data.get("type", "unknown"),
+                confidence=float(detection_data.get("confidence", 0.0)),
+                bounding_box=detection_data.get("bbox", {"x": 0, "y": 0, "width": 0, "height": 0})
+            )
+            detection_doc = prepare_for_mongo(detection.dict())
+            detection_doc["cells"] = grid_cells(box_bounds(detection_doc["bounding_box"]), CELL_GRID)
+            detection_docs.append(detection_doc)
         
-        all_detections = []
-        
-        for file_doc in files:
-            file_obj = MultispectralFile(**file_doc)
-            
-            # Analyze image with AI
-            ai_results = await analyze_image_with_ai(file_obj.file_path, "target_detection")
-            
-            # Convert AI results to TargetDetection objects
-            for detection_data in ai_results:
-                detection = TargetDetection(
-                    file_id=file_obj.id,
-                    target_type=detection_data.get("type", "unknown"),
-                    confidence=float(detection_data.get("confidence", 0.0)),
-                    bounding_box=detection_data.get("bbox", {"x": 0, "y": 0, "width": 0, "height": 0})
+        # Save detections to database in batches
+        with time_stage(stage_seconds, "job", "db_insert"):
+            for start in range(0, len(detection_docs), DETECTION_INSERT_BATCH):
+                await db.detections.insert_many(
+                    detection_docs[start:start + DETECTION_INSERT_BATCH],
+                    ordered=False
                 )
-                all_detections.append(detection)
-                
-                # Save detection to database
-                detection_dict = prepare_for_mongo(detection.dict())
-                await db.detections.insert_one(detection_dict)
+            await stats_counters.detections_added(detection_docs)
+            
+            await db.analysis_jobs.update_one(
+                {"id": job_id},
+                {"$inc": {"detection_count": len(detection_docs)}}
+            )
+        stored_detections.inc(len(detection_docs))
+        spatial_index.add(file_obj.id, detection_docs)
         
-        # Update job status
-        await db.analysis_jobs.update_one(
-            {"id": job_id},
-            {
-                "$set": {
-                    "status": "completed",
-                    "results": [d.dict() for d in all_detections],
-                    "completed_at": datetime.now(timezone.utc).isoformat()
-                }
-            }
-        )
+        progress["detection_count"] += len(detection_docs)
+        event_bus.publish("detections.created", {
+            "job_id": job_id,
+            "file_id": file_obj.id,
+            "detections": [{key: value for key, value in doc.items() if key not in ("_id", "cells")} for doc in detection_docs]
+        })
+        event_bus.publish_job(job_id, progress)
+        return [doc["id"] for doc in detection_docs]
+    
+    async def remove_detections(file_obj: MultispectralFile, detection_ids: List[str]):
+        query = {"id": {"$in": detection_ids}}
+        with time_stage(stage_seconds, "job", "db_delete"):
+            await stats_counters.detections_removed(db.detections, query)
+            await db.detections.delete_many(query)
+            await db.analysis_jobs.update_one({"id": job_id}, {"$inc": {"detection_count": -len(detection_ids)}})
+        progress["detection_count"] -= len(detection_ids)
+        spatial_index.remove(file_obj.id, detection_ids)
+        event_bus.publish("detections.deleted", {"job_id": job_id, "file_id": file_obj.id, "ids": detection_ids})
+        event_bus.publish_job(job_id, progress)
+    
+    def stream_writer(file_obj: MultispectralFile) -> DetectionCallback:
+        # Post-process detections as they stream in, keeping the stored set equal to the filter's
+        stream_filter = postprocessor.stream()
+        detection_ids: List[str] = []  # by acceptance order
+        lock = asyncio.Lock()
         
-    except Exception as e:
-        logger.error(f"Analysis job {job_id} failed: {str(e)}")
+        async def on_detections(detections: List[Dict]):
+            async with lock:
+                accepted, superseded = stream_filter.add(detections)
+                if superseded:
+                    await remove_detections(file_obj, [detection_ids[i] for i in superseded])
+                if accepted:
+                    detection_ids.extend(await insert_detections(file_obj, accepted))
+        return on_detections
+    
+    async def finish_file(file_obj: MultispectralFile):
+        await db.analysis_jobs.update_one({"id": job_id}, {"$inc": {"files_done": 1}})
+        progress["files_done"] += 1
+        event_bus.publish_job(job_id, progress)
+    
+    async def store_detections(file_obj: MultispectralFile, ai_results: List[Dict]):
+        with time_stage(stage_seconds, "job", "postprocess"):
+            ai_results = postprocessor.process(ai_results)
+        if ai_results:
+            await insert_detections(file_obj, ai_results)
+        await finish_file(file_obj)
+    
+    async def file_failed(file_obj: MultispectralFile, error: Exception) -> List[Dict]:
+        # Recorded on the job instead of being stored as a detection; the file counts as done
+        logger.error(f"AI analysis of file {file_obj.id} failed: {str(error)}")
         await db.analysis_jobs.update_one(
             {"id": job_id},
-            {"$set": {"status": "failed"}}
+            {"$push": {"failed_files": {"file_id": file_obj.id, "error": str(error)}}}
         )
+        return []
+    
+    # Band stacks are analyzed through their rendered composite
+    frames = []
+    image_paths: Dict[str, str] = {}
+    ordered = order_frames(files)
+    with time_stage(stage_seconds, "job", "render"):
+        rendered = await asyncio.gather(*(analysis_image_path(f) for f in ordered), return_exceptions=True)
+    for file_doc, image_path in zip(ordered, rendered):
+        if isinstance(image_path, (OSError, ValueError)):
+            file_obj = MultispectralFile(**file_doc)
+            await file_failed(file_obj, image_path)
+            await finish_file(file_obj)
+        elif isinstance(image_path, BaseException):
+            raise image_path
+        else:
+            frames.append(file_doc)
+            image_paths[file_doc["id"]] = image_path
+    
+    # The detector engine decides which frames need the remote model at all
+    with time_stage(stage_seconds, "job", "plan"):
+        decisions = await detector_engine.plan([Frame(image_paths[f["id"]], f.get("file_type", "")) for f in frames])
+    loop = asyncio.get_running_loop()
+    analyzed = {file_doc["id"]: loop.create_future() for file_doc in frames}
+    
+    async def analyze_file(file_doc):
+        file_obj = MultispectralFile(**file_doc)
+        
+        # Analyze image with AI, bounded per job and per process; detections are stored as they stream in
+        async with job_semaphore:
+            async with llm_semaphore:
+                try:
+                    ai_results = await analyze_image_with_ai(image_paths[file_obj.id], "target_detection", stream_writer(file_obj))
+                except (OSError, LlmRejectedError) as e:
+                    ai_results = await file_failed(file_obj, e)
+        analyzed[file_obj.id].set_result(ai_results)
+        await finish_file(file_obj)
+    
+    async def analyze_group(file_docs):
+        file_objs = [MultispectralFile(**file_doc) for file_doc in file_docs]
+        writers = [stream_writer(file_obj) for file_obj in file_objs]
+        
+        # Several images per model request; detections are stored as each image's entry streams in
+        async def on_detections(index: int, detections: List[Dict]):
+            await writers[index](detections)
+        
+        async with job_semaphore:
+            async with llm_semaphore:
+                ai_results = await analyze_images_with_ai([image_paths[f.id] for f in file_objs], "target_detection", on_detections)
+        for file_obj, file_results in zip(file_objs, ai_results):
+            if isinstance(file_results, Exception):
+                file_results = await file_failed(file_obj, file_results)
+            analyzed[file_obj.id].set_result(file_results)
+            await finish_file(file_obj)
+    
+    async def reuse_file(file_doc, source_id: str):
+        # Unchanged frame: copy the detections of the frame it duplicates
+        await store_detections(MultispectralFile(**file_doc), await analyzed[source_id])
+    
+    async def skip_file(file_doc):
+        await store_detections(MultispectralFile(**file_doc), [])
+    
+    # Fan out over the files; results are stored as each one completes
+    remote_files = [f for f, d in zip(frames, decisions) if d.action == REMOTE]
+    if job.analysis_type == "batch" and LLM_BATCH_SIZE > 1:
+        groups = [remote_files[i:i + LLM_BATCH_SIZE] for i in range(0, len(remote_files), LLM_BATCH_SIZE)]
+        tasks = [asyncio.create_task(analyze_group(group)) for group in groups]
+    else:
+        tasks = [asyncio.create_task(analyze_file(file_doc)) for file_doc in remote_files]
+    for file_doc, decision in zip(frames, decisions):
+        if decision.action == REUSE:
+            tasks.append(asyncio.create_task(reuse_file(file_doc, frames[decision.source]["id"])))
+        elif decision.action == SKIP:
+            tasks.append(asyncio.create_task(skip_file(file_doc)))
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    
+    result = {"detection_count": progress["detection_count"], "llm_calls_saved": len(frames) - len(remote_files)}
+    if job.analysis_type == "tracking":
+        with time_stage(stage_seconds, "job", "tracking"):
+            result["track_count"] = await track_job_detections(job_id, files)
+    
+    job_seconds.observe(time.perf_counter() - timer.started, analysis_type=job.analysis_type)
+    if JOB_TIMINGS:
+        result["timings"] = timer.summary()
+    
+    # The job only keeps counts; detections reference it through job_id
+    return result
+
+async def track_job_detections(job_id: str, files: List[Dict]) -> int:
+    """Link a tracking job's detections across frames and store the trajectories"""
+    tracker = MultiObjectTracker(iou_threshold=TRACKING_IOU_THRESHOLD, max_age=TRACKING_MAX_AGE)
+    tracks: Dict[int, Track] = {}
+    updates = []
+    
+    # One query for the whole job (served by the job_id_file_id index), grouped per frame in memory
+    by_file: Dict[str, List[Dict]] = {file_doc["id"]: [] for file_doc in files}
+    cursor = db.detections.find(
+        {"job_id": job_id},
+        {"_id": 0, "id": 1, "file_id": 1, "target_type": 1, "bounding_box": 1}
+    ).sort("file_id", 1)
+    async for detection in cursor:
+        frame_detections = by_file.get(detection["file_id"])
+        if frame_detections is not None:
+            frame_detections.append(detection)
+    
+    for frame, file_doc in enumerate(order_frames(files)):
+        # Sorted by id so ties in the tracker's assignment break the same way on every run
+        detections = sorted(by_file[file_doc["id"]], key=lambda d: d["id"])
+        
+        # Empty frames still advance the tracker so lost tracks age out
+        boxes = boxes_to_array([d["bounding_box"] for d in detections])
+        track_numbers = tracker.update(boxes, [d["target_type"] for d in detections])
+        
+        for detection, number, box in zip(detections, track_numbers.tolist(), boxes.tolist()):
+            track = tracks.get(number)
+            if track is None:
+                track = tracks[number] = Track(job_id=job_id, target_type=detection["target_type"], first_file_id=file_doc["id"])
+            track.trajectory.append({
+                "frame": frame,
+                "file_id": file_doc["id"],
+                "detection_id": detection["id"],
+                "x": box[0], "y": box[1], "width": box[2], "height": box[3]
+            })
+            track.length += 1
+            track.last_file_id = file_doc["id"]
+            updates.append(UpdateOne({"id": detection["id"]}, {"$set": {"track_id": track.id}}))
+        
+        if len(updates) >= DETECTION_INSERT_BATCH:
+            await db.detections.bulk_write(updates, ordered=False)
+            updates = []
+    
+    if updates:
+        await db.detections.bulk_write(updates, ordered=False)
+    
+    track_docs = [track.dict() for track in tracks.values()]
+    for start in range(0, len(track_docs), DETECTION_INSERT_BATCH):
+        await db.tracks.insert_many(track_docs[start:start + DETECTION_INSERT_BATCH], ordered=False)
+    return len(track_docs)
+
+# Durable worker pool that runs analysis jobs
+job_queue = JobQueue.from_env(
+    db.analysis_jobs,
+    process_analysis_job,
+    on_change=event_bus.publish_job,
+    paused_for=llm_client.paused_for
+)
 
 @api_router.get("/jobs", response_model=List[AnalysisJob])
-async def get_analysis_jobs():
-    """Get all analysis jobs"""
-    jobs = await db.analysis_jobs.find().sort("created_at", -1).to_list(100)
-    return [AnalysisJob(**job) for job in jobs]
+async def get_analysis_jobs(
+    response: Response,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get analysis jobs, newest first, a page at a time"""
+    query = combine(
+        {"status": status} if status else {},
+        time_range("created_at", since, until),
+        keyset_filter("created_at", cursor)
+    )
+    sort = keyset_sort("created_at")
+    projection = field_projection(fields, AnalysisJob.model_fields, "created_at")
+    await query_plans.log(db.analysis_jobs, query, sort)
+    jobs = db.analysis_jobs.find(query, projection or JOB_PROJECTION).sort(sort).limit(limit)
+    return await list_response(response, jobs, AnalysisJob, "created_at", limit, projection)
 
 @api_router.get("/jobs/{job_id}", response_model=AnalysisJob)
 async def get_analysis_job(job_id: str):
     """Get specific analysis job"""
+    await query_plans.log(db.analysis_jobs, {"id": job_id})
     job_data = await db.analysis_jobs.find_one({"id": job_id})
     if not job_data:
         raise HTTPException(status_code=404, detail="Job not found")
     return AnalysisJob(**job_data)
 
+@api_router.get("/jobs/{job_id}/detections", response_model=List[TargetDetection])
+async def get_job_detections(
+    job_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """Get the detections of an analysis job, a page at a time"""
+    if not await db.analysis_jobs.find_one({"id": job_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Job not found")
+    query = combine({"job_id": job_id}, keyset_filter("timestamp", cursor))
+    sort = keyset_sort("timestamp")
+    await query_plans.log(db.detections, query, sort)
+    detections = db.detections.find(query, DETECTION_PROJECTION).sort(sort).limit(limit)
+    return await list_response(response, detections, TargetDetection, "timestamp", limit, None)
+
+@api_router.get("/jobs/{job_id}/tracks", response_model=List[Track])
+async def get_job_tracks(job_id: str, limit: int = Query(100, ge=1, le=1000), min_length: int = Query(1, ge=1)):
+    """Get the tracks of a tracking job, longest first"""
+    if not await db.analysis_jobs.find_one({"id": job_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Job not found")
+    query = {"job_id": job_id, "length": {"$gte": min_length}}
+    await query_plans.log(db.tracks, query, [("length", -1)])
+    tracks = await db.tracks.find(query).sort("length", -1).limit(limit).to_list(limit)
+    return [Track(**track) for track in tracks]
+
 @api_router.get("/detections", response_model=List[TargetDetection])
-async def get_detections(file_id: Optional[str] = None):
-    """Get target detections, optionally filtered by file"""
-    query = {"file_id": file_id} if file_id else {}
-    detections = await db.detections.find(query).sort("timestamp", -1).to_list(1000)
-    return [TargetDetection(**detection) for detection in detections]
+async def get_detections(
+    response: Response,
+    file_id: Optional[str] = None,
+    job_id: Optional[str] = None,
+    target_type: Optional[str] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get target detections, newest first, filtered and a page at a time"""
+    query = combine(
+        {"file_id": file_id} if file_id else {},
+        {"job_id": job_id} if job_id else {},
+        {"target_type": target_type} if target_type else {},
+        {"confidence": {"$gte": min_confidence}} if min_confidence is not None else {},
+        time_range("timestamp", since, until),
+        keyset_filter("timestamp", cursor)
+    )
+    sort = keyset_sort("timestamp")
+    projection = field_projection(fields, TargetDetection.model_fields, "timestamp")
+    await query_plans.log(db.detections, query, sort)
+    detections = db.detections.find(query, projection or DETECTION_PROJECTION).sort(sort).limit(limit)
+    return await list_response(response, detections, TargetDetection, "timestamp", limit, projection)
+
+@api_router.get("/detections/export")
+async def export_detections(
+    format: str = "parquet",  # parquet, arrow, ndjson
+    file_id: Optional[str] = None,
+    job_id: Optional[str] = None,
+    target_type: Optional[str] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    """Stream every matching detection, newest first, as Parquet, an Arrow stream or NDJSON"""
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    query = combine(
+        {"file_id": file_id} if file_id else {},
+        {"job_id": job_id} if job_id else {},
+        {"target_type": target_type} if target_type else {},
+        {"confidence": {"$gte": min_confidence}} if min_confidence is not None else {},
+        time_range("timestamp", since, until)
+    )
+    sort = keyset_sort("timestamp")
+    await query_plans.log(db.detections, query, sort)
+    media_type, extension = FORMATS[format]
+    
+    async def body():
+        # Only one batch of documents and its encoded bytes are held at a time
+        exporter = DetectionExporter(format, compression=EXPORT_PARQUET_COMPRESSION)
+        cursor = db.detections.find(query, EXPORT_PROJECTION).sort(sort).batch_size(EXPORT_BATCH_SIZE)
+        try:
+            batch = []
+            async for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= EXPORT_BATCH_SIZE:
+                    yield await asyncio.to_thread(exporter.write, batch)
+                    batch = []
+            if batch:
+                yield await asyncio.to_thread(exporter.write, batch)
+            yield exporter.close()
+        finally:
+            await cursor.close()
+    
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="detections.{extension}"'}
+    )
+
+@api_router.get("/detections/region", response_model=List[TargetDetection])
+async def get_region_detections(
+    response: Response,
+    x: float = Query(..., ge=0, le=1),
+    y: float = Query(..., ge=0, le=1),
+    width: float = Query(..., ge=0, le=1),
+    height: float = Query(..., ge=0, le=1),
+    mode: str = "intersects",  # intersects, contains
+    file_id: Optional[str] = None,
+    job_id: Optional[str] = None,
+    target_type: Optional[str] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get detections overlapping (or inside) a region of the image, in normalized coordinates, newest first"""
+    if mode not in REGION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(REGION_MODES)}")
+    region = (x, y, min(1.0, x + width), min(1.0, y + height))
+    projection = field_projection(fields, TargetDetection.model_fields, "timestamp")
+    
+    if file_id:
+        # One file: the in-memory grid answers the query, Mongo only returns the page by id
+        index = await spatial_index.for_file(file_id)
+        ids = index.query(
+            region,
+            mode,
+            target_type=target_type,
+            job_id=job_id,
+            min_confidence=min_confidence,
+            since=to_mongo_time(since) if since else None,
+            until=to_mongo_time(until) if until else None,
+            after=decode_cursor(cursor) if cursor else None,
+            limit=limit
+        )
+        found = await db.detections.find({"id": {"$in": ids}}, projection or DETECTION_PROJECTION).to_list(len(ids))
+        by_id = {doc["id"]: doc for doc in found}
+        detections = [by_id[detection_id] for detection_id in ids if detection_id in by_id]
+    else:
+        # Across files: grid cells stored on each detection narrow the scan through the cells indexes
+        query = combine(
+            region_query(region, mode, CELL_GRID),
+            {"job_id": job_id} if job_id else {},
+            {"target_type": target_type} if target_type else {},
+            {"confidence": {"$gte": min_confidence}} if min_confidence is not None else {},
+            time_range("timestamp", since, until),
+            keyset_filter("timestamp", cursor)
+        )
+        sort = keyset_sort("timestamp")
+        await query_plans.log(db.detections, query, sort)
+        detections = db.detections.find(query, projection or DETECTION_PROJECTION).sort(sort).limit(limit)
+    return await list_response(response, detections, TargetDetection, "timestamp", limit, projection)
+
+@api_router.get("/events")
+async def stream_events(request: Request):
+    """Server-sent events with job state changes, per-file progress and new detections"""
+    return StreamingResponse(
+        event_bus.stream(request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/stats")
+async def get_stats():
+    """Get dashboard statistics from incrementally maintained counters"""
+    return await stats_counters.snapshot(db.analysis_jobs)
+
+@api_router.post("/stats/rebuild")
+async def rebuild_stats():
+    """Recompute the statistics counters from the stored data"""
+    await stats_counters.rebuild(db)
+    return await stats_counters.snapshot(db.analysis_jobs)
+
+@api_router.get("/llm/stats")
+async def get_llm_stats():
+    """Get model client counters and circuit breaker state"""
+    return llm_client.stats()
+
+@api_router.get("/detectors/stats")
+async def get_detector_stats():
+    """Get how many frames the detector engine kept away from the remote model"""
+    return {"engine": detector_engine.name, **detector_engine.stats()}
+
+# Gauges and counters owned by other components, read at scrape time
+@metrics.collector
+def collect_component_metrics():
+    llm_stats = llm_client.stats()
+    llm_requests = Counter("mtr_llm_requests_total", "Model requests sent, including retries")
+    llm_requests.inc(llm_stats["requests"])
+    llm_errors = Counter("mtr_llm_errors_total", "Model request errors by kind", ("kind",))
+    for kind in ("retries", "failures", "timeouts", "rejected"):
+        llm_errors.inc(llm_stats[kind], kind=kind)
+    llm_in_flight = Gauge("mtr_llm_in_flight", "Model requests currently streaming")
+    llm_in_flight.set(llm_stats["in_flight"])
+    circuit_open = Gauge("mtr_llm_circuit_open", "1 while the model circuit breaker is open")
+    circuit_open.set(1 if llm_stats["circuit"] == "open" else 0)
+    running = Gauge("mtr_job_queue_running", "Jobs running in this process")
+    running.set(job_queue.in_flight)
+    cache = Counter("mtr_analysis_cache_lookups_total", "Analysis cache lookups by result", ("result",))
+    cache_stats = analysis_cache.stats()
+    cache.inc(cache_stats["hits"], result="hit")
+    cache.inc(cache_stats["misses"], result="miss")
+    previews = Gauge("mtr_preview_cache_bytes", "Bytes held by the preview cache")
+    previews.set(preview_cache.stats()["bytes"])
+    return [llm_requests, llm_errors, llm_in_flight, circuit_open, running, cache, previews]
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Get counters, gauges and latency histograms in Prometheus text format"""
+    counts = await db.analysis_jobs.aggregate([
+        {"$match": {"status": {"$in": ["pending", "processing"]}}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    by_status = {doc["_id"]: doc["count"] for doc in counts}
+    for status in ("pending", "processing"):
+        queue_depth.set(by_status.get(status, 0), status=status)
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Get hit/miss counters of the analysis result cache"""
+    return analysis_cache.stats()
+
+@api_router.get("/detections/region/stats")
+async def get_region_index_stats():
+    """Get the size of the in-memory region index"""
+    return spatial_index.stats()
+
+@api_router.get("/previews/stats")
+async def get_preview_stats():
+    """Get the size of the on-disk preview cache"""
+    return preview_cache.stats()
+
+# Helper function to delete file records with their detections, upload files and derived images
+async def delete_file_records(file_docs: List[Dict]) -> Dict[str, int]:
+    file_ids = [doc["id"] for doc in file_docs]
+    detection_query = {"file_id": {"$in": file_ids}}
+    await stats_counters.detections_removed(db.detections, detection_query)
+    result = await db.files.delete_many({"id": {"$in": file_ids}})
+    if result.deleted_count == len(file_docs):
+        by_type: Dict[str, int] = {}
+        for doc in file_docs:
+            by_type[doc.get("file_type")] = by_type.get(doc.get("file_type"), 0) + 1
+        for file_type, count in by_type.items():
+            await stats_counters.file_removed(file_type, count)
+    elif result.deleted_count:
+        # Some files were deleted concurrently; which ones is unknown, so leave the counters to /stats/rebuild
+        logger.warning(f"Deleted {result.deleted_count} of {len(file_docs)} files; file counters may drift")
+    detections = await db.detections.delete_many(detection_query)
+    await db.analysis_jobs.update_many(
+        {"file_ids": {"$in": file_ids}, "status": {"$in": ["completed", "failed"]}},
+        {"$pull": {"file_ids": {"$in": file_ids}}}
+    )
+    spatial_index.drop(file_ids)
+
+    # Unlink in a worker thread; one scan of each derived directory covers the whole batch
+    await asyncio.to_thread(remove_paths, [doc["file_path"] for doc in file_docs])
+    derived = await asyncio.to_thread(remove_derived, [COMPOSITE_DIR, preview_cache.directory], set(file_ids))
+    preview_cache.discard(derived)
+    return {"deleted": result.deleted_count, "detections_deleted": detections.deleted_count}
+
+@api_router.post("/files/delete")
+async def delete_files(request: BulkDeleteRequest):
+    """Delete files by id list and/or filter, with their detections"""
+    if not request.ids and not request.file_type and request.uploaded_before is None:
+        raise HTTPException(status_code=400, detail="Provide ids, file_type or uploaded_before")
+    query = combine(
+        {"id": {"$in": request.ids}} if request.ids else {},
+        {"file_type": request.file_type} if request.file_type else {},
+        time_range("uploaded_at", None, request.uploaded_before)
+    )
+    projection = {"_id": 0, "id": 1, "file_path": 1, "file_type": 1}
+    totals = {"deleted": 0, "detections_deleted": 0}
+    try:
+        while True:
+            file_docs = await db.files.find(query, projection).limit(BULK_DELETE_BATCH).to_list(BULK_DELETE_BATCH)
+            if not file_docs:
+                break
+            result = await delete_file_records(file_docs)
+            totals["deleted"] += result["deleted"]
+            totals["detections_deleted"] += result["detections_deleted"]
+            event_bus.publish("files.deleted", {"ids": [doc["id"] for doc in file_docs]})
+            if not result["deleted"]:
+                break
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
+    return totals
 
 @api_router.delete("/files/{file_id}")
 async def delete_file(file_id: str):
     """Delete uploaded file"""
+    await query_plans.log(db.files, {"id": file_id})
+    file_data = await db.files.find_one({"id": file_id}, {"_id": 0, "id": 1, "file_path": 1, "file_type": 1})
+    if not file_data:
+        raise HTTPException(status_code=404, detail="File not found")
     try:
-        # Get file record
-        file_data = await db.files.find_one({"id": file_id})
-        if not file_data:
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        # Delete physical file
-        file_path = Path(file_data["file_path"])
-        if file_path.exists():
-            file_path.unlink()
-        
-        # Delete from database
-        await db.files.delete_one({"id": file_id})
-        await db.detections.delete_many({"file_id": file_id})
-        
-        return {"message": "File deleted successfully"}
-        
+        await delete_file_records([file_data])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
+    event_bus.publish("file.deleted", {"id": file_id})
+    return {"message": "File deleted successfully"}
+
+@api_router.get("/gc/stats")
+async def get_gc_stats():
+    """Get the settings and result of the last garbage collection pass"""
+    return {
+        "interval_seconds": sweeper.interval_seconds,
+        "batch_size": sweeper.batch_size,
+        "min_age_seconds": sweeper.min_age_seconds,
+        "last_run": sweeper.last_run,
+    }
+
+@api_router.post("/gc/run")
+async def run_gc():
+    """Run a garbage collection pass now"""
+    return await sweeper.sweep()
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -334,8 +1632,11 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Accept-Ranges", "Content-Range", "Content-Length"],
 )
 
+app.add_middleware(RequestMetricsMiddleware, requests=http_requests, latency=http_latency)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -343,6 +1644,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_job_queue():
+    await ensure_indexes(db)
+    await analysis_cache.ensure_indexes()
+    await stats_counters.ensure_initialized(db)
+    # Detections stored before region queries existed get their grid cells in the background
+    app.state.backfill_cells = asyncio.create_task(backfill_cells(db.detections, CELL_GRID, DETECTION_INSERT_BATCH))
+    if not event_bus.local_publish:
+        change_stream_bridge.start()
+    job_queue.start()
+    sequence_queue.start()
+    sweeper.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await job_queue.stop()
+    await sequence_queue.stop()
+    await sweeper.stop()
+    await change_stream_bridge.stop()
+    app.state.backfill_cells.cancel()
+    image_preprocessor.shutdown()
+    preview_cache.shutdown()
+    await llm_client.close()
     client.close()
\ No newline at end of file
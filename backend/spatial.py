@@ -0,0 +1,392 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+INTERSECTS = "intersects"
+CONTAINS = "contains"  # the whole detection lies inside the region
+REGION_MODES = (INTERSECTS, CONTAINS)
+
+# Grid of the ``cells`` field stored on every detection for cross-file region queries.
+# Changing it requires recomputing the stored cells.
+CELL_GRID = 8
+
+# Fields loaded into the in-memory index
+INDEX_PROJECTION = {"_id": 0, "id": 1, "job_id": 1, "target_type": 1, "confidence": 1, "bounding_box": 1, "timestamp": 1}
+
+Region = Tuple[float, float, float, float]  # x1, y1, x2, y2 in normalized image coordinates
+
+
+def to_micros(timestamps: List[str]) -> np.ndarray:
+    """Stored UTC ISO timestamps as int64 microseconds, for sorting and range checks"""
+    try:
+        return np.array([value.removesuffix("+00:00") for value in timestamps], dtype="datetime64[us]").astype(np.int64)
+    except ValueError:
+        # Other offsets or legacy formats: parse one by one
+        return np.array([
+            int(datetime.fromisoformat(value).replace(tzinfo=datetime.fromisoformat(value).tzinfo or timezone.utc).timestamp() * 1_000_000)
+            if value else 0
+            for value in timestamps
+        ], dtype=np.int64)
+
+
+def box_bounds(bbox: Optional[Dict[str, Any]]) -> Region:
+    """(x1, y1, x2, y2) of a stored bounding box, clipped to the image"""
+    bbox = bbox or {}
+    x = float(bbox.get("x", 0) or 0)
+    y = float(bbox.get("y", 0) or 0)
+    x2 = x + max(0.0, float(bbox.get("width", 0) or 0))
+    y2 = y + max(0.0, float(bbox.get("height", 0) or 0))
+    return min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0), min(max(x2, 0.0), 1.0), min(max(y2, 0.0), 1.0)
+
+
+def grid_cells(bounds: Region, grid: int) -> List[int]:
+    """Row-major ids of the grid cells a rectangle overlaps"""
+    x1, y1, x2, y2 = bounds
+    col1, col2 = min(int(x1 * grid), grid - 1), min(int(x2 * grid), grid - 1)
+    row1, row2 = min(int(y1 * grid), grid - 1), min(int(y2 * grid), grid - 1)
+    return [row * grid + col for row in range(row1, row2 + 1) for col in range(col1, col2 + 1)]
+
+
+def region_query(region: Region, mode: str = INTERSECTS, grid: Optional[int] = None) -> Dict[str, Any]:
+    """Mongo filter matching stored bounding boxes against a region.
+
+    With ``grid`` the persisted ``cells`` field narrows the candidates
+    through its index before the exact comparison.
+    """
+    x1, y1, x2, y2 = region
+    right = {"$add": ["$bounding_box.x", "$bounding_box.width"]}
+    bottom = {"$add": ["$bounding_box.y", "$bounding_box.height"]}
+    if mode == CONTAINS:
+        query = {
+            "bounding_box.x": {"$gte": x1},
+            "bounding_box.y": {"$gte": y1},
+            "$expr": {"$and": [{"$lte": [right, x2]}, {"$lte": [bottom, y2]}]},
+        }
+    else:
+        query = {
+            "bounding_box.x": {"$lte": x2},
+            "bounding_box.y": {"$lte": y2},
+            "$expr": {"$and": [{"$gte": [right, x1]}, {"$gte": [bottom, y1]}]},
+        }
+    if grid:
+        query["cells"] = {"$in": grid_cells(region, grid)}
+    return query
+
+
+class FileGridIndex:
+    """Detections of one file in a uniform grid over the normalized image plane.
+
+    Each cell lists the rows of the detections overlapping it, so a region
+    query only looks at the detections in the cells it covers. Columns are
+    numpy arrays grown by doubling, with classes and jobs stored as integer
+    codes; removed rows are masked and compacted once they make up half of
+    the index.
+    """
+
+    def __init__(self, grid: int = 16):
+        self.grid = grid
+        self.loaded_at = time.monotonic()
+        self.size = 0
+        self.dead = 0
+        self.rows: Dict[str, int] = {}
+        self.cells: Dict[int, List[np.ndarray]] = {}
+        self.codes: Dict[str, Dict[Any, int]] = {"types": {}, "jobs": {}}
+        self.ids = np.empty(0, dtype="U36")
+        self.timestamps = np.empty(0, dtype="U32")
+        self.times = np.empty(0, dtype=np.int64)
+        self.types = np.empty(0, dtype=np.int32)
+        self.jobs = np.empty(0, dtype=np.int32)
+        self.bounds = np.empty((0, 4), dtype=np.float64)
+        self.confidence = np.empty(0, dtype=np.float64)
+        self.alive = np.empty(0, dtype=bool)
+
+    def __len__(self) -> int:
+        return self.size - self.dead
+
+    def _reserve(self, extra: int):
+        capacity = len(self.alive)
+        if self.size + extra <= capacity:
+            return
+        capacity = max(64, capacity * 2, self.size + extra)
+        for name in ("ids", "timestamps", "times", "types", "jobs", "bounds", "confidence", "alive"):
+            column = getattr(self, name)
+            grown = np.empty((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def _code(self, column: str, value: Any) -> int:
+        codes = self.codes[column]
+        return codes.setdefault(value, len(codes))
+
+    def _add_to_cell(self, cell: int, rows: np.ndarray):
+        chunks = self.cells.setdefault(cell, [])
+        chunks.append(rows)
+        if len(chunks) > 32:
+            # Many small appends (streamed detections): merge them
+            self.cells[cell] = [np.concatenate(chunks)]
+
+    def add(self, docs: Iterable[Dict[str, Any]]):
+        docs = [doc for doc in docs if doc["id"] not in self.rows]
+        if not docs:
+            return
+        start, end = self.size, self.size + len(docs)
+        self._reserve(len(docs))
+        boxes = np.array([
+            [(doc.get("bounding_box") or {}).get(key) or 0.0 for key in ("x", "y", "width", "height")]
+            for doc in docs
+        ], dtype=np.float64)
+        bounds = np.concatenate([boxes[:, :2], boxes[:, :2] + np.maximum(boxes[:, 2:], 0.0)], axis=1)
+        np.clip(bounds, 0.0, 1.0, out=bounds)
+
+        self.ids[start:end] = [doc["id"] for doc in docs]
+        self.timestamps[start:end] = [doc.get("timestamp") or "" for doc in docs]
+        self.times[start:end] = to_micros(self.timestamps[start:end].tolist())
+        self.types[start:end] = [self._code("types", doc.get("target_type")) for doc in docs]
+        self.jobs[start:end] = [self._code("jobs", doc.get("job_id")) for doc in docs]
+        self.confidence[start:end] = [doc.get("confidence") or 0.0 for doc in docs]
+        self.bounds[start:end] = bounds
+        self.alive[start:end] = True
+        self.rows.update((doc["id"], start + i) for i, doc in enumerate(docs))
+        self.size = end
+
+        # Most boxes lie in a single cell: group those with one sort, expand the others
+        spans = np.minimum((bounds * self.grid).astype(np.int64), self.grid - 1)
+        rows = np.arange(start, end)
+        single = (spans[:, 0] == spans[:, 2]) & (spans[:, 1] == spans[:, 3])
+        cells = spans[single, 1] * self.grid + spans[single, 0]
+        order = np.argsort(cells, kind="stable")
+        cells, grouped = cells[order], rows[single][order]
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(cells)) + 1])
+        for first, cell_rows in zip(starts, np.split(grouped, starts[1:])):
+            if len(cell_rows):
+                self._add_to_cell(int(cells[first]), cell_rows)
+        spread: Dict[int, List[int]] = {}
+        for row, (col1, row1, col2, row2) in zip(rows[~single].tolist(), spans[~single].tolist()):
+            for cell_row in range(row1, row2 + 1):
+                for col in range(col1, col2 + 1):
+                    spread.setdefault(cell_row * self.grid + col, []).append(row)
+        for cell, cell_rows in spread.items():
+            self._add_to_cell(cell, np.array(cell_rows, dtype=np.int64))
+
+    def remove(self, ids: Iterable[str]):
+        for detection_id in ids:
+            row = self.rows.pop(detection_id, None)
+            if row is not None:
+                self.alive[row] = False
+                self.dead += 1
+        if self.dead and self.dead * 2 >= self.size:
+            self._compact()
+
+    def _compact(self):
+        keep = np.flatnonzero(self.alive[:self.size])
+        types = {code: value for value, code in self.codes["types"].items()}
+        jobs = {code: value for value, code in self.codes["jobs"].items()}
+        bounds = self.bounds[keep]
+        docs = [
+            {
+                "id": detection_id,
+                "timestamp": timestamp,
+                "target_type": types[type_code],
+                "job_id": jobs[job_code],
+                "confidence": confidence,
+                "bounding_box": {"x": x1, "y": y1, "width": x2 - x1, "height": y2 - y1},
+            }
+            for detection_id, timestamp, type_code, job_code, confidence, (x1, y1, x2, y2) in zip(
+                self.ids[keep].tolist(), self.timestamps[keep].tolist(), self.types[keep].tolist(),
+                self.jobs[keep].tolist(), self.confidence[keep].tolist(), bounds.tolist()
+            )
+        ]
+        loaded_at = self.loaded_at
+        self.__init__(self.grid)
+        self.loaded_at = loaded_at
+        self.add(docs)
+
+    def query(
+        self,
+        region: Region,
+        mode: str = INTERSECTS,
+        target_type: Optional[str] = None,
+        job_id: Optional[str] = None,
+        min_confidence: Optional[float] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[str]:
+        """Ids of the matching detections, newest first (timestamp, then id, descending).
+
+        Time bounds and ``after`` (a keyset cursor) are ISO strings, compared
+        the way Mongo compares the stored timestamps.
+        """
+        if target_type is not None and target_type not in self.codes["types"]:
+            return []
+        if job_id is not None and job_id not in self.codes["jobs"]:
+            return []
+        chunks = [chunk for cell in grid_cells(region, self.grid) for chunk in self.cells.get(cell, [])]
+        if not chunks:
+            return []
+        # Boxes spanning several cells are listed in each; a mask removes the duplicates
+        selected = np.zeros(self.size, dtype=bool)
+        for chunk in chunks:
+            selected[chunk] = True
+        rows = np.flatnonzero(selected & self.alive[:self.size])
+
+        x1, y1, x2, y2 = region
+        bounds = self.bounds[rows]
+        if mode == CONTAINS:
+            keep = (bounds[:, 0] >= x1) & (bounds[:, 1] >= y1) & (bounds[:, 2] <= x2) & (bounds[:, 3] <= y2)
+        else:
+            keep = (bounds[:, 0] <= x2) & (bounds[:, 1] <= y2) & (bounds[:, 2] >= x1) & (bounds[:, 3] >= y1)
+        if min_confidence is not None:
+            keep &= self.confidence[rows] >= min_confidence
+        if target_type is not None:
+            keep &= self.types[rows] == self.codes["types"][target_type]
+        if job_id is not None:
+            keep &= self.jobs[rows] == self.codes["jobs"][job_id]
+        rows = rows[keep]
+
+        times = self.times[rows]
+        keep = np.ones(len(rows), dtype=bool)
+        if since is not None:
+            keep &= times >= to_micros([since])[0]
+        if until is not None:
+            keep &= times < to_micros([until])[0]
+        if after is not None:
+            after_time = to_micros([after[0]])[0]
+            keep &= times <= after_time
+            tied = keep & (times == after_time)
+            keep[tied] = self.ids[rows[tied]] < after[1]
+        rows, times = rows[keep], times[keep]
+
+        if limit is not None and len(rows) > limit:
+            # Only the newest ``limit`` rows (and any tied with the last of them) need sorting
+            cutoff = np.partition(times, len(times) - limit)[len(times) - limit]
+            rows, times = rows[times >= cutoff], times[times >= cutoff]
+        ids = self.ids[rows]
+        order = np.lexsort((ids, times))[::-1]
+        if limit is not None:
+            order = order[:limit]
+        return ids[order].tolist()
+
+
+class SpatialIndex:
+    """Per-file grid indexes, loaded from Mongo on first query and kept in an LRU.
+
+    Detections written or deleted by this process are applied to loaded
+    indexes directly; indexes are reloaded after ``ttl_seconds`` so changes
+    made by other replicas show up too. The LRU is bounded by the total
+    number of indexed detections.
+    """
+
+    def __init__(self, collection, grid: int = 16, max_detections: int = 2_000_000, ttl_seconds: float = 300):
+        self.collection = collection
+        self.grid = grid
+        self.max_detections = max_detections
+        self.ttl_seconds = ttl_seconds
+        self._files: "OrderedDict[str, FileGridIndex]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.loads = 0
+        self.hits = 0
+
+    @classmethod
+    def from_env(cls, collection):
+        return cls(
+            collection,
+            grid=int(os.environ.get('REGION_INDEX_GRID', 16)),
+            max_detections=int(os.environ.get('REGION_INDEX_MAX_DETECTIONS', 2_000_000)),
+            ttl_seconds=float(os.environ.get('REGION_INDEX_TTL_SECONDS', 300)),
+        )
+
+    @property
+    def indexed(self) -> int:
+        return sum(len(index) for index in self._files.values())
+
+    async def _load(self, file_id: str) -> FileGridIndex:
+        index = FileGridIndex(self.grid)
+        docs = await self.collection.find({"file_id": file_id}, INDEX_PROJECTION).to_list(None)
+        index.add(docs)
+        self.loads += 1
+        return index
+
+    async def for_file(self, file_id: str) -> FileGridIndex:
+        index = self._files.get(file_id)
+        if index is not None and time.monotonic() - index.loaded_at < self.ttl_seconds:
+            self._files.move_to_end(file_id)
+            self.hits += 1
+            return index
+        loading = self._loading.get(file_id)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load(file_id))
+            self._loading[file_id] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(file_id, None))
+        index = await asyncio.shield(loading)
+        self._files[file_id] = index
+        self._files.move_to_end(file_id)
+        self._evict(keep=file_id)
+        return index
+
+    def _evict(self, keep: str):
+        total = self.indexed
+        while total > self.max_detections and len(self._files) > 1:
+            file_id, index = next(iter(self._files.items()))
+            if file_id == keep:
+                self._files.move_to_end(file_id)
+                continue
+            del self._files[file_id]
+            total -= len(index)
+
+    def add(self, file_id: str, docs: List[Dict[str, Any]]):
+        """Detections just written; only files already loaded are updated"""
+        index = self._files.get(file_id)
+        if index is not None:
+            index.add(docs)
+
+    def remove(self, file_id: str, ids: List[str]):
+        index = self._files.get(file_id)
+        if index is not None:
+            index.remove(ids)
+
+    def drop(self, file_ids: Iterable[str]):
+        """Forget files whose detections were deleted in bulk; they are reloaded on the next query"""
+        for file_id in file_ids:
+            self._files.pop(file_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "files": len(self._files),
+            "detections": self.indexed,
+            "max_detections": self.max_detections,
+            "grid": self.grid,
+            "loads": self.loads,
+            "hits": self.hits,
+        }
+
+
+async def backfill_cells(collection, grid: int, batch_size: int = 1000) -> int:
+    """Add the ``cells`` field to detections stored before it existed"""
+    updated = 0
+    try:
+        while True:
+            docs = await collection.find({"cells": {"$exists": False}}, {"_id": 0, "id": 1, "bounding_box": 1}).limit(batch_size).to_list(batch_size)
+            if not docs:
+                break
+            await collection.bulk_write([
+                UpdateOne({"id": doc["id"]}, {"$set": {"cells": grid_cells(box_bounds(doc.get("bounding_box")), grid)}})
+                for doc in docs
+            ], ordered=False)
+            updated += len(docs)
+    except Exception as e:
+        # Retried on the next start; only cross-file region queries miss the remaining detections
+        logger.error(f"Spatial cells backfill stopped after {updated} detections: {str(e)}")
+    if updated:
+        logger.info(f"Added spatial cells to {updated} detections")
+    return updated
@@ -0,0 +1,184 @@
+import logging
+import math
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+STATS_ID = "global"
+CONFIDENCE_BUCKETS = 10
+
+
+def counter_key(value: Any) -> str:
+    """Mongo field names cannot contain '.' or start with '$'"""
+    key = str(value if value is not None else "unknown").replace(".", "_")
+    return key.lstrip("$") or "unknown"
+
+
+def confidence_bucket(confidence: Any) -> int:
+    try:
+        value = float(confidence)
+    except (TypeError, ValueError):
+        return 0
+    if math.isnan(value):
+        return 0
+    return min(CONFIDENCE_BUCKETS - 1, max(0, int(value * CONFIDENCE_BUCKETS)))
+
+
+# Aggregation stage counting detections per target type and confidence bucket, server side
+DETECTION_GROUP = {"$group": {
+    "_id": {
+        "target_type": "$target_type",
+        "bucket": {"$min": [
+            CONFIDENCE_BUCKETS - 1,
+            {"$max": [0, {"$floor": {"$multiply": [{"$ifNull": ["$confidence", 0]}, CONFIDENCE_BUCKETS]}}]}
+        ]},
+    },
+    "count": {"$sum": 1},
+    "confidence_sum": {"$sum": "$confidence"},
+}}
+
+
+async def fold_detection_groups(groups) -> Dict[str, Any]:
+    """Totals, per-type counts and histogram from the rows of a ``DETECTION_GROUP`` aggregation"""
+    target_types = Counter()
+    histogram = Counter()
+    total = 0
+    confidence_sum = 0.0
+    async for group in groups:
+        bucket = group["_id"].get("bucket")
+        target_types[counter_key(group["_id"].get("target_type"))] += group["count"]
+        histogram[str(int(bucket) if isinstance(bucket, (int, float)) and not math.isnan(bucket) else 0)] += group["count"]
+        total += group["count"]
+        confidence_sum += group.get("confidence_sum") or 0.0
+    return {
+        "total": total,
+        "confidence_sum": confidence_sum,
+        "by_target_type": dict(target_types),
+        "confidence_histogram": dict(histogram),
+    }
+
+
+class StatsCounters:
+    """Dashboard statistics kept as incrementally updated counters.
+
+    File and detection counts live in a single ``stats`` document updated with
+    ``$inc`` on every write, so reading them costs the same no matter how many
+    detections are stored. Job counts per status come from a ``$group`` over
+    the (small, status-indexed) jobs collection, cached for ``jobs_ttl``
+    seconds, since job status transitions are spread over several replicas.
+    """
+
+    def __init__(self, collection, jobs_ttl: float = 5.0):
+        self.collection = collection
+        self.jobs_ttl = jobs_ttl
+        self._jobs_cache: Optional[Dict[str, int]] = None
+        self._jobs_cached_at = 0.0
+
+    async def _inc(self, increments: Dict[str, float]):
+        increments = {key: value for key, value in increments.items() if value}
+        if not increments:
+            return
+        try:
+            await self.collection.update_one(
+                {"_id": STATS_ID},
+                {"$inc": increments, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+                upsert=True
+            )
+        except Exception as e:
+            # Counters are advisory; a failure must not fail the request
+            logger.warning(f"Stats counter update failed: {str(e)}")
+
+    async def file_added(self, file_type: str, count: int = 1):
+        await self._inc({"files.total": count, f"files.by_type.{counter_key(file_type)}": count})
+
+    async def file_removed(self, file_type: str, count: int = 1):
+        await self.file_added(file_type, -count)
+
+    async def detections_added(self, detections: Iterable[Dict[str, Any]], sign: int = 1):
+        by_type = Counter()
+        buckets = Counter()
+        total = 0
+        confidence_sum = 0.0
+        for detection in detections:
+            total += 1
+            by_type[counter_key(detection.get("target_type"))] += 1
+            buckets[confidence_bucket(detection.get("confidence"))] += 1
+            try:
+                confidence_sum += float(detection.get("confidence") or 0.0)
+            except (TypeError, ValueError):
+                pass
+        increments = {"detections.total": sign * total, "detections.confidence_sum": sign * confidence_sum}
+        increments.update({f"detections.by_target_type.{key}": sign * n for key, n in by_type.items()})
+        increments.update({f"detections.confidence_histogram.{key}": sign * n for key, n in buckets.items()})
+        await self._inc(increments)
+
+    async def detections_removed(self, detections_collection, query: Dict[str, Any]):
+        """Decrement counters for the detections matching ``query`` (call before deleting them).
+
+        Counting happens in the database; only one row per target type and
+        confidence bucket comes back, however many detections match.
+        """
+        removed = await fold_detection_groups(detections_collection.aggregate([{"$match": query}, DETECTION_GROUP]))
+        increments = {"detections.total": -removed["total"], "detections.confidence_sum": -removed["confidence_sum"]}
+        increments.update({f"detections.by_target_type.{key}": -n for key, n in removed["by_target_type"].items()})
+        increments.update({f"detections.confidence_histogram.{key}": -n for key, n in removed["confidence_histogram"].items()})
+        await self._inc(increments)
+
+    async def job_counts(self, jobs_collection) -> Dict[str, int]:
+        now = time.monotonic()
+        if self._jobs_cache is None or now - self._jobs_cached_at > self.jobs_ttl:
+            groups = jobs_collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])
+            self._jobs_cache = {counter_key(group["_id"]): group["count"] async for group in groups}
+            self._jobs_cached_at = now
+        return self._jobs_cache
+
+    async def snapshot(self, jobs_collection) -> Dict[str, Any]:
+        doc = await self.collection.find_one({"_id": STATS_ID}) or {}
+        files = doc.get("files", {})
+        detections = doc.get("detections", {})
+        histogram = detections.get("confidence_histogram", {})
+        total_detections = detections.get("total", 0)
+        job_counts = await self.job_counts(jobs_collection)
+        return {
+            "files": {
+                "total": files.get("total", 0),
+                "by_type": {key: n for key, n in files.get("by_type", {}).items() if n},
+            },
+            "jobs": {
+                "total": sum(job_counts.values()),
+                "by_status": job_counts,
+            },
+            "detections": {
+                "total": total_detections,
+                "by_target_type": {key: n for key, n in detections.get("by_target_type", {}).items() if n},
+                "confidence_histogram": [histogram.get(str(i), 0) for i in range(CONFIDENCE_BUCKETS)],
+                "avg_confidence": detections.get("confidence_sum", 0.0) / total_detections if total_detections else 0.0,
+            },
+            "updated_at": doc.get("updated_at"),
+        }
+
+    async def rebuild(self, db):
+        """Recompute all counters with full scans (bootstrap or drift repair)"""
+        files_by_type = db.files.aggregate([{"$group": {"_id": "$file_type", "count": {"$sum": 1}}}])
+        by_type = {counter_key(group["_id"]): group["count"] async for group in files_by_type}
+
+        detections = await fold_detection_groups(db.detections.aggregate([DETECTION_GROUP]))
+
+        await self.collection.replace_one(
+            {"_id": STATS_ID},
+            {
+                "files": {"total": sum(by_type.values()), "by_type": by_type},
+                "detections": detections,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            },
+            upsert=True
+        )
+        self._jobs_cache = None
+
+    async def ensure_initialized(self, db):
+        if await self.collection.find_one({"_id": STATS_ID}, {"_id": 1}) is None:
+            logger.info("Building stats counters from existing data")
+            await self.rebuild(db)
@@ -0,0 +1,167 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def boxes_to_array(bounding_boxes: List[Dict[str, float]]) -> np.ndarray:
+    """(N, 4) float array of x, y, width, height from bounding_box dicts"""
+    if not bounding_boxes:
+        return np.zeros((0, 4), dtype=np.float64)
+    return np.array(
+        [[float(b.get("x", 0)), float(b.get("y", 0)), float(b.get("width", 0)), float(b.get("height", 0))]
+         for b in bounding_boxes],
+        dtype=np.float64,
+    )
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (M, 4) and (N, 4) x/y/width/height boxes"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+    inter_w = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    inter_h = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = inter_w * inter_h
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1), 0.0)
+
+
+def greedy_assignment(scores: np.ndarray, threshold: float) -> np.ndarray:
+    """Match rows to columns by descending score; returns (K, 2) row/column pairs.
+
+    Only pairs above ``threshold`` are considered, so the work is proportional to
+    the number of overlapping candidates rather than M x N.
+    """
+    rows, cols = np.nonzero(scores > threshold)
+    if len(rows) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    order = np.argsort(-scores[rows, cols], kind="stable")
+    rows, cols = rows[order], cols[order]
+    row_used = np.zeros(scores.shape[0], dtype=bool)
+    col_used = np.zeros(scores.shape[1], dtype=bool)
+    matches = []
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        if row_used[row] or col_used[col]:
+            continue
+        row_used[row] = col_used[col] = True
+        matches.append((row, col))
+    return np.array(matches, dtype=np.int64).reshape(-1, 2)
+
+
+class MultiObjectTracker:
+    """IoU tracker with a constant-velocity motion model.
+
+    Track state is kept in parallel NumPy arrays so prediction and association
+    are vectorized over all active tracks. Boxes of different classes are never
+    associated when ``class_aware`` is set.
+    """
+
+    def __init__(self, iou_threshold: float = 0.3, max_age: int = 5, velocity_smoothing: float = 0.5,
+                 class_aware: bool = True):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.velocity_smoothing = velocity_smoothing
+        self.class_aware = class_aware
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.boxes = np.zeros((0, 4))
+        self.velocity = np.zeros((0, 2))
+        self.classes = np.zeros(0, dtype=np.int64)
+        self.age = np.zeros(0, dtype=np.int64)  # frames since the last match
+        self._next_id = 1
+        self._class_codes: Dict[str, int] = {}
+
+    def _encode_classes(self, classes: List[str]) -> np.ndarray:
+        return np.array(
+            [self._class_codes.setdefault(c, len(self._class_codes)) for c in classes],
+            dtype=np.int64,
+        )
+
+    def predict(self) -> np.ndarray:
+        """Boxes of the active tracks advanced by their velocity for each missed frame"""
+        predicted = self.boxes.copy()
+        predicted[:, :2] += self.velocity * (self.age + 1)[:, None]
+        return predicted
+
+    def update(self, boxes: np.ndarray, classes: List[str]) -> np.ndarray:
+        """Associate one frame of (N, 4) boxes; returns the track id of each box"""
+        codes = self._encode_classes(classes)
+        track_ids = np.zeros(len(boxes), dtype=np.int64)
+
+        scores = iou_matrix(self.predict(), boxes)
+        if self.class_aware and scores.size:
+            scores = np.where(self.classes[:, None] == codes[None, :], scores, 0.0)
+        matches = greedy_assignment(scores, self.iou_threshold)
+
+        matched_tracks = np.zeros(len(self.ids), dtype=bool)
+        matched_boxes = np.zeros(len(boxes), dtype=bool)
+        if len(matches):
+            t, d = matches[:, 0], matches[:, 1]
+            steps = (self.age[t] + 1)[:, None]
+            observed = (boxes[d, :2] - self.boxes[t, :2]) / steps
+            self.velocity[t] = self.velocity_smoothing * self.velocity[t] + (1 - self.velocity_smoothing) * observed
+            self.boxes[t] = boxes[d]
+            self.age[t] = 0
+            track_ids[d] = self.ids[t]
+            matched_tracks[t] = True
+            matched_boxes[d] = True
+
+        # Age unmatched tracks and drop the ones that have been lost too long
+        self.age[~matched_tracks] += 1
+        keep = self.age <= self.max_age
+        self.ids, self.boxes, self.velocity = self.ids[keep], self.boxes[keep], self.velocity[keep]
+        self.classes, self.age = self.classes[keep], self.age[keep]
+
+        # Start new tracks for unmatched boxes
+        new = np.nonzero(~matched_boxes)[0]
+        if len(new):
+            new_ids = np.arange(self._next_id, self._next_id + len(new))
+            self._next_id += len(new)
+            track_ids[new] = new_ids
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.boxes = np.concatenate([self.boxes, boxes[new]])
+            self.velocity = np.concatenate([self.velocity, np.zeros((len(new), 2))])
+            self.classes = np.concatenate([self.classes, codes[new]])
+            self.age = np.concatenate([self.age, np.zeros(len(new), dtype=np.int64)])
+        return track_ids
+
+
+def as_utc(value: datetime) -> datetime:
+    """Aware UTC datetime; naive values are taken to be UTC already"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def capture_time(file_doc: Dict[str, Any]) -> Optional[datetime]:
+    """Capture time of a file (always UTC) from its metadata, falling back to the upload time"""
+    metadata = file_doc.get("metadata") or {}
+    for key in ("captured_at", "capture_time", "timestamp", "datetime", "lastModified"):
+        value = metadata.get(key)
+        if value is None:
+            continue
+        try:
+            if isinstance(value, (int, float)):
+                # Epoch seconds, or milliseconds as sent by the browser (File.lastModified)
+                return datetime.fromtimestamp(value / 1000 if value > 1e11 else value, tz=timezone.utc)
+            return as_utc(datetime.fromisoformat(str(value).replace("Z", "+00:00")))
+        except (ValueError, OverflowError, OSError):
+            continue
+    uploaded_at = file_doc.get("uploaded_at")
+    if isinstance(uploaded_at, datetime):
+        return as_utc(uploaded_at)
+    if isinstance(uploaded_at, str):
+        try:
+            return as_utc(datetime.fromisoformat(uploaded_at.replace("Z", "+00:00")))
+        except ValueError:
+            return None
+    return None
+
+
+def order_frames(file_docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sort files by capture time, keeping the requested order for ties and unknown times"""
+    epoch = datetime.min.replace(tzinfo=timezone.utc)
+    indexed = list(enumerate(file_docs))
+    indexed.sort(key=lambda item: (capture_time(item[1]) or epoch, item[0]))
+    return [doc for _, doc in indexed]
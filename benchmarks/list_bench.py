@@ -0,0 +1,209 @@
+"""Throughput and peak memory of list endpoints, model path against the FAST_LIST_RESPONSES path.
+
+Documents are seeded straight into the database (mongomock-motor unless
+--mongo-url is given), then each endpoint is requested in-process with
+both paths. Peak memory is the largest Python allocation peak (tracemalloc)
+seen while serving one page.
+
+mongomock-motor filters and sorts in pure Python, which dominates
+end-to-end latency in memory; the "encode" figures time only turning one
+fetched page into the response body (model validation plus FastAPI's
+response_model serialization, against the fast path), so they stay
+comparable without a real server.
+
+Usage: python benchmarks/list_bench.py [--documents 20000] [--limit 1000] [--requests 50]
+           [--endpoint /api/detections] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_bench import git_revision, load_app  # noqa: E402
+
+ENDPOINTS = ["/api/detections", "/api/files", "/api/jobs"]
+# Model, sort field and stored projection of each endpoint
+LISTS = {
+    "/api/detections": ("detections", "TargetDetection", "timestamp", "DETECTION_PROJECTION"),
+    "/api/files": ("files", "MultispectralFile", "uploaded_at", "FILE_PROJECTION"),
+    "/api/jobs": ("analysis_jobs", "AnalysisJob", "created_at", "JOB_PROJECTION"),
+}
+CLASSES = ["vehicle", "person", "building", "vessel", "aircraft"]
+
+
+def make_documents(count: int):
+    """Files, one job and detections shaped like the ones the app writes"""
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    job_id = str(uuid.uuid4())
+    files = [{
+        "id": str(uuid.uuid4()),
+        "filename": f"frame-{i}.png",
+        "file_type": "RGB",
+        "file_path": f"/app/uploads/frame-{i}.png",
+        "uploaded_at": (start + timedelta(seconds=i)).isoformat(),
+        "metadata": {"width": 1024, "height": 768, "format": "PNG"},
+        "size": 1_500_000,
+        "content_hash": uuid.uuid4().hex * 2,
+    } for i in range(max(1, count // 10))]
+    jobs = [{
+        "id": str(uuid.uuid4()),
+        "file_ids": [doc["id"] for doc in files[i:i + 10]],
+        "analysis_type": "single",
+        "status": "completed",
+        "detection_count": 100,
+        "created_at": (start + timedelta(seconds=i)).isoformat(),
+        "completed_at": (start + timedelta(seconds=i + 5)).isoformat(),
+        "files_total": 10,
+        "files_done": 10,
+    } for i in range(0, len(files), 10)]
+    detections = [{
+        "id": str(uuid.uuid4()),
+        "file_id": files[i % len(files)]["id"],
+        "job_id": job_id,
+        "target_type": CLASSES[i % len(CLASSES)],
+        "confidence": round(0.5 + (i % 50) / 100, 2),
+        "bounding_box": {"x": 0.1, "y": 0.2, "width": 0.05, "height": 0.08},
+        "timestamp": (start + timedelta(milliseconds=i)).isoformat(),
+        "cells": [i % 64, (i + 1) % 64],
+    } for i in range(count)]
+    return {"files": files, "analysis_jobs": jobs, "detections": detections}
+
+
+async def measure(client, server, endpoint, limit, requests, fast):
+    server.FAST_LIST_RESPONSES = fast
+    url = f"{endpoint}?limit={limit}"
+    await client.get(url)  # warm-up
+    latencies = []
+    peak = 0
+    for _ in range(requests):
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = await client.get(url)
+        latencies.append(time.perf_counter() - started)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        response.raise_for_status()
+    size = len(response.content)
+    items = len(response.json())
+    # tracemalloc slows allocation-heavy code; throughput is timed separately
+    started = time.perf_counter()
+    for _ in range(requests):
+        await client.get(url)
+    elapsed = time.perf_counter() - started
+    return {
+        "requests_per_second": round(requests / elapsed, 2),
+        "items_per_second": round(requests * items / elapsed),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "peak_alloc_mb": round(peak / 1e6, 2),
+        "response_bytes": size,
+    }
+
+
+async def measure_encoding(server, endpoint, limit, requests):
+    """CPU and memory of building the response body for one page, without the database"""
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi import Response
+
+    collection, model_name, sort_field, projection_name = LISTS[endpoint]
+    model = getattr(server, model_name)
+    docs = await server.db[collection].find({}, getattr(server, projection_name)).sort(sort_field, -1).limit(limit).to_list(limit)
+    route = next(route for route in server.app.routes if getattr(route, "path", None) == endpoint)
+
+    async def model_path():
+        content = server.page_response(Response(), [dict(doc) for doc in docs], model, sort_field, limit, None)
+        body = await serialize_response(field=route.response_field, response_content=content)
+        return JSONResponse(body).body
+
+    async def fast_path():
+        server.FAST_LIST_RESPONSES = True
+        return (await server.list_response(Response(), [dict(doc) for doc in docs], model, sort_field, limit, None)).body
+
+    result = {}
+    for name, build in (("model", model_path), ("fast", fast_path)):
+        await build()
+        tracemalloc.start()
+        await build()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        started = time.perf_counter()
+        for _ in range(requests):
+            await build()
+        elapsed = time.perf_counter() - started
+        result[name] = {"ms_per_page": round(elapsed / requests * 1000, 3), "peak_alloc_mb": round(peak / 1e6, 2)}
+    result["speedup"] = round(result["model"]["ms_per_page"] / result["fast"]["ms_per_page"], 2)
+    return result
+
+
+async def run(args):
+    import httpx
+
+    server = load_app(args)
+    for collection, docs in make_documents(args.documents).items():
+        await server.db[collection].insert_many(docs)
+    await server.start_job_queue()
+    transport = httpx.ASGITransport(app=server.app)
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for endpoint in args.endpoint or ENDPOINTS:
+                model = await measure(client, server, endpoint, args.limit, args.requests, fast=False)
+                fast = await measure(client, server, endpoint, args.limit, args.requests, fast=True)
+                results[endpoint] = {
+                    "model": model,
+                    "fast": fast,
+                    "speedup": round(fast["requests_per_second"] / model["requests_per_second"], 2),
+                    "encode": await measure_encoding(server, endpoint, args.limit, args.requests),
+                }
+    finally:
+        await server.shutdown_db_client()
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "upload_dir")},
+        "endpoints": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=20000, help="detections seeded; a tenth as many files")
+    parser.add_argument("--limit", type=int, default=1000, help="page size requested")
+    parser.add_argument("--requests", type=int, default=50, help="requests per endpoint and path")
+    parser.add_argument("--endpoint", action="append", choices=ENDPOINTS, help="repeatable; default all")
+    parser.add_argument("--mongo-url", help="benchmark against a real server instead of mongomock-motor")
+    parser.add_argument("--db-name", default="list_bench")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+    args.detector_engine = "remote"
+
+    with tempfile.TemporaryDirectory() as upload_dir:
+        args.upload_dir = upload_dir
+        result = asyncio.run(run(args))
+
+    for endpoint, paths in result["endpoints"].items():
+        print(endpoint)
+        for name in ("model", "fast"):
+            stats = paths[name]
+            print(f"  {name:<6} {stats['requests_per_second']:>8.1f} req/s  {stats['items_per_second']:>9} items/s  "
+                  f"p50 {stats['p50_ms']:>7.2f} ms  peak {stats['peak_alloc_mb']:>6.2f} MB  {stats['response_bytes']} bytes")
+        print(f"  speedup {paths['speedup']}x")
+        encode = paths["encode"]
+        for name in ("model", "fast"):
+            print(f"  encode {name:<6} {encode[name]['ms_per_page']:>8.3f} ms/page  peak {encode[name]['peak_alloc_mb']:>6.2f} MB")
+        print(f"  encode speedup {encode['speedup']}x")
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""Offline load test: upload -> analyze -> poll scenarios against the app running in-process.
+
+The model is replaced by a fake transport with configurable latency and error
+rate, and Mongo by an in-memory stand-in (mongomock-motor) unless --mongo-url
+points at a real server. Nothing leaves the machine, so it can run in CI.
+
+Usage: python benchmarks/load_bench.py [--jobs 50] [--concurrency 10] [--files-per-job 4]
+           [--analysis-type single] [--llm-latency 0.2] [--llm-error-rate 0.05]
+           [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Metrics compared by --compare, and whether higher is better
+COMPARED = {
+    "upload_latency.p50": False,
+    "upload_latency.p95": False,
+    "job_latency.p50": False,
+    "job_latency.p95": False,
+    "job_latency.p99": False,
+    "jobs_per_second": True,
+    "peak_rss_mb": False,
+}
+
+TARGET_TYPES = ["vehicle", "person", "building", "vessel", "aircraft"]
+
+
+class FakeTransport:
+    """Stands in for the model provider behind LlmClient, so rate limiting, retries and the breaker stay in play"""
+
+    def __init__(self, latency: float, jitter: float, error_rate: float, detections: int, chunk_size: int, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.detections = detections
+        self.chunk_size = chunk_size
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+
+    def _detections(self):
+        result = []
+        for _ in range(self.random.randint(0, self.detections)):
+            width, height = self.random.uniform(0.02, 0.2), self.random.uniform(0.02, 0.2)
+            result.append({
+                "type": self.random.choice(TARGET_TYPES),
+                "confidence": round(self.random.uniform(0.3, 0.99), 2),
+                "bbox": {
+                    "x": round(self.random.uniform(0, 1 - width), 4),
+                    "y": round(self.random.uniform(0, 1 - height), 4),
+                    "width": round(width, 4),
+                    "height": round(height, 4),
+                },
+            })
+        return result
+
+    def response(self, images: int) -> str:
+        if images == 1:
+            return json.dumps(self._detections())
+        return json.dumps([{"image": i, "detections": self._detections()} for i in range(images)])
+
+    async def send(self, system_message, prompt, images_base64):
+        return "".join([chunk async for chunk in self.stream(system_message, prompt, images_base64)])
+
+    async def stream(self, system_message, prompt, images_base64):
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.random.gauss(self.latency, self.jitter)))
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            raise RuntimeError("503 Service Unavailable (simulated)")
+        text = self.response(len(images_base64))
+        for start in range(0, len(text), self.chunk_size):
+            yield text[start:start + self.chunk_size]
+            await asyncio.sleep(0)
+
+    async def close(self):
+        pass
+
+
+def synthetic_image(size: int, rng: np.random.Generator) -> bytes:
+    """Textured background with a few bright targets, so the local prefilter does not skip it"""
+    pixels = rng.normal(90, 25, (size, size, 3)).clip(0, 255)
+    for _ in range(rng.integers(1, 6)):
+        x, y = rng.integers(0, size - size // 10, 2)
+        pixels[y:y + size // 12, x:x + size // 12] = rng.integers(150, 255, 3)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def synthetic_band_stack(size: int, bands: int, rng: np.random.Generator) -> bytes:
+    """uint16 (bands, height, width) reflectance-like cube as .npy"""
+    cube = rng.normal(2000, 400, (bands, size, size)).clip(0, 65535).astype(np.uint16)
+    buffer = io.BytesIO()
+    np.save(buffer, cube)
+    return buffer.getvalue()
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": len(values),
+        "mean": round(float(np.mean(values)), 4),
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "max": round(float(np.max(values)), 4),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_app(args):
+    """Import the server configured for the run; must happen before anything else imports it"""
+    os.environ["UPLOAD_DIR"] = args.upload_dir
+    os.environ["DB_NAME"] = args.db_name
+    os.environ.setdefault("ANALYSIS_QUEUE_POLL_SECONDS", "0.05")
+    os.environ.setdefault("DETECTOR_ENGINE", args.detector_engine)
+    os.environ.setdefault("LLM_BACKOFF_SECONDS", "0.05")
+    if args.mongo_url:
+        os.environ["MONGO_URL"] = args.mongo_url
+    else:
+        try:
+            import mongomock_motor
+        except ImportError:
+            sys.exit("Install mongomock-motor for the in-memory database, or pass --mongo-url")
+        import motor.motor_asyncio
+        os.environ["MONGO_URL"] = "mongodb://in-memory"
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    import server
+    return server
+
+
+def make_uploads(args, rng):
+    """Distinct files for every job, generated before the clock starts"""
+    uploads = []
+    for _ in range(args.jobs):
+        if args.bands > 3:
+            uploads.append([(f"stack-{i}.npy", synthetic_band_stack(args.image_size, args.bands, rng)) for i in range(args.files_per_job)])
+        else:
+            uploads.append([(f"frame-{i}.png", synthetic_image(args.image_size, rng)) for i in range(args.files_per_job)])
+    return uploads
+
+
+async def run_scenario(client, args, files, latencies, outcomes):
+    """One job: upload its files, start the analysis and poll it to completion"""
+    started = time.perf_counter()
+    file_ids = []
+    for name, content in files:
+        upload_start = time.perf_counter()
+        response = await client.post("/api/upload", files={"file": (name, content)}, data={"file_type": "multispectral"})
+        latencies["upload"].append(time.perf_counter() - upload_start)
+        if response.status_code != 200:
+            outcomes["upload_errors"] += 1
+            return
+        file_ids.append(response.json()["id"])
+
+    analyze_start = time.perf_counter()
+    response = await client.post("/api/analyze", json=file_ids, params={"analysis_type": args.analysis_type})
+    latencies["analyze_request"].append(time.perf_counter() - analyze_start)
+    if response.status_code != 200:
+        outcomes["analyze_errors"] += 1
+        return
+    job_id = response.json()["id"]
+
+    deadline = time.perf_counter() + args.job_timeout
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(args.poll_interval)
+        poll_start = time.perf_counter()
+        job = (await client.get(f"/api/jobs/{job_id}")).json()
+        latencies["poll"].append(time.perf_counter() - poll_start)
+        if job["status"] in ("completed", "failed"):
+            outcomes[job["status"]] += 1
+            outcomes["detections"] += job.get("detection_count", 0)
+            outcomes["failed_files"] += len(job.get("failed_files") or [])
+            latencies["job"].append(time.perf_counter() - started)
+            latencies["processing"].append(time.perf_counter() - analyze_start)
+            return
+    outcomes["timed_out"] += 1
+
+
+async def run(args):
+    import httpx
+
+    server = load_app(args)
+    fake = FakeTransport(args.llm_latency, args.llm_jitter, args.llm_error_rate, args.detections, args.chunk_size, args.seed)
+    server.llm_client.transport = fake
+    uploads = make_uploads(args, np.random.default_rng(args.seed))
+    latencies = {name: [] for name in ("upload", "analyze_request", "poll", "job", "processing")}
+    outcomes = dict.fromkeys(("completed", "failed", "timed_out", "upload_errors", "analyze_errors", "detections", "failed_files"), 0)
+
+    await server.start_job_queue()
+    transport = httpx.ASGITransport(app=server.app)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def bounded(files):
+                async with semaphore:
+                    await run_scenario(client, args, files, latencies, outcomes)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(bounded(files) for files in uploads))
+            elapsed = time.perf_counter() - started
+            metrics_text = (await client.get("/api/metrics")).text
+    finally:
+        await server.shutdown_db_client()
+
+    stages = {}
+    for line in metrics_text.splitlines():
+        if line.startswith("mtr_stage_duration_seconds_sum"):
+            labels, value = line[len("mtr_stage_duration_seconds_sum"):].rsplit(" ", 1)
+            stages[labels.strip("{}")] = round(float(value), 4)
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "upload_dir")},
+        "elapsed_seconds": round(elapsed, 3),
+        "jobs_per_second": round(outcomes["completed"] / elapsed, 3) if elapsed else 0.0,
+        "files_per_second": round(outcomes["completed"] * args.files_per_job / elapsed, 3) if elapsed else 0.0,
+        "outcomes": outcomes,
+        "upload_latency": percentiles(latencies["upload"]),
+        "analyze_request_latency": percentiles(latencies["analyze_request"]),
+        "poll_latency": percentiles(latencies["poll"]),
+        "job_latency": percentiles(latencies["job"]),
+        "processing_latency": percentiles(latencies["processing"]),
+        "llm": {**server.llm_client.stats(), "transport_calls": fake.calls, "injected_errors": fake.errors},
+        "stage_seconds": stages,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def lookup(result, path):
+    for key in path.split("."):
+        result = (result or {}).get(key)
+    return result
+
+
+def compare(result, baseline_path, tolerance):
+    """Print changes against a previous run; returns False when a metric regressed beyond tolerance"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    ok = True
+    print(f"\ncompared with {baseline_path} ({baseline.get('revision', '?')})")
+    for path, higher_is_better in COMPARED.items():
+        old, new = lookup(baseline, path), lookup(result, path)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        ok = ok and not regressed
+        print(f"  {path:<24} {old:>10.4f} -> {new:>10.4f}  {change:+7.1%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10, help="scenarios running at once")
+    parser.add_argument("--files-per-job", type=int, default=4)
+    parser.add_argument("--analysis-type", default="single", choices=["single", "batch", "tracking"])
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--bands", type=int, default=3, help="more than 3 uploads .npy band stacks instead of PNGs")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="mean fake model latency in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.05)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="fraction of model calls failing with a 503")
+    parser.add_argument("--detections", type=int, default=8, help="maximum detections per image")
+    parser.add_argument("--chunk-size", type=int, default=64, help="characters per streamed response chunk")
+    parser.add_argument("--detector-engine", default="remote", help="DETECTOR_ENGINE unless already set")
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--job-timeout", type=float, default=120)
+    parser.add_argument("--mongo-url", help="use this server instead of the in-memory stand-in")
+    parser.add_argument("--db-name", default="load_bench")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change reported as a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="load-bench-") as upload_dir:
+        args.upload_dir = upload_dir
+        result = asyncio.run(run(args))
+
+    print(json.dumps({key: result[key] for key in (
+        "jobs_per_second", "outcomes", "upload_latency", "job_latency", "processing_latency", "llm", "peak_rss_mb"
+    )}, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+        print(f"results written to {args.output}")
+    if args.compare and not compare(result, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
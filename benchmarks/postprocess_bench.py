@@ -0,0 +1,81 @@
+"""Micro-benchmark of detection post-processing (sanitize, gate, class-aware NMS, top-K).
+
+Usage: python benchmarks/postprocess_bench.py [--boxes 100000] [--images 1000] [--repeat 5]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from postprocess import DetectionPostprocessor, PostprocessSettings, pairwise_iou  # noqa: E402
+
+CLASSES = ["vehicle", "person", "building", "vessel", "aircraft"]
+
+
+def make_inputs(boxes: int, images: int, seed: int = 0):
+    """Clustered boxes, as produced by overlapping tiles and repeated analyses, with some out-of-range values"""
+    rng = np.random.default_rng(seed)
+    centers = rng.random((boxes // 4 + 1, 2)) * 0.9
+    cluster = rng.integers(0, len(centers), boxes)
+    xy = centers[cluster] + rng.normal(0, 0.01, (boxes, 2))
+    wh = rng.uniform(0.02, 0.1, (boxes, 2))
+    wh[rng.random(boxes) < 0.01] *= -1  # flipped boxes
+    result = np.concatenate([xy - 0.02, wh], axis=1)
+    scores = rng.random(boxes)
+    classes = [CLASSES[i] for i in (cluster % len(CLASSES))]
+    image_ids = cluster % images
+    return result, scores, classes, image_ids
+
+
+def naive_nms(boxes, scores, classes, image_ids, threshold):
+    """Reference pure-Python greedy NMS, per image and class"""
+    groups = {}
+    for i in range(len(scores)):
+        groups.setdefault((image_ids[i], classes[i]), []).append(i)
+    kept = []
+    for members in groups.values():
+        members.sort(key=lambda i: -scores[i])
+        alive = members
+        while alive:
+            best, alive = alive[0], alive[1:]
+            kept.append(best)
+            alive = [j for j in alive if pairwise_iou(boxes[best:best + 1], boxes[j:j + 1])[0, 0] <= threshold]
+    return kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boxes", type=int, default=100_000)
+    parser.add_argument("--images", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--naive-boxes", type=int, default=5000, help="input size for the pure-Python reference")
+    args = parser.parse_args()
+
+    boxes, scores, classes, image_ids = make_inputs(args.boxes, args.images)
+    postprocessor = DetectionPostprocessor(PostprocessSettings(min_confidence=0.1, top_k=100))
+    postprocessor.process_arrays(boxes[:1000], scores[:1000], classes[:1000], image_ids[:1000])  # warm-up
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        kept, _ = postprocessor.process_arrays(boxes, scores, classes, image_ids)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"vectorized: {args.boxes} boxes / {args.images} images -> {len(kept)} kept")
+    print(f"  best {best * 1000:.1f} ms, median {np.median(timings) * 1000:.1f} ms, {args.boxes / best:,.0f} boxes/s")
+
+    if args.naive_boxes:
+        n = min(args.naive_boxes, args.boxes)
+        sanitized = np.abs(boxes[:n])
+        start = time.perf_counter()
+        naive_nms(sanitized, scores[:n], classes[:n], image_ids[:n], 0.5)
+        elapsed = time.perf_counter() - start
+        print(f"pure-Python reference NMS: {n} boxes in {elapsed * 1000:.1f} ms, {n / elapsed:,.0f} boxes/s")
+
+
+if __name__ == "__main__":
+    main()
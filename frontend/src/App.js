@@ -79,12 +79,12 @@ const FileUpload = ({ onUploadSuccess }) => {
         Trascina i file qui o clicca per selezionare
       </p>
       <p className="text-sm text-gray-500 mb-4">
-        Supportati: RGB, Termici, Radar, Altri sensori
+        Supportati: RGB, Termici, Radar, Altri sensori, stack di bande (.npy)
       </p>
       <input
         type="file"
         multiple
-        accept="image/*,.tif,.tiff,.raw,.bin"
+        accept="image/*,.tif,.tiff,.raw,.bin,.npy"
         onChange={(e) => handleFiles(e.target.files)}
         className="hidden"
         id="file-upload"
@@ -155,18 +155,30 @@ const Dashboard = () => {
   const [detections, setDetections] = useState([]);
   const [loading, setLoading] = useState(true);
   const [selectedJob, setSelectedJob] = useState(null);
+  const [stats, setStats] = useState(null);
+
+  const loadStats = async () => {
+    try {
+      const response = await axios.get(`${API}/stats`);
+      setStats(response.data);
+    } catch (error) {
+      // Keep the last known statistics
+    }
+  };
 
   const loadData = async () => {
     try {
-      const [filesRes, jobsRes, detectionsRes] = await Promise.all([
+      const [filesRes, jobsRes, detectionsRes, statsRes] = await Promise.all([
         axios.get(`${API}/files`),
         axios.get(`${API}/jobs`),
-        axios.get(`${API}/detections`)
+        axios.get(`${API}/detections`),
+        axios.get(`${API}/stats`)
       ]);
       
       setFiles(filesRes.data);
       setJobs(jobsRes.data);
       setDetections(detectionsRes.data);
+      setStats(statsRes.data);
     } catch (error) {
       toast.error('Errore caricamento dati');
     } finally {
@@ -176,8 +188,58 @@ const Dashboard = () => {
 
   useEffect(() => {
     loadData();
-    const interval = setInterval(loadData, 5000); // Refresh every 5 seconds
-    return () => clearInterval(interval);
+
+    // Live updates pushed by the backend instead of polling
+    const events = new EventSource(`${API}/events`);
+    // Statistics are refreshed at most once a second while events arrive
+    let statsTimer = null;
+    const refreshStats = () => {
+      if (!statsTimer) {
+        statsTimer = setTimeout(() => {
+          statsTimer = null;
+          loadStats();
+        }, 1000);
+      }
+    };
+    const on = (type, handler) => events.addEventListener(type, (e) => {
+      handler(JSON.parse(e.data));
+      refreshStats();
+    });
+
+    on('file.created', (file) => setFiles((prev) => [file, ...prev.filter((f) => f.id !== file.id)]));
+    on('file.deleted', ({ id }) => {
+      setFiles((prev) => prev.filter((f) => f.id !== id));
+      setDetections((prev) => prev.filter((d) => d.file_id !== id));
+    });
+    on('files.deleted', ({ ids }) => {
+      const deleted = new Set(ids);
+      setFiles((prev) => prev.filter((f) => !deleted.has(f.id)));
+      setDetections((prev) => prev.filter((d) => !deleted.has(d.file_id)));
+    });
+    on('job.created', (job) => setJobs((prev) => [job, ...prev.filter((j) => j.id !== job.id)]));
+    on('job.updated', (update) => setJobs((prev) => prev.map((j) => (j.id === update.id ? { ...j, ...update } : j))));
+    on('detections.created', ({ detections: created }) =>
+      setDetections((prev) => [...created, ...prev].slice(0, 1000))
+    );
+    on('detections.deleted', ({ ids }) =>
+      setDetections((prev) => prev.filter((d) => !ids.includes(d.id)))
+    );
+    on('sequence.updated', ({ status }) => {
+      if (status === 'completed') loadData();
+    });
+    on('resync', () => loadData());
+
+    // Reload once after a reconnect, since events may have been missed
+    let connected = false;
+    events.onopen = () => {
+      if (connected) loadData();
+      connected = true;
+    };
+
+    return () => {
+      events.close();
+      clearTimeout(statsTimer);
+    };
   }, []);
 
   const startAnalysis = async (fileIds, analysisType = 'single') => {
@@ -195,6 +257,17 @@ const Dashboard = () => {
     }
   };
 
+  const viewResults = async (job) => {
+    try {
+      const response = await axios.get(`${API}/jobs/${job.id}/detections`, {
+        params: { limit: 1000 }
+      });
+      setSelectedJob({ ...job, results: response.data });
+    } catch (error) {
+      toast.error('Errore caricamento risultati');
+    }
+  };
+
   const deleteFile = async (fileId) => {
     try {
       await axios.delete(`${API}/files/${fileId}`);
@@ -216,11 +289,10 @@ const Dashboard = () => {
     );
   }
 
-  const completedJobs = jobs.filter(job => job.status === 'completed');
-  const totalDetections = detections.length;
-  const avgConfidence = detections.length > 0 
-    ? detections.reduce((sum, d) => sum + d.confidence, 0) / detections.length 
-    : 0;
+  const totalFiles = stats ? stats.files.total : files.length;
+  const completedJobs = stats ? stats.jobs.by_status.completed || 0 : 0;
+  const totalDetections = stats ? stats.detections.total : 0;
+  const avgConfidence = stats ? stats.detections.avg_confidence : 0;
 
   return (
     <div className="min-h-screen bg-gray-50">
@@ -248,7 +320,7 @@ const Dashboard = () => {
                 <Camera className="h-8 w-8 text-blue-500" />
                 <div className="ml-4">
                   <p className="text-sm font-medium text-gray-600">File Caricati</p>
-                  <p className="text-2xl font-bold text-gray-900">{files.length}</p>
+                  <p className="text-2xl font-bold text-gray-900">{totalFiles}</p>
                 </div>
               </div>
             </CardContent>
@@ -260,7 +332,7 @@ const Dashboard = () => {
                 <Activity className="h-8 w-8 text-green-500" />
                 <div className="ml-4">
                   <p className="text-sm font-medium text-gray-600">Analisi Completate</p>
-                  <p className="text-2xl font-bold text-gray-900">{completedJobs.length}</p>
+                  <p className="text-2xl font-bold text-gray-900">{completedJobs}</p>
                 </div>
               </div>
             </CardContent>
@@ -326,8 +398,17 @@ const Dashboard = () => {
                     <div key={file.id} className="flex items-center justify-between p-4 border rounded-lg">
                       <div className="flex items-center space-x-3">
                         <div className="w-2 h-2 bg-green-500 rounded-full"></div>
+                        <img
+                          src={`${API}/files/${file.id}/preview?size=256`}
+                          alt=""
+                          loading="lazy"
+                          className="w-12 h-12 object-cover rounded"
+                          onError={(e) => { e.currentTarget.style.display = "none"; }}
+                        />
                         <div>
-                          <h4 className="font-medium">{file.filename}</h4>
+                          <a href={`${API}/files/${file.id}/raw`} className="font-medium hover:underline">
+                            <h4 className="font-medium">{file.filename}</h4>
+                          </a>
                           <p className="text-sm text-gray-600">
                             Tipo: {file.file_type} • Caricato: {new Date(file.uploaded_at).toLocaleDateString()}
                           </p>
@@ -388,18 +469,26 @@ const Dashboard = () => {
                         </Badge>
                       </div>
                       {job.status === 'processing' && (
-                        <Progress value={50} className="mb-2" />
+                        <div className="mb-2">
+                          <Progress
+                            value={job.files_total ? (job.files_done / job.files_total) * 100 : 0}
+                            className="mb-1"
+                          />
+                          <p className="text-xs text-gray-500">
+                            {job.files_done || 0}/{job.files_total || job.file_ids.length} file
+                          </p>
+                        </div>
                       )}
-                      {job.status === 'completed' && job.results && (
+                      {job.status === 'completed' && (
                         <div className="mt-3">
                           <p className="text-sm text-green-600 font-medium">
-                            ✓ {job.results.length} target rilevati
+                            ✓ {job.detection_count} target rilevati
                           </p>
                           <Button
                             size="sm"
                             variant="outline"
                             className="mt-2"
-                            onClick={() => setSelectedJob(job)}
+                            onClick={() => viewResults(job)}
                           >
                             <Eye className="h-4 w-4 mr-1" />
                             Visualizza Risultati
@@ -0,0 +1,25 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Backend modules import each other as top-level modules (``from bands import ...``)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """The FastAPI app module against an in-memory mongomock database and a temporary upload directory"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import motor.motor_asyncio
+
+    os.environ.update({
+        "MONGO_URL": "mongodb://in-memory",
+        "DB_NAME": "tests",
+        "UPLOAD_DIR": str(tmp_path_factory.mktemp("uploads")),
+        "DETECTOR_ENGINE": "remote",
+    })
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    import server
+    return server
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from analysis_cache import AnalysisCache, make_cache_key
+
+RESULT = [{"type": "car", "confidence": 0.9, "bbox": {"x": 0.1, "y": 0.1, "width": 0.2, "height": 0.2}}]
+
+
+def collection():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient()["cache"]["analysis_cache"]
+
+
+class FailingCollection:
+    async def find_one(self, *args, **kwargs):
+        raise ConnectionError("db down")
+
+    async def update_one(self, *args, **kwargs):
+        raise ConnectionError("db down")
+
+
+def test_cache_key_covers_image_prompt_and_model():
+    key = make_cache_key(b"image", "prompt", "model")
+    assert key == make_cache_key(b"image", "prompt", "model")
+    assert len({key, make_cache_key(b"image2", "prompt", "model"), make_cache_key(b"image", "prompt2", "model"),
+                make_cache_key(b"image", "prompt", "model2"), make_cache_key(b"imag", "eprompt", "model")}) == 5
+
+
+def test_misses_then_hits_locally_and_from_the_shared_collection():
+    async def scenario():
+        shared = collection()
+        cache = AnalysisCache(shared)
+        missed = await cache.get("k")
+        await cache.set("k", RESULT, "provider/model")
+        local = await cache.get("k")
+        # Another replica has an empty local cache but shares the collection
+        replica = AnalysisCache(shared)
+        remote = await replica.get("k")
+        again = await replica.get("k")
+        return missed, local, remote, again, cache.stats(), replica.stats(), await shared.find_one({"key": "k"})
+
+    missed, local, remote, again, stats, replica_stats, doc = asyncio.run(scenario())
+    assert missed is None and local == remote == again == RESULT
+    assert stats["misses"] == 1 and stats["hits"] == 1 and stats["local_hits"] == 1 and stats["stores"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert replica_stats["hits"] == 2 and replica_stats["local_hits"] == 1 and replica_stats["local_entries"] == 1
+    assert doc["model"] == "provider/model"
+
+
+def test_local_entries_expire_after_the_ttl():
+    async def scenario():
+        cache = AnalysisCache(FailingCollection(), ttl_seconds=0.2)
+        cache._local["k"] = RESULT
+        fresh = await cache.get("k")
+        time.sleep(0.3)
+        return fresh, await cache.get("k"), cache.stats()
+
+    fresh, expired, stats = asyncio.run(scenario())
+    assert fresh == RESULT and expired is None
+    assert stats["local_entries"] == 0 and stats["misses"] == 1
+
+
+def test_expired_shared_entries_are_misses_before_mongo_removes_them():
+    async def scenario():
+        shared = collection()
+        now = datetime.now(timezone.utc)
+        await shared.insert_one({"key": "old", "result": RESULT, "created_at": now, "expires_at": now - timedelta(seconds=1)})
+        await shared.insert_one({"key": "new", "result": RESULT, "created_at": now, "expires_at": now + timedelta(seconds=60)})
+        cache = AnalysisCache(shared)
+        return await cache.get("old"), await cache.get("new")
+
+    assert asyncio.run(scenario()) == (None, RESULT)
+
+
+def test_local_cache_is_bounded():
+    async def scenario():
+        cache = AnalysisCache(FailingCollection(), max_entries=2)
+        for key in ("a", "b", "c"):
+            await cache.set(key, RESULT, "m")
+        return [await cache.get(key) for key in ("a", "b", "c")], cache.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [None, RESULT, RESULT]
+    assert stats["local_entries"] == 2 and stats["local_max_entries"] == 2
+
+
+def test_database_errors_degrade_to_the_local_cache():
+    async def scenario():
+        cache = AnalysisCache(FailingCollection())
+        await cache.set("k", RESULT, "m")
+        return await cache.get("k"), await cache.get("other")
+
+    assert asyncio.run(scenario()) == (RESULT, None)
@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+
+class ScriptedTransport:
+    """Model transport answering every request with the same detections"""
+
+    def __init__(self, detections):
+        self.body = json.dumps(detections)
+        self.requests = 0
+
+    async def stream(self, system_message, prompt, images_base64):
+        self.requests += 1
+        yield self.body
+
+    async def close(self):
+        pass
+
+
+def add_file(server, tmp_path, seed):
+    path = tmp_path / f"frame-{seed}.png"
+    Image.fromarray(np.random.default_rng(seed).integers(0, 255, (64, 64, 3), dtype=np.uint8)).save(path)
+    record = server.MultispectralFile(filename=path.name, file_type="RGB", file_path=str(path))
+    return record, server.prepare_for_mongo(record.dict())
+
+
+def test_postponed_job_rerun_drops_detections_streamed_by_the_first_run(server, tmp_path, monkeypatch):
+    detection = {"type": "car", "confidence": 0.9, "bbox": {"x": 0.1, "y": 0.1, "width": 0.2, "height": 0.2}}
+    monkeypatch.setattr(server.llm_client, "transport", ScriptedTransport([detection]))
+
+    async def scenario():
+        db = server.db
+        record, file_doc = add_file(server, tmp_path, 1)
+        await db.files.insert_one(file_doc)
+        job = server.AnalysisJob(file_ids=[record.id], analysis_type="single")
+        await db.analysis_jobs.insert_one(server.prepare_for_mongo(job.dict()))
+        before = (await server.stats_counters.snapshot(db.analysis_jobs))["detections"]["total"]
+
+        # First run: a detection is stored while the response streams, then the job is postponed
+        claimed = await server.job_queue.claim("worker-1")
+        assert claimed["id"] == job.id and claimed["attempts"] == 1
+        streamed = server.prepare_for_mongo(server.TargetDetection(
+            file_id=record.id, job_id=job.id, target_type="car", confidence=0.8,
+            bounding_box={"x": 0.5, "y": 0.5, "width": 0.1, "height": 0.1}
+        ).dict())
+        await db.detections.insert_one(dict(streamed))
+        await server.stats_counters.detections_added([streamed])
+        await server.job_queue.release(job.id, "worker-1", 0, "LLM circuit breaker is open")
+
+        # Second run: the attempt was given back, and no file was finished
+        claimed = await server.job_queue.claim("worker-2")
+        assert claimed["attempts"] == 1 and claimed["files_done"] == 0
+        fields = await server.process_analysis_job(job.id)
+
+        stored = await db.detections.find({"job_id": job.id}, {"_id": 0}).to_list(None)
+        after = (await server.stats_counters.snapshot(db.analysis_jobs))["detections"]["total"]
+        return fields, stored, after - before
+
+    fields, stored, counted = asyncio.run(scenario())
+    assert fields["detection_count"] == 1
+    assert [doc["confidence"] for doc in stored] == [0.9]
+    assert counted == 1
+
+
+@pytest.mark.parametrize("sizes, max_count, max_bytes, expected", [
+    ([], 4, 100, []),
+    ([10] * 5, 2, 100, [[0, 1], [2, 3], [4]]),
+    ([40, 40, 40, 10], 8, 100, [[0, 1], [2, 3]]),
+    ([50, 50, 1], 8, 100, [[0, 1], [2]]),  # exactly at the byte limit
+    ([10, 500, 10], 8, 100, [[0], [1], [2]]),  # an oversized image still goes alone
+    ([500], 1, 100, [[0]]),
+])
+def test_pack_batches_limits(server, sizes, max_count, max_bytes, expected):
+    assert server.pack_batches(sizes, max_count, max_bytes) == expected
+
+
+def test_pack_batches_keeps_every_image_once_in_order(server):
+    rng = np.random.default_rng(5)
+    for _ in range(200):
+        sizes = rng.integers(1, 300, int(rng.integers(0, 40))).tolist()
+        max_count, max_bytes = int(rng.integers(1, 9)), int(rng.integers(50, 600))
+        batches = server.pack_batches(sizes, max_count, max_bytes)
+        assert [index for batch in batches for index in batch] == list(range(len(sizes)))
+        for batch in batches:
+            assert 1 <= len(batch) <= max_count
+            assert len(batch) == 1 or sum(sizes[index] for index in batch) <= max_bytes
+        # Greedy: the next image would not have fit into the batch before it
+        for batch, following in zip(batches, batches[1:]):
+            assert len(batch) == max_count or sum(sizes[index] for index in batch) + sizes[following[0]] > max_bytes
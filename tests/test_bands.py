@@ -0,0 +1,49 @@
+import threading
+
+import numpy as np
+
+from bands import BandStack, BandStackHeader, render_composite
+
+
+def write_stack(tmp_path, dtype, shape=(3, 300, 200)):
+    rng = np.random.default_rng(0)
+    cube = (rng.random(shape) * 200).astype(dtype)
+    path = tmp_path / f"stack-{dtype}.raw"
+    cube.tofile(path)
+    return cube, str(path), BandStackHeader(bands=shape[0], height=shape[1], width=shape[2], dtype=dtype)
+
+
+def test_band_statistics_match_numpy_across_blocks(tmp_path):
+    for dtype in ("uint8", "uint16", "float32"):
+        cube, path, header = write_stack(tmp_path, dtype)
+        if dtype == "float32":
+            cube[0, 0, :5] = np.nan
+            cube.tofile(path)
+        stats = BandStack(path, header).band_statistics(0, block_bytes=10_000)
+        values = cube[0].astype(np.float64)
+        values = values[np.isfinite(values)]
+        assert np.isclose(stats["mean"], values.mean())
+        assert np.isclose(stats["std"], values.std())
+        assert stats["min"] == values.min() and stats["max"] == values.max()
+
+
+def test_concurrent_renders_of_one_composite(tmp_path):
+    _, path, header = write_stack(tmp_path, "uint16")
+    errors = []
+    for attempt in range(5):
+        out_path = tmp_path / f"composite-{attempt}.png"
+
+        def render():
+            try:
+                render_composite(path, header, [0, 1, 2], out_path)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=render) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert out_path.exists()
+    assert errors == []
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,81 @@
+import asyncio
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from detectors import REMOTE, REUSE, SKIP, DetectorEngine, Frame, LocalPrefilterEngine, RemoteEngine, engine_from_env
+
+
+def save(tmp_path, name, array):
+    path = tmp_path / f"{name}.png"
+    Image.fromarray(array).save(path)
+    return str(path)
+
+
+def textured(seed, size=128):
+    rng = np.random.default_rng(seed)
+    # Smooth gradients plus noise give stable, distinct perceptual hashes
+    gradient = np.linspace(0, 200, size, dtype=np.float32)
+    base = gradient[None, :] if seed % 2 else gradient[:, None]
+    noise = rng.integers(0, 40, (size, size))
+    gray = np.clip(base + noise, 0, 255).astype(np.uint8)
+    return np.stack([gray] * 3, axis=-1)
+
+
+def plan(engine, frames):
+    return asyncio.run(engine.plan(frames))
+
+
+def test_blank_frames_are_skipped(tmp_path):
+    blank = save(tmp_path, "blank", np.full((64, 64, 3), 90, dtype=np.uint8))
+    scene = save(tmp_path, "scene", textured(1))
+    engine = LocalPrefilterEngine()
+    decisions = plan(engine, [Frame(blank, "RGB"), Frame(scene, "RGB")])
+    assert [(d.action, d.reason) for d in decisions] == [(SKIP, "blank"), (REMOTE, "changed")]
+    assert engine.stats()["skipped_blank"] == 1
+
+
+def test_duplicate_frames_reuse_the_earlier_result(tmp_path):
+    first = save(tmp_path, "first", textured(1))
+    copy = save(tmp_path, "copy", textured(1))
+    other = save(tmp_path, "other", textured(2))
+    engine = LocalPrefilterEngine()
+    decisions = plan(engine, [Frame(first, "RGB"), Frame(copy, "RGB"), Frame(copy, "RGB"), Frame(other, "RGB")])
+    assert [d.action for d in decisions] == [REMOTE, REUSE, REUSE, REMOTE]
+    # Reused frames point at the frame actually sent, not at another reused frame
+    assert decisions[1].source == 0 and decisions[2].source == 0
+    assert engine.stats()["llm_calls_saved"] == 2
+
+
+def test_duplicates_are_matched_per_file_type(tmp_path):
+    scene = save(tmp_path, "scene", textured(1))
+    decisions = plan(LocalPrefilterEngine(), [Frame(scene, "RGB"), Frame(scene, "NIR")])
+    assert [d.action for d in decisions] == [REMOTE, REMOTE]
+
+
+def test_cold_thermal_frames_are_skipped(tmp_path):
+    background = np.random.default_rng(0).integers(0, 40, (128, 128, 3)).astype(np.uint8)
+    cold = save(tmp_path, "cold", background)
+    hot_array = background.copy()
+    hot_array[40:50, 40:50] = 255
+    hot = save(tmp_path, "hot", hot_array)
+    decisions = plan(LocalPrefilterEngine(), [Frame(cold, "Thermal"), Frame(hot, "Thermal")])
+    assert [(d.action, d.reason) for d in decisions] == [(SKIP, "no_hotspots"), (REMOTE, "changed")]
+    assert decisions[1].candidates
+
+
+def test_undecodable_frames_go_to_the_remote_model(tmp_path):
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not an image")
+    decisions = plan(LocalPrefilterEngine(), [Frame(str(broken), "RGB")])
+    assert (decisions[0].action, decisions[0].reason) == (REMOTE, "undecodable")
+
+
+def test_remote_engine_is_the_default(monkeypatch):
+    monkeypatch.delenv("DETECTOR_ENGINE", raising=False)
+    assert isinstance(engine_from_env(), RemoteEngine)
+    monkeypatch.setenv("DETECTOR_ENGINE", "local")
+    assert isinstance(engine_from_env(), LocalPrefilterEngine)
+    with pytest.raises(TypeError):
+        DetectorEngine()
@@ -0,0 +1,126 @@
+import asyncio
+from datetime import datetime, timezone
+
+from events import ChangeStreamBridge, EventBus
+
+
+def drain(queue):
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+def test_events_fan_out_to_every_subscriber():
+    async def scenario():
+        bus = EventBus()
+        first, second = bus.subscribe(), bus.subscribe()
+        bus.publish("file.created", {"id": "f1", "uploaded_at": datetime(2026, 1, 1, tzinfo=timezone.utc)})
+        bus.unsubscribe(second)
+        bus.publish("files.deleted", {"ids": ["f1"]})
+        return drain(first), drain(second), bus.subscriber_count
+
+    first, second, count = asyncio.run(scenario())
+    created = ("file.created", {"id": "f1", "uploaded_at": "2026-01-01T00:00:00+00:00"})
+    assert first == [created, ("files.deleted", {"ids": ["f1"]})]
+    assert second == [created]
+    assert count == 1
+
+
+def test_a_slow_subscriber_is_told_to_resync():
+    async def scenario():
+        bus = EventBus(queue_size=3)
+        slow, fast = bus.subscribe(), bus.subscribe()
+        for i in range(3):
+            bus.publish("job.updated", {"id": str(i)})
+        drain(fast)
+        bus.publish("job.updated", {"id": "3"})
+        bus.publish("job.updated", {"id": "4"})
+        return drain(slow), drain(fast)
+
+    slow, fast = asyncio.run(scenario())
+    assert slow == [("resync", {}), ("job.updated", {"id": "4"})]
+    assert fast == [("job.updated", {"id": "3"}), ("job.updated", {"id": "4"})]
+
+
+def test_publish_job_sends_only_dashboard_fields():
+    async def scenario():
+        bus = EventBus()
+        queue = bus.subscribe()
+        bus.publish_job("j1", {"status": "processing", "attempts": 1, "lease_owner": "w", "_id": object()})
+        return drain(queue)
+
+    assert asyncio.run(scenario()) == [("job.updated", {"status": "processing", "attempts": 1, "id": "j1"})]
+
+
+def test_local_publishing_is_off_with_change_streams():
+    async def scenario():
+        bus = EventBus(local_publish=False)
+        queue = bus.subscribe()
+        bus.publish("file.created", {"id": "local"})
+        ChangeStreamBridge(None, bus).handle({
+            "ns": {"coll": "files"}, "operationType": "insert", "fullDocument": {"_id": 1, "id": "streamed"},
+        })
+        return drain(queue)
+
+    assert asyncio.run(scenario()) == [("file.created", {"id": "streamed"})]
+
+
+def test_change_stream_bridge_maps_changes_to_events():
+    bus = EventBus()
+    events = []
+    bus.dispatch = lambda event_type, data: events.append((event_type, data))
+    bridge = ChangeStreamBridge(None, bus)
+    bridge.handle({"ns": {"coll": "analysis_jobs"}, "operationType": "insert",
+                   "fullDocument": {"_id": 1, "id": "j1", "results": [], "status": "pending"}})
+    bridge.handle({"ns": {"coll": "analysis_jobs"}, "operationType": "update",
+                   "fullDocument": {"id": "j1", "status": "completed", "lease_owner": None}})
+    bridge.handle({"ns": {"coll": "detections"}, "operationType": "insert",
+                   "fullDocument": {"id": "d1", "job_id": "j1", "file_id": "f1"}})
+    bridge.handle({"ns": {"coll": "files"}, "operationType": "delete"})
+    assert events[0] == ("job.created", {"id": "j1", "status": "pending"})
+    assert events[1][0] == "job.updated" and events[1][1]["status"] == "completed" and "lease_owner" not in events[1][1]
+    assert events[2] == ("detections.created", {"job_id": "j1", "file_id": "f1", "detections": [{"id": "d1", "job_id": "j1", "file_id": "f1"}]})
+    assert events[3] == ("resync", {})
+
+
+def test_stream_sends_events_and_heartbeats_until_the_client_disconnects():
+    async def scenario():
+        bus = EventBus()
+        disconnected = False
+
+        async def is_disconnected():
+            return disconnected
+
+        stream = bus.stream(is_disconnected, heartbeat_seconds=0.05)
+        frames = [await stream.__anext__()]
+        assert bus.subscriber_count == 1
+        bus.publish("job.created", {"id": "j1"})
+        frames.append(await stream.__anext__())
+        frames.append(await stream.__anext__())  # nothing published: keep-alive
+        disconnected = True
+        remaining = [frame async for frame in stream]
+        return frames, remaining, bus.subscriber_count
+
+    frames, remaining, count = asyncio.run(scenario())
+    assert frames[0] == "retry: 3000\n\n"
+    assert frames[1] == 'event: job.created\ndata: {"id":"j1"}\n\n'
+    assert frames[2] == ": keep-alive\n\n"
+    assert remaining == [] and count == 0
+
+
+def test_closing_a_stream_unsubscribes_it():
+    async def scenario():
+        bus = EventBus()
+
+        async def is_disconnected():
+            return False
+
+        stream = bus.stream(is_disconnected)
+        await stream.__anext__()
+        # The server closes the generator when the response is cancelled
+        await stream.aclose()
+        bus.publish("job.created", {"id": "j1"})
+        return bus.subscriber_count
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,133 @@
+import asyncio
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+import pytest
+
+from export import ARROW, DETECTION_SCHEMA, FORMATS, NDJSON, PARQUET, DetectionExporter
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def make_docs(count):
+    docs = []
+    for i in range(count):
+        docs.append({
+            "id": f"d{i:05d}",
+            "file_id": f"f{i % 7}",
+            "job_id": "job-1",
+            "track_id": str(i % 3) if i % 2 else None,
+            "target_type": ["car", "boat"][i % 2],
+            "confidence": i / count,
+            "bounding_box": {"x": 0.1, "y": 0.2, "width": i / (2 * count), "height": 0.05},
+            "timestamp": (START + timedelta(seconds=i)).isoformat(),
+        })
+    # Legacy rows: no timestamp, no bounding box
+    docs.append({"id": "legacy", "target_type": "car", "confidence": 0.5, "timestamp": None})
+    return docs
+
+
+def expected_rows(docs):
+    rows = []
+    for doc in docs:
+        box = doc.get("bounding_box") or {}
+        rows.append({
+            "id": doc["id"],
+            "file_id": doc.get("file_id"),
+            "job_id": doc.get("job_id"),
+            "track_id": doc.get("track_id"),
+            "target_type": doc["target_type"],
+            "confidence": doc["confidence"],
+            "bbox_x": box.get("x"),
+            "bbox_y": box.get("y"),
+            "bbox_width": box.get("width"),
+            "bbox_height": box.get("height"),
+            "timestamp": datetime.fromisoformat(doc["timestamp"]) if doc.get("timestamp") else None,
+        })
+    return rows
+
+
+def export(export_format, docs, batch_size):
+    exporter = DetectionExporter(export_format)
+    chunks = [exporter.write(docs[i:i + batch_size]) for i in range(0, len(docs), batch_size)]
+    chunks.append(exporter.close())
+    return chunks
+
+
+def read(export_format, data):
+    if export_format == PARQUET:
+        return pq.read_table(io.BytesIO(data))
+    if export_format == ARROW:
+        return pa.ipc.open_stream(data).read_all()
+    return [json.loads(line) for line in data.decode().splitlines()]
+
+
+@pytest.mark.parametrize("export_format", [PARQUET, ARROW])
+def test_columnar_round_trip(export_format):
+    docs = make_docs(250)
+    table = read(export_format, b"".join(export(export_format, docs, 64)))
+    assert table.schema.equals(DETECTION_SCHEMA)
+    assert table.num_rows == len(docs)
+    assert table.to_pylist() == expected_rows(docs)
+
+
+def test_parquet_has_one_row_group_per_batch():
+    docs = make_docs(250)
+    metadata = pq.ParquetFile(io.BytesIO(b"".join(export(PARQUET, docs, 64)))).metadata
+    assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [64, 64, 64, 59]
+
+
+def test_ndjson_round_trip():
+    docs = make_docs(100)
+    rows = read(NDJSON, b"".join(export(NDJSON, docs, 30)))
+    assert len(rows) == len(docs)
+    for row, doc in zip(rows, docs):
+        assert list(row) == DETECTION_SCHEMA.names
+        assert row["id"] == doc["id"] and row["timestamp"] == doc["timestamp"]
+        assert row["bbox_width"] == (doc.get("bounding_box") or {}).get("width")
+
+
+@pytest.mark.parametrize("export_format", list(FORMATS))
+def test_every_batch_is_sent_as_it_is_encoded(export_format):
+    docs = make_docs(1000)
+    chunks = export(export_format, docs, 100)
+    # Each batch produced its own bytes instead of everything arriving on close
+    assert all(chunks[:-1])
+    assert sum(map(len, chunks[:-1])) > len(chunks[-1])
+    assert len(read(export_format, b"".join(chunks))) == len(docs)
+
+
+def test_empty_exports_are_still_readable():
+    assert read(PARQUET, b"".join(export(PARQUET, [], 10))).num_rows == 0
+    assert read(ARROW, b"".join(export(ARROW, [], 10))).num_rows == 0
+    assert b"".join(export(NDJSON, [], 10)) == b""
+    with pytest.raises(ValueError):
+        DetectionExporter("csv")
+
+
+def test_export_endpoint_streams_every_matching_detection(server, monkeypatch):
+    httpx = pytest.importorskip("httpx")
+    monkeypatch.setattr(server, "EXPORT_BATCH_SIZE", 50)
+    docs = [dict(doc, job_id="export-job") for doc in make_docs(230)[:-1]]
+
+    async def scenario():
+        await server.db.detections.insert_many([dict(doc) for doc in docs])
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/detections/export", params={"format": "parquet", "job_id": "export-job"})
+            bad = await client.get("/api/detections/export", params={"format": "csv"})
+        await server.db.detections.delete_many({"job_id": "export-job"})
+        return response, bad
+
+    response, bad = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == FORMATS[PARQUET][0]
+    parquet = pq.ParquetFile(io.BytesIO(response.content))
+    assert parquet.metadata.num_rows == len(docs) and parquet.metadata.num_row_groups == 5
+    # Newest first
+    assert parquet.read().column("id").to_pylist() == [doc["id"] for doc in reversed(docs)]
+    assert bad.status_code == 400
@@ -0,0 +1,181 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from job_queue import JobQueue, RetryLater, utc_now_iso
+
+
+def make_queue(heartbeats, lease_seconds=0.3):
+    """Queue whose heartbeat replays ``heartbeats``: True/False results, or exceptions to raise"""
+    queue = JobQueue(collection=None, handler=None, lease_seconds=lease_seconds)
+    calls = []
+
+    async def heartbeat(job_id, worker_id):
+        outcome = heartbeats[min(len(calls), len(heartbeats) - 1)]
+        calls.append(outcome)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    queue.heartbeat = heartbeat
+    return queue, calls
+
+
+async def keep_alive_outcome(queue, run_for):
+    handler = asyncio.create_task(asyncio.sleep(run_for))
+    keep_alive = asyncio.create_task(queue._keep_alive("job", "worker", handler))
+    try:
+        await handler
+        return "finished"
+    except asyncio.CancelledError:
+        return "cancelled"
+    finally:
+        keep_alive.cancel()
+
+
+def test_heartbeat_errors_are_retried_while_the_lease_is_valid():
+    queue, calls = make_queue([ConnectionError("db down"), True])
+    assert asyncio.run(keep_alive_outcome(queue, run_for=0.6)) == "finished"
+    assert len(calls) >= 3
+
+
+def test_handler_cancelled_once_the_lease_expires_without_renewal():
+    queue, calls = make_queue([ConnectionError("db down")])
+    assert asyncio.run(keep_alive_outcome(queue, run_for=2)) == "cancelled"
+    assert len(calls) >= 3
+
+
+def test_handler_cancelled_when_another_worker_owns_the_job():
+    queue, calls = make_queue([True, False])
+    assert asyncio.run(keep_alive_outcome(queue, run_for=2)) == "cancelled"
+    assert calls == [True, False]
+
+
+def collection():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient()["queue"]["jobs"]
+
+
+async def add_job(jobs, job_id, created_at, **fields):
+    await jobs.insert_one({"id": job_id, "status": "pending", "attempts": 0, "created_at": created_at, **fields})
+
+
+async def job(jobs, job_id):
+    return await jobs.find_one({"id": job_id}, {"_id": 0})
+
+
+def test_claim_takes_the_oldest_runnable_job():
+    async def scenario():
+        jobs = collection()
+        queue = JobQueue(jobs, handler=None, lease_seconds=60)
+        await add_job(jobs, "later", "2026-01-02T00:00:00+00:00")
+        await add_job(jobs, "oldest", "2026-01-01T00:00:00+00:00")
+        await add_job(jobs, "postponed", "2025-01-01T00:00:00+00:00", available_at=utc_now_iso(60))
+        await add_job(jobs, "done", "2025-01-01T00:00:00+00:00", status="completed")
+        claimed = [(await queue.claim(f"w{i}") or {}).get("id") for i in range(3)]
+        return claimed, await job(jobs, "oldest")
+
+    claimed, oldest = asyncio.run(scenario())
+    assert claimed == ["oldest", "later", None]
+    assert oldest["status"] == "processing" and oldest["lease_owner"] == "w0" and oldest["attempts"] == 1
+    assert oldest["lease_expires_at"] > utc_now_iso(50)
+
+
+def test_expired_leases_are_taken_over_until_attempts_run_out():
+    async def scenario():
+        jobs = collection()
+        queue = JobQueue(jobs, handler=None, max_attempts=2)
+        expired = {"status": "processing", "lease_owner": "dead", "lease_expires_at": utc_now_iso(-1)}
+        await add_job(jobs, "crashed", "2026-01-01T00:00:00+00:00", **expired, attempts=1)
+        await add_job(jobs, "live", "2026-01-01T00:00:00+00:00", **dict(expired, lease_expires_at=utc_now_iso(60)))
+        await add_job(jobs, "exhausted", "2026-01-01T00:00:00+00:00", **expired, attempts=2)
+        taken = await queue.claim("w1")
+        again = await queue.claim("w2")
+        # A heartbeat of the crashed worker no longer matches
+        stale = await queue.heartbeat("crashed", "dead")
+        reaped = await queue.reap_exhausted()
+        return taken, again, stale, reaped, await job(jobs, "exhausted"), await job(jobs, "live")
+
+    taken, again, stale, reaped, exhausted, live = asyncio.run(scenario())
+    assert taken["id"] == "crashed" and taken["attempts"] == 2 and taken["lease_owner"] == "w1"
+    assert again is None and stale is False
+    assert reaped == 1
+    assert exhausted["status"] == "failed" and exhausted["lease_owner"] is None
+    assert exhausted["error"] == "Lease expired after final attempt"
+    assert live["status"] == "processing" and live["lease_owner"] == "dead"
+
+
+def test_fail_backs_off_then_gives_up():
+    async def scenario():
+        jobs = collection()
+        queue = JobQueue(jobs, handler=None, max_attempts=2, retry_backoff=10)
+        await add_job(jobs, "j", "2026-01-01T00:00:00+00:00")
+        first = await queue.claim("w")
+        before = datetime.fromisoformat(utc_now_iso())
+        await queue.fail("j", "w", first["attempts"], "boom")
+        retry = await job(jobs, "j")
+        # Not runnable again until the backoff has passed
+        blocked = await queue.claim("w")
+        await jobs.update_one({"id": "j"}, {"$set": {"available_at": utc_now_iso(-1)}})
+        second = await queue.claim("w")
+        await queue.fail("j", "w", second["attempts"], "boom again")
+        return before, retry, blocked, await job(jobs, "j")
+
+    before, retry, blocked, final = asyncio.run(scenario())
+    assert retry["status"] == "pending" and retry["error"] == "boom" and retry["lease_owner"] is None
+    delay = (datetime.fromisoformat(retry["available_at"]) - before).total_seconds()
+    assert 8 <= delay <= 12.5  # retry_backoff * 2**0, +-20% jitter
+    assert blocked is None
+    assert final["status"] == "failed" and final["error"] == "boom again" and final["attempts"] == 2
+    assert final["completed_at"]
+
+
+def test_release_gives_the_attempt_back():
+    async def scenario():
+        jobs = collection()
+        queue = JobQueue(jobs, handler=None, max_attempts=1)
+        await add_job(jobs, "j", "2026-01-01T00:00:00+00:00")
+        await queue.claim("w")
+        await queue.release("j", "w")
+        released = await job(jobs, "j")
+        # Only the owner can release; a max_attempts=1 job is still claimable after any number of releases
+        await queue.release("j", "someone-else", 30, "ignored")
+        claimed = await queue.claim("w2")
+        await queue.release("j", "w2", 30, "provider down")
+        postponed = await job(jobs, "j")
+        return released, claimed, postponed, await queue.claim("w3")
+
+    released, claimed, postponed, blocked = asyncio.run(scenario())
+    assert released["status"] == "pending" and released["attempts"] == 0 and released["lease_owner"] is None
+    assert claimed["id"] == "j" and claimed["attempts"] == 1
+    assert postponed["attempts"] == 0 and postponed["error"] == "provider down"
+    assert postponed["available_at"] > utc_now_iso(20)
+    assert blocked is None
+
+
+def test_run_job_records_the_handler_outcome():
+    outcomes = {"ok": {"detection_count": 3}, "later": RetryLater("circuit open", 5), "bad": ValueError("broken")}
+    changes = []
+
+    async def handler(job_id):
+        outcome = outcomes[job_id]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def scenario():
+        jobs = collection()
+        queue = JobQueue(jobs, handler, max_attempts=3, on_change=lambda job_id, fields: changes.append((job_id, fields["status"])))
+        for second, job_id in enumerate(outcomes):
+            await add_job(jobs, job_id, f"2026-01-01T00:00:0{second}+00:00")
+            await queue.run_job(await queue.claim("w"), "w")
+        return {job_id: await job(jobs, job_id) for job_id in outcomes}, queue.in_flight
+
+    docs, in_flight = asyncio.run(scenario())
+    assert docs["ok"]["status"] == "completed" and docs["ok"]["detection_count"] == 3
+    assert docs["later"]["status"] == "pending" and docs["later"]["attempts"] == 0
+    assert docs["bad"]["status"] == "pending" and docs["bad"]["attempts"] == 1 and docs["bad"]["error"] == "broken"
+    assert in_flight == 0
+    assert changes == [("ok", "processing"), ("ok", "completed"), ("later", "processing"), ("later", "pending"),
+                       ("bad", "processing"), ("bad", "pending")]
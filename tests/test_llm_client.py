@@ -0,0 +1,191 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from llm_client import CircuitBreaker, CircuitOpenError, HttpTransport, LlmClient, LlmError, LlmRejectedError, is_retryable
+
+
+def sse(*deltas):
+    """Completion stream body sending each delta as its own event"""
+    events = [f"data: {json.dumps({'choices': [{'delta': {'content': delta}}]})}\n\n" for delta in deltas]
+    return 200, "".join(events) + "data: [DONE]\n\n"
+
+
+class StubServer:
+    """Minimal HTTP/1.1 server answering each request with the next scripted (status, body)"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        headers = dict(line.split(": ", 1) for line in head.decode().split("\r\n")[1:] if ": " in line)
+        length = int(next((value for name, value in headers.items() if name.lower() == "content-length"), 0))
+        self.requests.append(json.loads(await reader.readexactly(length)))
+        status, body = self.responses.pop(0)
+        content_type = "text/event-stream" if status == 200 else "application/json"
+        writer.write(
+            f"HTTP/1.1 {status} Stub\r\nContent-Type: {content_type}\r\nContent-Length: {len(body.encode())}\r\n"
+            f"Connection: close\r\n\r\n{body}".encode()
+        )
+        await writer.drain()
+        writer.close()
+
+
+def make_client(url, **kwargs):
+    kwargs.setdefault("backoff_base", 0.0)
+    return LlmClient(HttpTransport(url, "stub-model", "key"), "system", **kwargs)
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+def test_streamed_response_is_yielded_chunk_by_chunk():
+    async def scenario():
+        async with StubServer([sse("[{", '"target_type": "car"', "}]")]) as stub:
+            client = make_client(stub.url)
+            chunks = [chunk async for chunk in client.stream("find cars", ["aW1n"])]
+            await client.close()
+            return chunks, stub.requests
+
+    chunks, requests = run(scenario)
+    assert chunks == ["[{", '"target_type": "car"', "}]"]
+    assert requests[0]["stream"] is True
+    assert requests[0]["messages"][1]["content"][1]["image_url"]["url"].endswith("aW1n")
+
+
+def test_rate_limits_and_server_errors_are_retried():
+    async def scenario():
+        async with StubServer([(429, "{}"), (503, "{}"), sse("ok")]) as stub:
+            client = make_client(stub.url, max_retries=2)
+            text = await client.complete("prompt", [])
+            await client.close()
+            return text, client.counters, len(stub.requests)
+
+    text, counters, requests = run(scenario)
+    assert text == "ok"
+    assert requests == 3
+    assert counters["retries"] == 2 and counters["failures"] == 0
+
+
+def test_retries_give_up_after_max_retries():
+    async def scenario():
+        async with StubServer([(500, "{}")] * 2) as stub:
+            client = make_client(stub.url, max_retries=1)
+            with pytest.raises(LlmError, match="after 2 attempts"):
+                await client.complete("prompt", [])
+            await client.close()
+            return client.counters
+
+    assert run(scenario)["failures"] == 1
+
+
+def test_circuit_breaker_opens_then_half_opens_for_one_probe():
+    async def scenario():
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.2)
+        async with StubServer([(502, "{}"), (502, "{}"), (502, "{}"), sse("ok")]) as stub:
+            client = make_client(stub.url, max_retries=0, breaker=breaker)
+            for _ in range(2):
+                with pytest.raises(LlmError):
+                    await client.complete("prompt", [])
+            assert breaker.state == "open"
+            # Open: calls fail fast without reaching the provider
+            with pytest.raises(CircuitOpenError):
+                await client.complete("prompt", [])
+            assert len(stub.requests) == 2
+
+            await asyncio.sleep(0.25)
+            assert breaker.state == "half_open"
+            # A failed probe opens the breaker again
+            with pytest.raises(LlmError):
+                await client.complete("prompt", [])
+            assert breaker.state == "open"
+
+            await asyncio.sleep(0.25)
+            assert await client.complete("prompt", []) == "ok"
+            assert breaker.state == "closed"
+            await client.close()
+
+    run(scenario)
+
+
+def test_rejected_requests_leave_the_breaker_alone():
+    async def scenario():
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.2)
+        async with StubServer([(500, "{}"), (400, "{}"), (500, "{}"), (400, "{}"), sse("ok")]) as stub:
+            client = make_client(stub.url, max_retries=0, breaker=breaker)
+            with pytest.raises(LlmError):
+                await client.complete("prompt", [])
+            with pytest.raises(LlmRejectedError):
+                await client.complete("prompt", [])
+            assert breaker.failures == 1 and client.counters["rejected"] == 1
+            # The rejection did not reset the count, so the next failure opens the breaker
+            with pytest.raises(LlmError):
+                await client.complete("prompt", [])
+            assert breaker.state == "open"
+
+            # A rejected probe neither closes nor reopens the breaker, and frees the probe slot
+            await asyncio.sleep(0.25)
+            with pytest.raises(LlmRejectedError):
+                await client.complete("prompt", [])
+            assert breaker.state == "half_open"
+            assert await client.complete("prompt", []) == "ok"
+            assert breaker.state == "closed"
+            await client.close()
+
+    run(scenario)
+
+
+def status_error(status):
+    request = httpx.Request("POST", "http://stub/chat/completions")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+
+class ProviderError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize("error, expected", [
+    (status_error(429), True),
+    (status_error(503), True),
+    (status_error(409), False),  # a conflict does not go away on retry
+    (status_error(400), False),
+    (ProviderError("Overloaded", status_code=529), True),
+    (ProviderError("Invalid image", status_code=422), False),
+    (asyncio.TimeoutError(), True),
+    (httpx.ConnectError("refused"), True),
+    (ConnectionResetError(), True),
+    # Only the parsed status counts, never numbers or words in the message
+    (ProviderError("image 502.png is not a valid JPEG"), False),
+    (ValueError("connection timeout in the prompt text"), False),
+])
+def test_is_retryable_uses_status_and_type_only(error, expected):
+    assert is_retryable(error) is expected
+
+
+def test_conflict_is_rejected_without_retrying():
+    async def scenario():
+        async with StubServer([(409, "{}")]) as stub:
+            client = make_client(stub.url, max_retries=3)
+            with pytest.raises(LlmRejectedError):
+                await client.complete("prompt", [])
+            await client.close()
+            return client.counters, len(stub.requests)
+
+    counters, requests = run(scenario)
+    assert requests == 1 and counters["retries"] == 0 and counters["rejected"] == 1
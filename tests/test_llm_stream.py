@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from llm_stream import JsonArrayStream, validate_detection
+
+ITEMS = [
+    {"type": "car", "confidence": 0.9, "bbox": {"x": 0.1, "y": 0.2, "width": 0.3, "height": 0.4}},
+    {"type": "say \"hi\" [or] {not}", "confidence": 0.5, "bbox": {"x": 0, "y": 0, "width": 1, "height": 1},
+     "description": "back\\slash, comma ] and \\\" quote"},
+    [1, [2, 3], {"nested": "]"}],
+    "plain ] string",
+    42,
+]
+RESPONSE = "Here you go:\n```json\n" + json.dumps(ITEMS, indent=2) + "\n```\nTrailing [prose]."
+
+
+def feed_all(chunks):
+    stream = JsonArrayStream()
+    items = []
+    for chunk in chunks:
+        items.extend(stream.feed(chunk))
+    return stream, items
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(RESPONSE)])
+def test_items_are_the_same_for_any_chunk_boundaries(size):
+    stream, items = feed_all(RESPONSE[i:i + size] for i in range(0, len(RESPONSE), size))
+    assert items == ITEMS
+    assert stream.complete and stream.malformed == 0
+
+
+def test_items_are_returned_as_soon_as_they_are_complete():
+    stream = JsonArrayStream()
+    assert stream.feed('[{"a": 1}, {"b"') == [{"a": 1}]
+    assert stream.feed(': "x]"}') == []
+    assert stream.feed(", 3]") == [{"b": "x]"}, 3]
+
+
+def test_text_after_the_array_is_ignored():
+    stream, items = feed_all(["[1, 2]", ", 3]", "[4]"])
+    assert items == [1, 2] and stream.complete
+
+
+def test_truncated_response_keeps_complete_items():
+    text = json.dumps(ITEMS)
+    stream, items = feed_all([text[:text.index("[1, [2")]])
+    assert items == ITEMS[:2]
+    assert not stream.complete and stream.malformed == 0
+
+
+def test_truncated_inside_a_string_emits_nothing_more():
+    stream, items = feed_all(['[{"a": "unterminated ], \\"', ' still inside'])
+    assert items == [] and not stream.complete
+
+
+def test_malformed_items_are_skipped():
+    stream, items = feed_all(['[{"a": 1}, {bad json}, tru, {"b": 2}]'])
+    assert items == [{"a": 1}, {"b": 2}]
+    assert stream.malformed == 2
+
+
+def test_empty_array_and_missing_array():
+    stream, items = feed_all(["```json\n[", "]\n```"])
+    assert items == [] and stream.complete
+    stream, items = feed_all(["No targets found."])
+    assert items == [] and not stream.started
+
+
+def test_validate_detection_keeps_boxes_for_post_processing_to_clamp():
+    assert validate_detection(ITEMS[0])["bbox"]["width"] == 0.3
+    slightly_outside = {**ITEMS[0], "bbox": {"x": -0.01, "y": 0.95, "width": 0.2, "height": 0.1}}
+    assert validate_detection(slightly_outside)["bbox"] == slightly_outside["bbox"]
+
+
+@pytest.mark.parametrize("item", [
+    "car",
+    {**ITEMS[0], "bbox": {"x": float("nan"), "y": 0, "width": 0.1, "height": 0.1}},
+    {**ITEMS[0], "bbox": {"x": 0, "y": float("inf"), "width": 0.1, "height": 0.1}},
+    {**ITEMS[0], "bbox": {"x": 0, "y": 0, "width": 0.1}},
+    {**ITEMS[0], "confidence": 1.5},
+    {**ITEMS[0], "type": ""},
+])
+def test_validate_detection_rejects_malformed_items(item):
+    assert validate_detection(item) is None
+
+
+def test_boxes_outside_the_image_are_clamped_after_validation():
+    from postprocess import DetectionPostprocessor, PostprocessSettings
+
+    detection = validate_detection({**ITEMS[0], "bbox": {"x": -0.01, "y": 0.95, "width": 0.2, "height": 0.1}})
+    [kept] = DetectionPostprocessor(PostprocessSettings()).process([detection])
+    assert kept["bbox"]["x"] == 0.0 and kept["bbox"]["y"] == 0.95
+    assert kept["bbox"]["width"] == pytest.approx(0.19) and kept["bbox"]["height"] == pytest.approx(0.05)
@@ -0,0 +1,158 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import (
+    NEXT_CURSOR_HEADER, PageEncoder, combine, decode_cursor, encode_cursor, field_projection, keyset_filter,
+    keyset_sort, next_cursor, time_range,
+)
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2026-01-01T00:00:00+00:00", "abc")
+    assert decode_cursor(cursor) == ("2026-01-01T00:00:00+00:00", "abc")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    "é",
+    raw_cursor({"a": 1}),
+    raw_cursor(["2026-01-01T00:00:00+00:00"]),
+    raw_cursor(["2026-01-01T00:00:00+00:00", "id", "extra"]),
+    raw_cursor([{"$gt": ""}, "x"]),  # operators must never reach the filter
+    raw_cursor(["2026-01-01T00:00:00+00:00", {"$ne": None}]),
+    raw_cursor([1, "x"]),
+    raw_cursor([None, "x"]),
+    raw_cursor(["yesterday", "x"]),
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_keyset_pages_visit_every_document_once():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    # Many documents share a timestamp, so the id breaks ties
+    docs = [
+        {"id": f"{i:04d}", "timestamp": (START + timedelta(seconds=i // 4)).isoformat()}
+        for i in range(103)
+    ]
+
+    async def pages(limit):
+        collection = mongomock_motor.AsyncMongoMockClient()["pagination"]["detections"]
+        await collection.insert_many([dict(doc) for doc in docs])
+        seen, cursor = [], None
+        while True:
+            page = await collection.find(keyset_filter("timestamp", cursor), {"_id": 0}) \
+                .sort(keyset_sort("timestamp")).limit(limit).to_list(limit)
+            seen.extend(doc["id"] for doc in page)
+            cursor = next_cursor(page, "timestamp", limit)
+            if cursor is None:
+                return seen
+
+    expected = [doc["id"] for doc in sorted(docs, key=lambda doc: (doc["timestamp"], doc["id"]), reverse=True)]
+    for limit in (1, 7, 103, 500):
+        assert asyncio.run(pages(limit)) == expected
+
+
+def test_keyset_filter_without_cursor_matches_everything():
+    assert keyset_filter("timestamp", None) == {}
+
+
+def test_page_encoder_sets_the_next_cursor_on_full_pages():
+    encoder = PageEncoder("timestamp", limit=2)
+    for i in range(2):
+        encoder.add({"id": str(i), "timestamp": START.isoformat()})
+    response = encoder.response()
+    assert [doc["id"] for doc in json.loads(response.body)] == ["0", "1"]
+    assert decode_cursor(response.headers[NEXT_CURSOR_HEADER]) == (START.isoformat(), "1")
+
+    encoder = PageEncoder("timestamp", limit=3)
+    encoder.add({"id": "0", "timestamp": START.isoformat()})
+    assert NEXT_CURSOR_HEADER not in encoder.response().headers
+
+
+def test_time_range_and_combine():
+    naive = datetime(2026, 1, 1, 12)
+    assert time_range("timestamp", naive, None) == {"timestamp": {"$gte": "2026-01-01T12:00:00+00:00"}}
+    assert time_range("timestamp", None, None) == {}
+    assert combine({}, {"a": 1}) == {"a": 1}
+    assert combine({"a": 1}, {}, {"b": 2}) == {"$and": [{"a": 1}, {"b": 2}]}
+
+
+def test_field_projection_keeps_paging_fields():
+    assert field_projection("confidence", ["confidence", "id"], "timestamp") == \
+        {"_id": 0, "id": 1, "timestamp": 1, "confidence": 1}
+    assert field_projection(None, ["confidence"], "timestamp") is None
+    with pytest.raises(HTTPException):
+        field_projection("cells", ["confidence"], "timestamp")
+
+
+def stored_pages(server):
+    """Stored documents of each list endpoint, including legacy and hand-written forms"""
+    detection = server.prepare_for_mongo(server.TargetDetection(
+        file_id="f1", job_id="j1", target_type="car", confidence=0.875, description="naïve \"quoted\" ✓",
+        bounding_box={"x": 0.1, "y": 0.2, "width": 0.3, "height": 0.4}
+    ).dict())
+    legacy_detection = {
+        # Integer numbers, a timestamp without microseconds, internal fields and no track_id
+        "id": "legacy", "file_id": "f1", "target_type": "boat", "confidence": 1,
+        "bounding_box": {"x": 0, "y": 0, "width": 1, "height": 1}, "timestamp": "2026-01-01T00:00:00+00:00",
+        "cells": [1, 2], "_id": "internal",
+    }
+    naive_detection = dict(legacy_detection, id="naive", timestamp="2026-01-01T00:00:00.250000", track_id="3")
+    file = server.prepare_for_mongo(server.MultispectralFile(
+        filename="a.png", file_type="thermal", file_path="/x/a.png", metadata={"captured_at": "2026-01-01T00:00:00Z", "gain": 2},
+        size=10
+    ).dict())
+    legacy_file = {"id": "old", "filename": "b.png", "file_type": "RGB", "file_path": "/x/b.png",
+                   "uploaded_at": "2025-06-01T12:00:00.000001+00:00"}
+    job = server.prepare_for_mongo(server.AnalysisJob(file_ids=["f1"], analysis_type="batch").dict())
+    finished_job = dict(job, id="done", status="completed", completed_at="2026-01-02T00:00:00+00:00",
+                        detection_count=4, timings={"llm": {"seconds": 1, "count": 2}}, lease_owner=None)
+    return [
+        ("/api/detections", server.TargetDetection, "timestamp", [detection, legacy_detection, naive_detection]),
+        ("/api/files", server.MultispectralFile, "uploaded_at", [file, legacy_file]),
+        ("/api/jobs", server.AnalysisJob, "created_at", [job, finished_job]),
+    ]
+
+
+@pytest.mark.parametrize("limit", [2, 10])
+def test_fast_list_responses_match_the_model_path_byte_for_byte(server, monkeypatch, limit):
+    from fastapi import Response
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+
+    async def bodies(endpoint, model, sort_field, docs, projection):
+        route = next(route for route in server.app.routes if getattr(route, "path", None) == endpoint)
+        monkeypatch.setattr(server, "FAST_LIST_RESPONSES", False)
+        model_response = Response()
+        content = server.page_response(model_response, [dict(doc) for doc in docs], model, sort_field, limit, projection)
+        if isinstance(content, Response):
+            model_body, model_cursor = content.body, content.headers.get(NEXT_CURSOR_HEADER)
+        else:
+            model_body = JSONResponse(await serialize_response(field=route.response_field, response_content=content)).body
+            model_cursor = model_response.headers.get(NEXT_CURSOR_HEADER)
+        monkeypatch.setattr(server, "FAST_LIST_RESPONSES", True)
+        fast = await server.list_response(Response(), [dict(doc) for doc in docs], model, sort_field, limit, projection)
+        return model_body, fast.body, model_cursor, fast.headers.get(NEXT_CURSOR_HEADER)
+
+    for endpoint, model, sort_field, docs in stored_pages(server):
+        projected = field_projection("id", model.model_fields, sort_field)
+        for projection in (None, projected):
+            if projection is not None:
+                docs = [{name: doc[name] for name in projection if name in doc} for doc in docs]
+            model_body, fast_body, model_cursor, fast_cursor = asyncio.run(bodies(endpoint, model, sort_field, docs, projection))
+            assert fast_body == model_body, endpoint
+            assert fast_cursor == model_cursor
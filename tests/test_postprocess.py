@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from postprocess import (
+    DENSE_GROUP_MAX, DetectionPostprocessor, PostprocessSettings, batched_nms, pairwise_iou, parse_class_thresholds,
+    sanitize_boxes,
+)
+
+
+def reference_nms(boxes, scores, groups, threshold):
+    """Textbook greedy NMS, one group and one box at a time"""
+    keep = np.zeros(len(boxes), dtype=bool)
+    for group in np.unique(groups):
+        members = sorted(np.flatnonzero(groups == group), key=lambda i: -scores[i])
+        kept = []
+        for i in members:
+            if all(pairwise_iou(boxes[i:i + 1], boxes[j:j + 1])[0, 0] <= threshold for j in kept):
+                kept.append(i)
+        keep[kept] = True
+    return keep
+
+
+def random_boxes(rng, count, spread=1.0):
+    xy = rng.random((count, 2)) * 0.8 * spread
+    wh = 0.05 + rng.random((count, 2)) * 0.2
+    return np.concatenate([xy, wh], axis=1)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_batched_nms_matches_greedy_reference(seed):
+    rng = np.random.default_rng(seed)
+    # Singletons, small groups of every padded size and one group past DENSE_GROUP_MAX
+    sizes = [1, 2, 3, 5, 9, 16, 17, 40, 100, DENSE_GROUP_MAX + 20]
+    groups = np.repeat(np.arange(len(sizes)), sizes)
+    rng.shuffle(groups)
+    boxes = random_boxes(rng, len(groups), spread=0.3)
+    scores = rng.random(len(groups))
+    keep = batched_nms(boxes, scores, groups, 0.5)
+    np.testing.assert_array_equal(keep, reference_nms(boxes, scores, groups, 0.5))
+
+
+def test_batched_nms_edge_cases():
+    assert batched_nms(np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=np.int64), 0.5).tolist() == []
+    box = np.array([[0.1, 0.1, 0.2, 0.2]])
+    same = np.repeat(box, 3, axis=0)
+    # Identical boxes: only the best survives within a group, all survive across groups
+    assert batched_nms(same, np.array([0.2, 0.9, 0.5]), np.zeros(3, dtype=np.int64), 0.5).tolist() == [False, True, False]
+    assert batched_nms(same, np.array([0.2, 0.9, 0.5]), np.arange(3), 0.5).all()
+
+
+def test_sanitize_boxes_clamps_and_flips():
+    boxes = sanitize_boxes(np.array([[0.9, 0.5, 0.3, -0.2], [np.nan, 0.1, np.inf, 0.1]]))
+    np.testing.assert_allclose(boxes, [[0.9, 0.3, 0.1, 0.2], [0.0, 0.1, 0.0, 0.1]])
+
+
+def test_parse_class_thresholds_skips_invalid_entries():
+    assert parse_class_thresholds("Vehicle:0.4, person:0.6,bad:x,:0.2,") == {"vehicle": 0.4, "person": 0.6}
+
+
+def detection(kind, confidence, x, y, size=0.1):
+    return {"type": kind, "confidence": confidence, "bbox": {"x": x, "y": y, "width": size, "height": size}}
+
+
+def test_process_gates_suppresses_and_limits():
+    settings = PostprocessSettings(iou_threshold=0.5, min_confidence=0.3, class_thresholds={"person": 0.8}, top_k=2)
+    processor = DetectionPostprocessor(settings)
+    kept = processor.process([
+        detection("car", 0.5, 0.1, 0.1),
+        detection("car", 0.9, 0.11, 0.11),  # suppresses the first
+        detection("truck", 0.6, 0.11, 0.11),  # other class, kept
+        detection("person", 0.7, 0.5, 0.5),  # below its class threshold
+        detection("car", 0.2, 0.7, 0.7),  # below the default threshold
+        detection("car", 0.4, 0.7, 0.2),  # past top_k
+    ])
+    assert [(d["type"], d["confidence"]) for d in kept] == [("car", 0.9), ("truck", 0.6)]
+
+
+def test_streaming_filter_supersedes_worse_overlapping_detections():
+    stream = DetectionPostprocessor(PostprocessSettings(top_k=2)).stream()
+    stored, removed = stream.add([detection("car", 0.6, 0.1, 0.1), detection("car", 0.5, 0.5, 0.5)])
+    assert len(stored) == 2 and removed == []
+    # A better box over the first detection replaces it
+    stored, removed = stream.add([detection("car", 0.9, 0.11, 0.11)])
+    assert [d["confidence"] for d in stored] == [0.9] and removed == [0]
+    # A worse duplicate is dropped
+    assert stream.add([detection("car", 0.3, 0.5, 0.5)]) == ([], [])
+    # Top-K overflow evicts the lowest-scoring accepted detection
+    stored, removed = stream.add([detection("car", 0.8, 0.8, 0.1)])
+    assert [d["confidence"] for d in stored] == [0.8] and removed == [1]
+
+
+@pytest.mark.parametrize("chunk", [1, 3, 50])
+def test_streaming_filter_matches_batch_on_separable_detections(chunk):
+    rng = np.random.default_rng(chunk)
+    # A grid of non-overlapping boxes, so chunking cannot change which survive NMS
+    detections = [
+        detection(kind, float(score), 0.1 * (i % 10), 0.1 * (i // 10), size=0.05)
+        for i, (kind, score) in enumerate(zip(rng.choice(["car", "boat"], 60), rng.random(60)))
+    ]
+    processor = DetectionPostprocessor(PostprocessSettings(top_k=20))
+    stream = processor.stream()
+    live = {}  # serial -> stored detection, serials counting accepted detections
+    serial = 0
+    for start in range(0, len(detections), chunk):
+        stored, removed = stream.add(detections[start:start + chunk])
+        for gone in removed:
+            del live[gone]
+        for item in stored:
+            live[serial] = item
+            serial += 1
+    expected = processor.process(detections)
+    assert sorted(d["confidence"] for d in live.values()) == sorted(d["confidence"] for d in expected)
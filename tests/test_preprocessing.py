@@ -0,0 +1,96 @@
+import asyncio
+import base64
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from preprocessing import (
+    FULL_WINDOW, ImagePreprocessor, PreprocessSettings, map_to_full_image, prepare_image, tile_windows,
+)
+
+
+def png_bytes(width, height):
+    buffer = io.BytesIO()
+    Image.fromarray(np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("width, height, tile_size, overlap", [
+    (1000, 600, 512, 0.15),
+    (2048, 2048, 512, 0.0),
+    (513, 100, 512, 0.5),
+    (300, 200, 512, 0.15),
+    (5000, 37, 1024, 0.9),
+])
+def test_tiles_cover_the_image_with_the_requested_overlap(width, height, tile_size, overlap):
+    tiles = tile_windows(width, height, tile_size, overlap)
+    covered = np.zeros((height, width), dtype=bool)
+    for left, top, right, bottom in tiles:
+        assert 0 <= left < right <= width and 0 <= top < bottom <= height
+        assert right - left == min(tile_size, width) and bottom - top == min(tile_size, height)
+        covered[top:bottom, left:right] = True
+    assert covered.all()
+    # Neighbouring tiles overlap by at least the requested fraction
+    lefts = sorted({left for left, _, _, _ in tiles})
+    for previous, current in zip(lefts, lefts[1:]):
+        assert previous + tile_size - current >= int(tile_size * overlap)
+
+
+def test_prepare_image_tiles_large_images_only():
+    settings = PreprocessSettings(tile_size=256, tile_overlap=0.25, max_edge=128)
+    prepared = prepare_image(png_bytes(600, 300), settings)
+    assert (prepared.width, prepared.height) == (600, 300)
+    assert len(prepared.parts) == len(tile_windows(600, 300, 256, 0.25))
+    window, payload = prepared.parts[-1]
+    assert window[0] + window[2] == pytest.approx(1.0) and window[1] + window[3] == pytest.approx(1.0)
+    assert max(Image.open(io.BytesIO(base64.b64decode(payload))).size) == 128
+
+    prepared = prepare_image(png_bytes(200, 100), settings)
+    assert [window for window, _ in prepared.parts] == [FULL_WINDOW]
+
+
+def test_map_to_full_image():
+    detections = [
+        {"type": "car", "bbox": {"x": 0.5, "y": 0.25, "width": 0.5, "height": 0.5}},
+        {"type": "boat", "bbox": {"x": -0.1, "y": 1.0, "width": 0.2, "height": 0.1}},
+        {"type": "person", "bbox": {"x": "n/a"}},
+        {"type": "unknown", "bbox": None},
+    ]
+    mapped = map_to_full_image(detections, (0.5, 0.0, 0.25, 0.5))
+    assert mapped[0]["bbox"] == {"x": 0.625, "y": 0.125, "width": 0.125, "height": 0.25}
+    # Boxes past the tile edge map past it too, for post-processing to clamp
+    assert mapped[1]["bbox"] == pytest.approx({"x": 0.475, "y": 0.5, "width": 0.05, "height": 0.05})
+    assert mapped[2]["bbox"] == {"x": "n/a"} and mapped[3]["bbox"] is None
+    assert [d["type"] for d in mapped] == ["car", "boat", "person", "unknown"]
+    assert map_to_full_image(detections, FULL_WINDOW) is detections
+
+
+def test_preprocessor_replaces_a_broken_pool():
+    preprocessor = ImagePreprocessor(PreprocessSettings(), workers=1)
+
+    async def scenario():
+        first = await preprocessor.prepare(png_bytes(64, 32))
+        broken = preprocessor._pool
+        # A worker dying (e.g. killed for memory) breaks the whole pool
+        with pytest.raises(Exception):
+            await asyncio.wrap_future(broken.submit(os._exit, 1))
+        second = await preprocessor.prepare(png_bytes(64, 32))
+        return first, broken, second, preprocessor._pool
+
+    try:
+        first, broken, second, replacement = asyncio.run(scenario())
+    finally:
+        preprocessor.shutdown()
+    assert (first.width, first.height) == (second.width, second.height) == (64, 32)
+    assert replacement is not None and replacement is not broken
+
+
+def test_undecodable_data_is_skipped():
+    preprocessor = ImagePreprocessor(PreprocessSettings(), workers=1)
+    try:
+        assert asyncio.run(preprocessor.prepare(b"raw radar dump")) is None
+    finally:
+        preprocessor.shutdown()
@@ -0,0 +1,79 @@
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from previews import RangeNotSatisfiable, etag_matches, parse_range, render_preview
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-", (10, 999)),
+    ("bytes=990-5000", (990, 999)),  # end past the file is clamped
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),  # suffix longer than the file
+    ("bytes=999-999", (999, 999)),
+    ("bytes=0-0", (0, 0)),
+])
+def test_parse_range_single_ranges(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    None, "", "items=0-10", "bytes=0-10,20-30", "bytes=abc-", "bytes=-", "bytes=+5-10", "bytes=1_0-20", "bytes=5--1",
+])
+def test_parse_range_ignores_absent_multiple_or_invalid_ranges(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=1000-", 1000),
+    ("bytes=1000-2000", 1000),
+    ("bytes=20-10", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=0-", 0),
+    ("bytes=-1", 0),  # no suffix of an empty file exists
+    ("bytes=-100", 0),
+])
+def test_parse_range_unsatisfiable(header, size):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, size)
+
+
+@pytest.mark.parametrize("if_none_match, etag, expected", [
+    (None, '"abc"', False),
+    ("", '"abc"', False),
+    ("*", '"abc"', True),
+    ('"abc"', '"abc"', True),
+    ('W/"abc"', '"abc"', True),  # weak comparison
+    ('"abc"', 'W/"abc"', True),
+    ('"x", "abc"', '"abc"', True),
+    ('"x" ,W/"abc" ', '"abc"', True),
+    ('"abcd"', '"abc"', False),
+    ('abc', '"abc"', False),  # unquoted is a different tag
+])
+def test_etag_matches(if_none_match, etag, expected):
+    assert etag_matches(if_none_match, etag) is expected
+
+
+def test_concurrent_renders_of_one_preview(tmp_path):
+    source = tmp_path / "source.png"
+    Image.fromarray(np.random.default_rng(0).integers(0, 255, (300, 400, 3), dtype=np.uint8)).save(source)
+    out_path = tmp_path / "source-256.jpg"
+    errors = []
+
+    def render():
+        try:
+            render_preview(str(source), str(out_path), 256)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=render) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert Image.open(out_path).size == (256, 192)
+    assert list(tmp_path.glob("*.tmp")) == []
@@ -0,0 +1,129 @@
+import io
+import threading
+import zipfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from sequences import ARCHIVE, MULTIFRAME, KeyframeSelector, SequenceError, extract_keyframes, sequence_kind
+
+
+def scene(seed, size=(48, 64)):
+    return Image.fromarray(np.random.default_rng(seed).integers(0, 255, (*size, 3), dtype=np.uint8))
+
+
+def solid(level, size=(48, 64)):
+    return Image.new("RGB", size[::-1], (level, level, level))
+
+
+def reasons(selector, images):
+    return [selector.consider(image) for image in images]
+
+
+def test_first_frame_is_always_a_keyframe_and_static_frames_are_dropped():
+    frames = [scene(0)] * 5
+    assert reasons(KeyframeSelector(), frames) == ["first", None, None, None, None]
+
+
+def test_scene_changes_reach_either_threshold():
+    # Uniform frames have the same hash, so only the histogram tells them apart
+    assert reasons(KeyframeSelector(), [solid(20), solid(20), solid(230), solid(230)]) == ["first", None, "scene", None]
+    assert reasons(KeyframeSelector(histogram_distance=1.1), [solid(20), solid(230)]) == ["first", None]
+    # Noise frames share a histogram but not a hash
+    assert reasons(KeyframeSelector(histogram_distance=1.1), [scene(0), scene(1)]) == ["first", "scene"]
+    assert reasons(KeyframeSelector(hash_distance=65, histogram_distance=1.1), [scene(0), scene(1)]) == ["first", None]
+
+
+def test_max_gap_forces_a_keyframe_into_static_scenes():
+    selector = KeyframeSelector(max_gap=3)
+    assert reasons(selector, [scene(0)] * 8) == ["first", None, None, "interval", None, None, "interval", None]
+    assert reasons(KeyframeSelector(max_gap=0), [scene(0)] * 8) == ["first"] + [None] * 7
+
+
+def test_min_gap_skips_changes_right_after_a_keyframe():
+    frames = [scene(i) for i in range(7)]
+    assert reasons(KeyframeSelector(min_gap=3), frames) == ["first", None, None, "scene", None, None, "scene"]
+    # A change inside the gap is still caught by the first frame past it
+    frames = [solid(20), solid(230), solid(230), solid(230)]
+    assert reasons(KeyframeSelector(min_gap=2), frames) == ["first", None, "scene", None]
+
+
+def test_selector_handles_16_bit_and_palette_frames():
+    selector = KeyframeSelector()
+    assert selector.consider(Image.fromarray(np.full((32, 32), 1000, dtype=np.uint16))) == "first"
+    assert selector.consider(solid(200).convert("P")) == "scene"
+
+
+def write_gif(path, images, duration=100):
+    images[0].save(path, save_all=True, append_images=images[1:], duration=duration, loop=0)
+
+
+def write_zip(path, images, names):
+    with zipfile.ZipFile(path, "w") as archive:
+        for image, name in zip(images, names):
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            archive.writestr(name, buffer.getvalue())
+        archive.writestr("__MACOSX/frame_0.png", b"not an image")
+        archive.writestr("notes.txt", b"ignored")
+
+
+def test_extract_keyframes_from_an_animated_gif(tmp_path):
+    source = tmp_path / "clip.gif"
+    # GIF merges identical neighbours, so the static frames differ by one level
+    write_gif(source, [solid(20), solid(21), solid(230), solid(231), solid(20)])
+    out_dir = tmp_path / "frames"
+    out_dir.mkdir()
+    result = extract_keyframes(str(source), MULTIFRAME, out_dir, KeyframeSelector())
+    assert result["frames_total"] == 5 and not result["truncated"]
+    keyframes = result["keyframes"]
+    assert [(k.frame_index, k.reason) for k in keyframes] == [(0, "first"), (2, "scene"), (4, "scene")]
+    assert [k.time_offset for k in keyframes] == pytest.approx([0.0, 0.2, 0.4])
+    assert sorted(path.name for path in out_dir.iterdir()) == sorted(f"{k.id}.png" for k in keyframes)
+    assert Image.open(keyframes[1].file_path).getpixel((0, 0))[0] == 230
+
+
+def test_extract_keyframes_orders_archive_members_naturally(tmp_path):
+    source = tmp_path / "clip.zip"
+    # Named out of order; frame_10 is the last frame and the only change
+    write_zip(source, [solid(230), solid(21), solid(20)], ["frame_10.png", "frame_2.png", "frame_1.png"])
+    assert sequence_kind(source.name) == ARCHIVE
+    result = extract_keyframes(str(source), ARCHIVE, tmp_path, KeyframeSelector())
+    assert [(k.name, k.reason, k.time_offset) for k in result["keyframes"]] == \
+        [("frame_1.png", "first", None), ("frame_10.png", "scene", None)]
+
+
+def test_limits_truncate_the_sequence(tmp_path):
+    source = tmp_path / "clip.gif"
+    write_gif(source, [solid(level) for level in (20, 230, 20, 230, 20, 230)])
+    result = extract_keyframes(str(source), MULTIFRAME, tmp_path, KeyframeSelector(), max_keyframes=2)
+    assert [k.frame_index for k in result["keyframes"]] == [0, 1]
+    assert result["frames_total"] == 2 and result["truncated"]
+    result = extract_keyframes(str(source), MULTIFRAME, tmp_path, KeyframeSelector(), max_frames=3)
+    assert result["frames_total"] == 3 and len(result["keyframes"]) == 3 and result["truncated"]
+
+
+def test_stopped_or_empty_extractions_leave_no_frames(tmp_path):
+    source = tmp_path / "clip.gif"
+    write_gif(source, [solid(20), solid(230)])
+    out_dir = tmp_path / "frames"
+    out_dir.mkdir()
+    stop = threading.Event()
+
+    class StopAfterFirstFrame(KeyframeSelector):
+        def consider(self, image):
+            stop.set()
+            return super().consider(image)
+
+    # The first keyframe is written before the stop is noticed, and removed again
+    with pytest.raises(SequenceError, match="cancelled"):
+        extract_keyframes(str(source), MULTIFRAME, out_dir, StopAfterFirstFrame(), stop=stop)
+    assert list(out_dir.iterdir()) == []
+
+    empty = tmp_path / "empty.zip"
+    write_zip(empty, [], [])
+    with pytest.raises(SequenceError, match="No decodable frames"):
+        extract_keyframes(str(empty), ARCHIVE, out_dir, KeyframeSelector())
+    with pytest.raises(SequenceError):
+        extract_keyframes(str(tmp_path / "clip.gif"), "unknown", out_dir, KeyframeSelector())
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from spatial import CONTAINS, INTERSECTS, FileGridIndex, box_bounds, grid_cells
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+TYPES = ["car", "boat", "person"]
+
+
+def make_docs(rng, count):
+    docs = []
+    for i in range(count):
+        # Mostly small boxes, some spanning many cells, some touching the edges
+        size = rng.choice([0.01, 0.05, 0.4])
+        docs.append({
+            "id": f"{i:08d}",
+            "job_id": f"job-{i % 3}",
+            "target_type": TYPES[i % len(TYPES)],
+            "confidence": float(rng.random()),
+            "bounding_box": {
+                "x": float(rng.random() * 1.1 - 0.05),
+                "y": float(rng.random() * 1.1 - 0.05),
+                "width": float(size * rng.random()),
+                "height": float(size * rng.random()),
+            },
+            # Coarse timestamps so ties on time are common
+            "timestamp": (START + timedelta(seconds=int(rng.integers(0, 50)))).isoformat(),
+        })
+    return docs
+
+
+def brute_force(docs, region, mode=INTERSECTS, target_type=None, job_id=None, min_confidence=None,
+                since=None, until=None, after=None, limit=None):
+    x1, y1, x2, y2 = region
+    matches = []
+    for doc in docs:
+        bx1, by1, bx2, by2 = box_bounds(doc["bounding_box"])
+        if mode == CONTAINS:
+            inside = bx1 >= x1 and by1 >= y1 and bx2 <= x2 and by2 <= y2
+        else:
+            inside = bx1 <= x2 and by1 <= y2 and bx2 >= x1 and by2 >= y1
+        key = (doc["timestamp"], doc["id"])
+        if not inside or (target_type and doc["target_type"] != target_type) or (job_id and doc["job_id"] != job_id):
+            continue
+        if min_confidence is not None and doc["confidence"] < min_confidence:
+            continue
+        if (since and doc["timestamp"] < since) or (until and doc["timestamp"] >= until) or (after and key >= after):
+            continue
+        matches.append(key)
+    ids = [detection_id for _, detection_id in sorted(matches, reverse=True)]
+    return ids[:limit] if limit is not None else ids
+
+
+def random_region(rng):
+    x, y = rng.random(2) * 0.9
+    width, height = rng.random(2) * 0.5
+    return float(x), float(y), float(min(1.0, x + width)), float(min(1.0, y + height))
+
+
+@pytest.mark.parametrize("grid", [1, 4, 16])
+def test_queries_match_brute_force(grid):
+    rng = np.random.default_rng(grid)
+    docs = make_docs(rng, 600)
+    index = FileGridIndex(grid)
+    index.add(docs[:300])
+    index.add(docs[300:])
+    index.add(docs[:10])  # already indexed, ignored
+    assert len(index) == len(docs)
+    for _ in range(50):
+        region = random_region(rng)
+        mode = rng.choice([INTERSECTS, CONTAINS])
+        filters = {
+            "target_type": rng.choice([None, "car", "unknown-type"]),
+            "job_id": rng.choice([None, "job-1"]),
+            "min_confidence": rng.choice([None, 0.5]),
+            "since": rng.choice([None, (START + timedelta(seconds=10)).isoformat()]),
+            "until": rng.choice([None, (START + timedelta(seconds=40)).isoformat()]),
+            "limit": rng.choice([None, 1, 7, 1000]),
+        }
+        assert index.query(region, mode, **filters) == brute_force(docs, region, mode, **filters)
+
+
+def test_full_region_and_boundaries():
+    docs = [
+        {"id": "a", "bounding_box": {"x": 0.5, "y": 0.5, "width": 0.0, "height": 0.0}, "timestamp": START.isoformat()},
+        {"id": "b", "bounding_box": {"x": 0.25, "y": 0.0, "width": 0.25, "height": 0.25}, "timestamp": START.isoformat()},
+        {"id": "c", "bounding_box": {"x": 0.9, "y": 0.9, "width": 0.5, "height": 0.5}, "timestamp": START.isoformat()},
+    ]
+    index = FileGridIndex(4)
+    index.add(docs)
+    assert index.query((0.0, 0.0, 1.0, 1.0)) == ["c", "b", "a"]
+    # Touching edges intersect; a box clipped to the image is contained in it
+    assert index.query((0.5, 0.5, 0.6, 0.6)) == ["a"]
+    assert index.query((0.5, 0.25, 0.75, 0.3)) == ["b"]
+    assert index.query((0.8, 0.8, 1.0, 1.0), CONTAINS) == ["c"]
+
+
+def test_keyset_pages_cover_every_match_once():
+    rng = np.random.default_rng(7)
+    docs = make_docs(rng, 400)
+    index = FileGridIndex(8)
+    index.add(docs)
+    region = (0.1, 0.1, 0.9, 0.9)
+    by_id = {doc["id"]: doc for doc in docs}
+    pages, after = [], None
+    while True:
+        page = index.query(region, after=after, limit=9)
+        if not page:
+            break
+        pages.extend(page)
+        after = (by_id[page[-1]]["timestamp"], page[-1])
+    assert pages == brute_force(docs, region)
+
+
+def test_removed_detections_disappear_and_survive_compaction():
+    rng = np.random.default_rng(3)
+    docs = make_docs(rng, 200)
+    index = FileGridIndex(8)
+    index.add(docs)
+    removed = {doc["id"] for doc in docs[::3]}
+    index.remove(removed)
+    remaining = [doc for doc in docs if doc["id"] not in removed]
+    region = (0.0, 0.0, 1.0, 1.0)
+    assert index.query(region) == brute_force(remaining, region)
+
+    # Removing past half of the rows compacts the index; queries are unchanged
+    more = {doc["id"] for doc in remaining[::2]}
+    index.remove(more)
+    remaining = [doc for doc in remaining if doc["id"] not in more]
+    assert index.dead == 0 and len(index) == len(remaining)
+    for _ in range(20):
+        region = random_region(rng)
+        assert index.query(region, target_type="boat") == brute_force(remaining, region, target_type="boat")
+
+
+def test_grid_cells_cover_every_intersecting_box():
+    rng = np.random.default_rng(11)
+    for doc in make_docs(rng, 300):
+        bounds = box_bounds(doc["bounding_box"])
+        region = random_region(rng)
+        intersects = bounds[0] <= region[2] and bounds[1] <= region[3] and bounds[2] >= region[0] and bounds[3] >= region[1]
+        if intersects:
+            assert set(grid_cells(bounds, 8)) & set(grid_cells(region, 8))
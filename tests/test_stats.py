@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from stats import StatsCounters
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def make_detections(count):
+    types = ["vehicle", "person", "vessel", None]
+    return [
+        {"id": str(i), "file_id": f"f{i % 3}", "target_type": types[i % len(types)], "confidence": (i % 21) / 20}
+        for i in range(count)
+    ]
+
+
+def test_detections_removed_matches_rebuild():
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()["stats_test"]
+        counters = StatsCounters(db.stats)
+        detections = make_detections(200)
+        await db.detections.insert_many([dict(doc) for doc in detections])
+        await counters.detections_added(detections)
+
+        await counters.detections_removed(db.detections, {"file_id": "f1"})
+        await db.detections.delete_many({"file_id": "f1"})
+        incremental = (await counters.snapshot(db.analysis_jobs))["detections"]
+
+        await counters.rebuild(db)
+        rebuilt = (await counters.snapshot(db.analysis_jobs))["detections"]
+        return incremental, rebuilt
+
+    incremental, rebuilt = asyncio.run(run())
+    assert incremental["total"] == rebuilt["total"] == 133
+    assert incremental["by_target_type"] == rebuilt["by_target_type"]
+    assert incremental["confidence_histogram"] == rebuilt["confidence_histogram"]
+    assert incremental["avg_confidence"] == pytest.approx(rebuilt["avg_confidence"])
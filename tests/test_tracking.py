@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from tracking import MultiObjectTracker, boxes_to_array, capture_time, greedy_assignment, iou_matrix, order_frames
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def box(x, y, size=0.1):
+    return {"x": x, "y": y, "width": size, "height": size}
+
+
+def test_iou_matrix():
+    a = boxes_to_array([box(0, 0, 0.2), box(0.5, 0.5)])
+    b = boxes_to_array([box(0, 0, 0.2), box(0.1, 0, 0.2), box(0.9, 0.9), {"x": 0, "y": 0, "width": 0, "height": 0}])
+    scores = iou_matrix(a, b)
+    assert scores.shape == (2, 4)
+    assert scores[0] == pytest.approx([1.0, 1 / 3, 0.0, 0.0])
+    assert scores[1] == pytest.approx([0.0, 0.0, 0.0, 0.0])
+    assert iou_matrix(a, boxes_to_array([])).shape == (2, 0)
+
+
+def test_greedy_assignment_takes_the_best_pairs_first():
+    scores = np.array([
+        [0.9, 0.8, 0.0],
+        [0.85, 0.2, 0.0],
+        [0.0, 0.0, 0.25],
+    ])
+    # Row 1 loses column 0 to row 0 and only has a pair below the threshold left
+    assert greedy_assignment(scores, 0.3).tolist() == [[0, 0]]
+    assert greedy_assignment(scores, 0.1).tolist() == [[0, 0], [2, 2], [1, 1]]
+    assert greedy_assignment(np.zeros((0, 3)), 0.3).shape == (0, 2)
+
+
+def test_tracks_follow_moving_boxes():
+    tracker = MultiObjectTracker()
+    ids = [tracker.update(boxes_to_array([box(0.1 + 0.05 * i, 0.1), box(0.8 - 0.05 * i, 0.7)]), ["car", "boat"])
+           for i in range(6)]
+    assert all(frame.tolist() == [1, 2] for frame in ids)
+    # The constant-velocity model learned the motion of each track
+    assert tracker.velocity[0] == pytest.approx([0.05, 0.0], abs=0.01)
+    assert tracker.velocity[1] == pytest.approx([-0.05, 0.0], abs=0.01)
+
+
+def test_classes_are_not_associated_across_types():
+    tracker = MultiObjectTracker()
+    assert tracker.update(boxes_to_array([box(0.1, 0.1)]), ["car"]).tolist() == [1]
+    assert tracker.update(boxes_to_array([box(0.1, 0.1)]), ["person"]).tolist() == [2]
+    tracker = MultiObjectTracker(class_aware=False)
+    tracker.update(boxes_to_array([box(0.1, 0.1)]), ["car"])
+    assert tracker.update(boxes_to_array([box(0.1, 0.1)]), ["person"]).tolist() == [1]
+
+
+def test_tracks_survive_max_age_missed_frames_and_then_die():
+    tracker = MultiObjectTracker(max_age=2)
+    tracker.update(boxes_to_array([box(0.1, 0.1)]), ["car"])
+    for _ in range(2):
+        assert tracker.update(boxes_to_array([]), []).tolist() == []
+    assert tracker.ids.tolist() == [1] and tracker.age.tolist() == [2]
+    # Seen again within max_age: same track
+    assert tracker.update(boxes_to_array([box(0.1, 0.1)]), ["car"]).tolist() == [1]
+
+    for _ in range(3):
+        tracker.update(boxes_to_array([]), [])
+    assert len(tracker.ids) == 0
+    # Lost for more than max_age frames: a new track is born
+    assert tracker.update(boxes_to_array([box(0.1, 0.1)]), ["car"]).tolist() == [2]
+
+
+def test_new_boxes_start_tracks_alongside_matched_ones():
+    tracker = MultiObjectTracker()
+    tracker.update(boxes_to_array([box(0.1, 0.1)]), ["car"])
+    assert tracker.update(boxes_to_array([box(0.6, 0.6), box(0.1, 0.1)]), ["car", "car"]).tolist() == [2, 1]
+    assert sorted(tracker.ids.tolist()) == [1, 2]
+
+
+@pytest.mark.parametrize("file_doc, expected", [
+    ({"metadata": {"captured_at": "2026-01-01T00:00:00Z"}}, START),
+    ({"metadata": {"captured_at": "2026-01-01T02:00:00+02:00"}}, START),
+    ({"metadata": {"captured_at": "2026-01-01T00:00:00"}}, START),
+    ({"metadata": {"lastModified": START.timestamp() * 1000}}, START),
+    ({"metadata": {"timestamp": START.timestamp()}}, START),
+    ({"metadata": {"captured_at": "garbage"}, "uploaded_at": "2026-01-01T00:00:00"}, START),
+    ({"uploaded_at": "2026-01-01T00:00:00+00:00"}, START),
+    ({"uploaded_at": datetime(2026, 1, 1)}, START),
+    ({"uploaded_at": "not a date"}, None),
+    ({}, None),
+])
+def test_capture_time_is_always_utc(file_doc, expected):
+    value = capture_time(file_doc)
+    assert value == expected
+    if value is not None:
+        assert value.utcoffset() == timedelta(0)
+
+
+def test_order_frames_mixes_naive_aware_and_unknown_times():
+    docs = [
+        {"id": "c", "uploaded_at": "2026-01-01T00:00:02"},
+        {"id": "unknown"},
+        {"id": "b", "metadata": {"captured_at": "2026-01-01T01:00:01+01:00"}},
+        {"id": "a", "uploaded_at": START},
+        {"id": "tie", "uploaded_at": START.isoformat()},
+    ]
+    assert [doc["id"] for doc in order_frames(docs)] == ["unknown", "a", "tie", "b", "c"]